@@ -25,6 +25,8 @@ PMAVG_STD_ERR_MAX = 5e3   # error threshold in intermolecular pressure nonlinear
 # -------------------------- Lookups pre-computing --------------------------
 
 DQ_LOOKUP = 1e-5  # charge density interval step for lookup tables
+LOOKUP_CACHE_MAX_SIZE = 500e6  # memory budget of the projected lookups cache (bytes)
+WARM_START_CACHE_SIZE = 200     # max number of converged periodic states kept for warm starts
 
 # -------------------------- Simulations --------------------------
 
@@ -35,13 +37,26 @@ NCYCLES_MAX = 10                    # max number of cycles in periodic simulatio
 CHARGE_RANGE = (-300e-5, 150e-5)    # physiological charge range constraining the membrane (C/m2)
 SOLVER_NSTEPS = 1000                # max number of steps during one ODE solver call
 CLASSIC_TARGET_DT = 1e-8            # target time step in output arrays of detailed simulations
+RESAMPLE_CHUNK_SIZE = 100000        # nb of output samples resampled at once (bounding peak memory)
 NPC_DENSE = 1000                    # nb of samples per acoustic period in detailed simulations
 NPC_SPARSE = 40                     # nb of samples per acoustic period in sparse simulations
 MIN_SPARSE_DT = 1e-12               # minimal time step used during sparse integration (s)
+SPARSE_RTOL = 1e-6                  # relative tolerance of sparse integration
+SPARSE_ATOL = 1e-12                 # absolute tolerance of sparse integration
 HYBRID_UPDATE_INTERVAL = 5e-4       # time interval between two hybrid integrations (s)
+MULTIRATE_RTOL = 1e-4               # relative tolerance on slow-fast coupling variables in multirate integration
+MULTIRATE_ATOL = 1e-10              # absolute tolerance on slow-fast coupling variables in multirate integration
+MULTIRATE_NITER_MAX = 3             # max number of coupling iterations per multirate macro step
+MULTIRATE_NCYCLES_MAX = 100         # max number of periods per multirate macro step
+MULTIRATE_NDECIM = 5                # decimation factor of the slow time grid in multirate integration
 DT_EFFECTIVE = 5e-5                 # time step for effective integration (s)
 MIN_SAMPLES_PER_PULSE_INTERVAL = 1  # minimal number of time points per pulse interval (TON of TOFF)
 MAX_NSAMPLES_EFFECTIVE = 1e5        # maximum number of time samples in effective simulations output
+COMPILED_RHS = True                 # use code-generated flat derivatives functions if available
+JIT_COMPILED_RHS = False            # jit-compile flat derivatives functions with Numba (if installed)
+ODE_METHOD = None                   # stiff solve_ivp backend ('BDF', 'Radau'), or None for odeint/LSODA
+ODE_RTOL = 1e-6                     # relative tolerance of solve_ivp backends
+ODE_ATOL = 1e-10                    # absolute tolerance of solve_ivp backends
 
 # -------------------------- Post-processing --------------------------
 
@@ -72,6 +87,17 @@ QSS_Q_CONV_THR = 1e-7                   # max. charge deviation to infer converg
 QSS_Q_DIV_THR = 1e-4                    # min. charge deviation to infer divergence (C/m2)
 TMIN_STABILIZATION = 500e-3             # time window for stabilization analysis (s)
 
+# -------------------------- Batch scheduling --------------------------
+
+# Default costs of cycle-resolved methods measured on the same run (RS neuron, 32 nm sonophore,
+# 500 kHz, 100 kPa, 0.6 ms stimulus + 0.1 ms offset), i.e. with consistent ratios.
+SONIC_COST_RATE = 5.        # default cost of SONIC simulations (s per simulated s)
+FULL_COST_RATE = 0.34       # default cost of full simulations (s per acoustic cycle)
+HYBRID_COST_RATE = 2.2e-2   # default cost of hybrid simulations (s per acoustic cycle)
+MULTIRATE_COST_RATE = 0.14  # default cost of multirate simulations (s per acoustic cycle)
+TASK_LEASE_DURATION = 300.  # lease duration of tasks claimed from file-based task queues (s)
+TASK_POLL_INTERVAL = 5.     # polling interval of file-based task queues (s)
+
 
 def getConstantsDict():
     cdict = {}
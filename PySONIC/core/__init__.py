@@ -10,6 +10,7 @@ import inspect
 import sys
 
 from .solvers import *
+from .sinks import *
 from .batches import *
 from .model import *
 from .pneuron import *
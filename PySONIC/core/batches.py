@@ -9,14 +9,24 @@
 
 import os
 import time
+import socket
+import hashlib
+import threading
+import traceback
 import abc
 import csv
+import heapq
+import inspect
 import logging
 import numpy as np
 import pandas as pd
 import multiprocess as mp
+from queue import SimpleQueue
+from itertools import islice
+from functools import partial
 
 from ..utils import logger, isIterable, rangecode, os_name, getTimeStr
+from ..constants import TASK_LEASE_DURATION, TASK_POLL_INTERVAL
 
 
 class Consumer(mp.Process):
@@ -43,6 +53,513 @@ class Consumer(mp.Process):
         return
 
 
+# Per-process state pre-loaded by the initializer of a pool executor (e.g. model objects)
+worker_state = {}
+
+
+def initWorker(initializer, initargs, loglevel):
+    ''' Initialize a pool worker process: set logging level and pre-load worker state.
+
+        :param initializer: optional function returning a dictionary of objects to store in
+         the worker state
+        :param initargs: arguments of the initializer
+        :param loglevel: logging level
+    '''
+    logger.setLevel(loglevel)
+    if initializer is not None:
+        worker_state.update(initializer(*initargs))
+
+
+def callTask(func, loglevel, params):
+    ''' Call a function with a given set of parameters inside a pool worker. '''
+    logger.setLevel(loglevel)
+    args, kwargs = Batch.resolve(params)
+    return func(*args, **kwargs)
+
+
+def callIndexedTasks(func, loglevel, chunk):
+    ''' Call a function with a chunk of indexed sets of parameters inside a pool worker.
+
+        :return: list of (index, output) pairs
+    '''
+    return [(i, callTask(func, loglevel, params)) for i, params in chunk]
+
+
+class StateMethod:
+    ''' Lightweight (picklable) reference to a method of an object pre-loaded in the state of
+        pool workers, avoiding to pickle that object with every task.
+    '''
+
+    def __init__(self, key, method):
+        ''' Constructor.
+
+            :param key: key of the object in the worker state
+            :param method: method name
+        '''
+        self.key = key
+        self.method = method
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.key}.{self.method})'
+
+    def __call__(self, *args, **kwargs):
+        return getattr(worker_state[self.key], self.method)(*args, **kwargs)
+
+
+class PoolExecutor:
+    ''' Persistent pool of worker processes, reusable across batches.
+
+        Tasks are dispatched to workers in chunks (with the called function pickled once per
+        chunk rather than once per task), and heavy objects (e.g. models and their lookups)
+        can be pre-loaded once per worker by an initializer, and referenced in tasks by
+        StateMethod objects.
+    '''
+
+    def __init__(self, nworkers=None, initializer=None, initargs=(), chunksize=None,
+                 loglevel=logging.INFO):
+        ''' Constructor.
+
+            :param nworkers: number of worker processes (defaults to number of CPUs)
+            :param initializer: optional function returning a dictionary of objects to
+             pre-load in the state of each worker
+            :param initargs: arguments of the initializer
+            :param chunksize: number of tasks sent at once to a worker (defaults to splitting
+             each batch in about 4 chunks per worker)
+            :param loglevel: logging level of worker processes
+        '''
+        mp.freeze_support()
+        self.nworkers = mp.cpu_count() if nworkers is None else nworkers
+        self.chunksize = chunksize
+        self.pool = mp.Pool(
+            self.nworkers, initializer=initWorker, initargs=(initializer, initargs, loglevel))
+        logger.debug(f'Started pool of {self.nworkers} workers')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.nworkers} workers)'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def getChunkSize(self, ntasks):
+        ''' Determine number of tasks per chunk for a given batch size. '''
+        if self.chunksize is not None:
+            return self.chunksize
+        return max(int(np.ceil(ntasks / (4 * self.nworkers))), 1)
+
+    def map(self, func, queue, loglevel=logging.INFO):
+        ''' Run a batch of function calls on the pool workers.
+
+            :param func: function object
+            :param queue: list of function parameters
+            :param loglevel: logging level
+            :return: list of outputs, in queue order
+        '''
+        return self.pool.map(
+            partial(callTask, func, loglevel), queue, chunksize=self.getChunkSize(len(queue)))
+
+    def imap(self, func, queue, loglevel=logging.INFO, max_inflight=None):
+        ''' Run a batch of function calls on the pool workers, yielding outputs as soon as
+            their chunk is completed.
+
+            :param func: function object
+            :param queue: list of function parameters
+            :param loglevel: logging level
+            :param max_inflight: optional maximum number of tasks dispatched but not yet
+             yielded at any time
+            :return: generator of (index, output) pairs, in completion order
+        '''
+        chunksize = self.getChunkSize(len(queue))
+        if max_inflight is not None:
+            chunksize = min(chunksize, max_inflight)
+            max_chunks = max(max_inflight // chunksize, 1)
+        else:
+            max_chunks = None
+        items = list(enumerate(queue))
+        chunks = iter([items[i:i + chunksize] for i in range(0, len(items), chunksize)])
+        completed = SimpleQueue()
+        ninflight = 0
+        while True:
+            for chunk in islice(chunks, None if max_chunks is None else max_chunks - ninflight):
+                self.pool.apply_async(
+                    callIndexedTasks, (func, loglevel, chunk),
+                    callback=completed.put, error_callback=completed.put)
+                ninflight += 1
+            if ninflight == 0:
+                return
+            outputs = completed.get()
+            ninflight -= 1
+            if isinstance(outputs, BaseException):
+                raise outputs
+            yield from outputs
+
+    def close(self):
+        ''' Terminate worker processes once pending tasks are completed. '''
+        self.pool.close()
+        self.pool.join()
+
+
+class TaskDirectory:
+    ''' File-based task queue stored in a shared directory (e.g. on a network file system),
+        from which any number of worker processes, on any host, can claim and complete the
+        tasks of successive batches.
+
+        Each batch is stored in its own sub-directory, containing the pickled function and one
+        file per task. A task file is claimed by atomically renaming it from the "todo" to the
+        "claimed" folder (which only one worker can do), and its output is then written in the
+        "done" folder. Claims are leases: the claimed file is touched periodically while its
+        task runs, and tasks whose lease has expired (e.g. because their worker crashed) are
+        returned to the "todo" folder.
+
+        Task directories can be used as batch executors, in which case the submitting process
+        also works on the batch tasks, until all of them are completed (by any worker). Closing
+        a task directory returns the tasks still claimed by the current process to the "todo"
+        folder, without waiting for their lease to expire.
+    '''
+
+    lease_duration = TASK_LEASE_DURATION  # s
+    poll_interval = TASK_POLL_INTERVAL    # s
+
+    def __init__(self, root, nworkers=1):
+        ''' Constructor.
+
+            :param root: shared root directory of the task queue
+            :param nworkers: expected number of workers (only used to project batch makespans)
+        '''
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.nworkers = nworkers
+        self.wid = f'{socket.gethostname()}-{os.getpid()}'
+        self.funcs = {}  # functions of loaded batches
+        self.claimed = {}  # batch directory and index of tasks claimed by this process
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.root})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def taskFileName(i):
+        return f'task{i:06d}.pkl'
+
+    @staticmethod
+    def taskIndex(fname):
+        return int(fname[4:10])
+
+    @staticmethod
+    def isTaskFile(fname):
+        return fname.startswith('task') and fname.endswith('.pkl')
+
+    @staticmethod
+    def writeFile(fpath, obj):
+        ''' Atomically write a pickled object to a file. '''
+        tmp_fpath = os.path.join(os.path.dirname(fpath), f'.{os.path.basename(fpath)}.tmp')
+        with open(tmp_fpath, 'wb') as fh:
+            fh.write(mp.reduction.ForkingPickler.dumps(obj))
+        os.replace(tmp_fpath, fpath)
+
+    @staticmethod
+    def readFile(fpath):
+        ''' Read a pickled object from a file. '''
+        with open(fpath, 'rb') as fh:
+            return mp.reduction.ForkingPickler.loads(fh.read())
+
+    @classmethod
+    def canonical(cls, obj):
+        ''' Canonical string representation of an object, independent of memory addresses and
+            of pickling details, used to identify batches across submissions.
+
+            Objects with a "meta" dictionary (e.g. models, drives and protocols) are represented
+            by their class and this dictionary, other objects by their class and attributes.
+        '''
+        if isinstance(obj, (list, tuple)):
+            return f'[{", ".join(map(cls.canonical, obj))}]'
+        if isinstance(obj, dict):
+            items = sorted((cls.canonical(k), cls.canonical(v)) for k, v in obj.items())
+            return '{' + ', '.join(f'{k}: {v}' for k, v in items) + '}'
+        if isinstance(obj, np.ndarray):
+            return f'array({obj.dtype}, {obj.shape}, {cls.canonical(obj.ravel().tolist())})'
+        if isinstance(obj, partial):
+            return f'partial({cls.canonical([obj.func, obj.args, obj.keywords])})'
+        if inspect.ismethod(obj):
+            return f'{cls.canonical(obj.__self__)}.{obj.__name__}'
+        if inspect.isroutine(obj) or inspect.isclass(obj):
+            return f'{obj.__module__}.{obj.__qualname__}'
+        meta = getattr(obj, 'meta', None)
+        if isinstance(meta, dict):
+            return f'{obj.__class__.__qualname__}({cls.canonical(meta)})'
+        if hasattr(obj, '__dict__'):
+            return f'{obj.__class__.__qualname__}({cls.canonical(vars(obj))})'
+        return repr(obj)
+
+    def listTasks(self, batchdir, folder):
+        ''' List the task files of a batch folder. '''
+        return sorted(filter(self.isTaskFile, os.listdir(os.path.join(batchdir, folder))))
+
+    def batchDirs(self):
+        ''' List the (fully submitted) batch sub-directories of the queue, in submission order,
+            given by the modification time of their function file, which is written once
+            (unlike directories, modified by every task claim).
+        '''
+        dirpaths = [
+            os.path.join(self.root, x) for x in os.listdir(self.root) if x.startswith('batch_')]
+        submitted = []
+        for dirpath in dirpaths:
+            try:
+                submitted.append((os.path.getmtime(os.path.join(dirpath, 'func.pkl')), dirpath))
+            except FileNotFoundError:
+                continue  # batch being submitted
+        return [dirpath for _, dirpath in sorted(submitted)]
+
+    def submit(self, func, queue):
+        ''' Write a batch of function calls as task files. Tasks that are already submitted,
+            claimed or completed are skipped, such that submitting the same batch again
+            resumes it.
+
+            :param func: function object
+            :param queue: list of function parameters
+            :return: batch directory
+        '''
+        batch_id = hashlib.md5(self.canonical([func, queue]).encode()).hexdigest()
+        batchdir = os.path.join(self.root, f'batch_{batch_id[:12]}')
+        for folder in ['todo', 'claimed', 'done']:
+            os.makedirs(os.path.join(batchdir, folder), exist_ok=True)
+        func_fpath = os.path.join(batchdir, 'func.pkl')
+        existing = {self.taskIndex(fname) for folder in ['todo', 'claimed', 'done']
+                    for fname in self.listTasks(batchdir, folder)}
+        for i, params in enumerate(queue):
+            if i not in existing:
+                self.writeFile(os.path.join(batchdir, 'todo', self.taskFileName(i)), params)
+        if not os.path.isfile(func_fpath):
+            self.writeFile(func_fpath, func)  # written last, marking the batch as submitted
+        logger.info(f'Submitted {len(queue) - len(existing)}/{len(queue)} tasks to {batchdir}')
+        return batchdir
+
+    def claim(self, batchdir):
+        ''' Claim the first available task of a batch.
+
+            :param batchdir: batch directory
+            :return: (task index, claimed task filepath) tuple, or None if no task is available
+        '''
+        for fname in self.listTasks(batchdir, 'todo'):
+            claimed_fpath = os.path.join(batchdir, 'claimed', f'{fname[:-4]}.{self.wid}.pkl')
+            try:
+                os.rename(os.path.join(batchdir, 'todo', fname), claimed_fpath)
+                os.utime(claimed_fpath)  # start lease
+            except FileNotFoundError:
+                continue  # task claimed (or lease expired) by another worker in the meantime
+            self.claimed[claimed_fpath] = (batchdir, self.taskIndex(fname))
+            return self.taskIndex(fname), claimed_fpath
+        return None
+
+    def keepLease(self, fpath, stop_event):
+        ''' Periodically renew the lease of a claimed task until a stop event is set. '''
+        while not stop_event.wait(self.lease_duration / 3):
+            try:
+                os.utime(fpath)
+            except FileNotFoundError:
+                return
+
+    def requeueExpired(self, batchdir):
+        ''' Return claimed tasks whose lease has expired to the "todo" folder of a batch.
+
+            :param batchdir: batch directory
+            :return: number of requeued tasks
+        '''
+        nrequeued = 0
+        for fname in self.listTasks(batchdir, 'claimed'):
+            claimed_fpath = os.path.join(batchdir, 'claimed', fname)
+            task_fname = self.taskFileName(self.taskIndex(fname))
+            try:
+                if time.time() - os.path.getmtime(claimed_fpath) < self.lease_duration:
+                    continue
+                if os.path.isfile(os.path.join(batchdir, 'done', task_fname)):
+                    os.remove(claimed_fpath)
+                else:
+                    os.rename(claimed_fpath, os.path.join(batchdir, 'todo', task_fname))
+                    logger.warning(f'{batchdir}: lease of {fname} expired -> requeued')
+                    nrequeued += 1
+            except FileNotFoundError:
+                continue
+        return nrequeued
+
+    def runTask(self, batchdir, i, claimed_fpath, loglevel=logging.INFO):
+        ''' Run a claimed task, renewing its lease while it runs, and write its output.
+
+            :param batchdir: batch directory
+            :param i: task index
+            :param claimed_fpath: claimed task filepath
+            :param loglevel: logging level
+        '''
+        if batchdir not in self.funcs:
+            self.funcs[batchdir] = self.readFile(os.path.join(batchdir, 'func.pkl'))
+        params = self.readFile(claimed_fpath)
+        stop_event = threading.Event()
+        lease_keeper = threading.Thread(
+            target=self.keepLease, args=(claimed_fpath, stop_event), daemon=True)
+        lease_keeper.start()
+        try:
+            result = {'output': callTask(self.funcs[batchdir], loglevel, params)}
+        except Exception:
+            logger.error(f'{batchdir}: task {i} failed')
+            result = {'error': traceback.format_exc()}
+        finally:
+            stop_event.set()
+            lease_keeper.join()
+        self.writeFile(os.path.join(batchdir, 'done', self.taskFileName(i)), result)
+        try:
+            os.remove(claimed_fpath)
+        except FileNotFoundError:
+            pass
+        self.claimed.pop(claimed_fpath, None)
+
+    def release(self, claimed_fpath):
+        ''' Release a task claimed by this process, returning it to the "todo" folder of its
+            batch (or discarding the claim if the task has been completed in the meantime).
+
+            :param claimed_fpath: claimed task filepath
+        '''
+        batchdir, i = self.claimed.pop(claimed_fpath)
+        try:
+            if os.path.isfile(os.path.join(batchdir, 'done', self.taskFileName(i))):
+                os.remove(claimed_fpath)
+            else:
+                os.rename(claimed_fpath, os.path.join(batchdir, 'todo', self.taskFileName(i)))
+                logger.info(f'{batchdir}: released task {i}')
+        except FileNotFoundError:
+            pass  # lease expired and task requeued by another worker
+
+    def work(self, max_idle=None, loglevel=logging.INFO):
+        ''' Work on the tasks of all batches of the queue, in submission order (e.g. as a
+            worker process on a remote host).
+
+            :param max_idle: idle time (s) after which to stop if no task is available
+             (None to never stop)
+            :param loglevel: logging level
+            :return: number of completed tasks
+        '''
+        ncompleted, idle_start = 0, time.time()
+        while True:
+            claimed = None
+            for batchdir in self.batchDirs():
+                self.requeueExpired(batchdir)
+                claimed = self.claim(batchdir)
+                if claimed is not None:
+                    self.runTask(batchdir, *claimed, loglevel=loglevel)
+                    ncompleted += 1
+                    idle_start = time.time()
+                    break
+            if claimed is None:
+                if max_idle is not None and time.time() - idle_start >= max_idle:
+                    return ncompleted
+                time.sleep(self.poll_interval)
+
+    def imap(self, func, queue, loglevel=logging.INFO, max_inflight=None):
+        ''' Submit a batch of function calls, work on its tasks and yield outputs as they are
+            completed (by any worker).
+
+            :param func: function object
+            :param queue: list of function parameters
+            :param loglevel: logging level
+            :param max_inflight: unused (pending tasks are stored on disk)
+            :return: generator of (index, output) pairs, in completion order
+        '''
+        batchdir = self.submit(func, queue)
+        remaining = set(range(len(queue)))
+        while remaining:
+            self.requeueExpired(batchdir)
+            claimed = self.claim(batchdir)
+            if claimed is not None:
+                self.runTask(batchdir, *claimed, loglevel=loglevel)
+            completed = sorted(
+                remaining & set(map(self.taskIndex, self.listTasks(batchdir, 'done'))))
+            for i in completed:
+                result = self.readFile(os.path.join(batchdir, 'done', self.taskFileName(i)))
+                if 'error' in result:
+                    raise RuntimeError(f'{batchdir}: task {i} failed:\n{result["error"]}')
+                remaining.remove(i)
+                yield i, result['output']
+            if claimed is None and len(completed) == 0:
+                time.sleep(self.poll_interval)
+
+    def map(self, func, queue, loglevel=logging.INFO):
+        ''' Submit a batch of function calls, work on its tasks and wait for their completion.
+
+            :param func: function object
+            :param queue: list of function parameters
+            :param loglevel: logging level
+            :return: list of outputs, in queue order
+        '''
+        outputs = [None] * len(queue)
+        for i, out in self.imap(func, queue, loglevel=loglevel):
+            outputs[i] = out
+        return outputs
+
+    def close(self):
+        ''' Release the tasks still claimed by this process (e.g. upon interruption), such
+            that other workers can claim them immediately. Task files of completed batches are
+            kept as a record.
+        '''
+        for claimed_fpath in list(self.claimed):
+            self.release(claimed_fpath)
+
+
+class CostModel:
+    ''' Model of the expected computation time of batch tasks, as the product of a task
+        workload by a cost rate specific to the task category, calibrated on the computation
+        times recorded in the metadata of previous outputs.
+    '''
+
+    def __init__(self, workfunc, rates=None, argnames=None):
+        ''' Constructor.
+
+            :param workfunc: function returning the (category, workload) of a task from its
+             (named) parameters
+            :param rates: dictionary of default cost rates (s per unit of workload) per category
+            :param argnames: names of the task positional parameters, used to pass them by name
+             to the workload function, which may only accept a subset of them
+        '''
+        self.workfunc = workfunc
+        self.rates = {} if rates is None else dict(rates)
+        self.argnames = [] if argnames is None else list(argnames)
+        self.history = {}  # cumulated (computation time, workload) per category
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.workfunc.__name__})'
+
+    def workload(self, params):
+        ''' Compute the (category, workload) of a task from a dictionary of named parameters,
+            discarding those not accepted by the workload function.
+        '''
+        argnames = inspect.signature(self.workfunc).parameters
+        return self.workfunc(**{k: v for k, v in params.items() if k in argnames})
+
+    def __call__(self, *args, **kwargs):
+        ''' Expected computation time (s) of a task with specific parameters. '''
+        category, workload = self.workload({**dict(zip(self.argnames, args)), **kwargs})
+        return self.rates.get(category, 1.) * workload
+
+    def update(self, meta):
+        ''' Calibrate the cost rate of a task category with the parameters and computation
+            time of a completed task.
+
+            :param meta: task output metadata, containing the task parameters and its
+             computation time ("tcomp" key)
+        '''
+        category, workload = self.workload(meta)
+        tcomp, wtot = self.history.get(category, (0., 0.))
+        tcomp, wtot = tcomp + meta['tcomp'], wtot + workload
+        self.history[category] = (tcomp, wtot)
+        if wtot > 0:
+            self.rates[category] = tcomp / wtot
+
+
 class Worker:
     ''' Generic worker class calling a specific function with a given set of parameters. '''
 
@@ -70,6 +587,9 @@ class Worker:
 class Batch:
     ''' Generic interface to run batches of function calls. '''
 
+    order = None  # original queue indexes of scheduled tasks
+    costs = None  # expected costs of scheduled tasks (s)
+
     def __init__(self, func, queue):
         ''' Batch constructor.
 
@@ -83,6 +603,33 @@ class Batch:
         ''' Call the internal run method. '''
         return self.run(*args, **kwargs)
 
+    def schedule(self, costfunc):
+        ''' Reorder the queue by decreasing expected cost (longest-processing-time-first
+            scheduling), to avoid long tasks leaving other workers idle at the end of the
+            batch. Outputs are still returned in the original queue order.
+
+            :param costfunc: function returning the expected cost (s) of a task from its
+             parameters (e.g. a CostModel object)
+        '''
+        costs = [costfunc(*args, **kwargs) for args, kwargs in map(self.resolve, self.queue)]
+        self.order = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+        self.queue = [self.queue[i] for i in self.order]
+        self.costs = [costs[i] for i in self.order]
+
+    @staticmethod
+    def projectMakespan(costs, nworkers):
+        ''' Project the completion time of a list of tasks dispatched (in list order) to the
+            first available of a given number of workers.
+
+            :param costs: list of tasks expected costs (s)
+            :param nworkers: number of workers
+            :return: projected makespan (s)
+        '''
+        loads = [0.] * nworkers
+        for cost in costs:
+            heapq.heapreplace(loads, loads[0] + cost)
+        return max(loads)
+
     def getNConsumers(self):
         ''' Determine number of consumers based on queue length and number of available CPUs. '''
         print(f"getNConsumers: {mp.cpu_count(), len(self.queue)}")
@@ -133,27 +680,112 @@ class Batch:
         self.tasks.close()
         self.results.close()
 
-    def run(self, mpi=False, loglevel=logging.INFO):
-        ''' Run batch with or without multiprocessing. '''
-        s = 'en' if mpi else 'dis'
+    def run(self, mpi=False, loglevel=logging.INFO, executor=None):
+        ''' Run batch with or without multiprocessing.
+
+            :param mpi: boolean stating whether to run the batch on a fresh set of consumer
+             processes
+            :param loglevel: logging level
+            :param executor: optional persistent pool executor on which to run the batch
+        '''
+        s = 'en' if mpi or executor is not None else 'dis'
         logger.info(f'Starting {len(self.queue)}-job(s) batch (multiprocessing {s}abled)')
         start_time = time.perf_counter()
-        if mpi:
+        if executor is not None:
+            nworkers = executor.nworkers
+            outputs = executor.map(self.func, self.queue, loglevel=loglevel)
+        elif mpi:
+            nworkers = self.getNConsumers()
             self.start()
             self.assign(loglevel)
             self.join()
             outputs = self.get()
             self.stop()
         else:
+            nworkers = 1
             outputs = []
             for params in self.queue:
                 args, kwargs = self.resolve(params)
                 print(f"\nStart simulation for the following parameters: {args} and {kwargs} ###")
                 outputs.append(self.func(*args, **kwargs))
         run_time = time.perf_counter() - start_time
-        logger.info(f'Batch completed in {getTimeStr(run_time)} s')
+        if self.order is None:
+            logger.info(f'Batch completed in {getTimeStr(run_time)} s')
+        else:
+            projected_time = self.projectMakespan(self.costs, nworkers)
+            logger.info(f'Batch completed in {getTimeStr(run_time)} s '
+                        f'(projected makespan: {getTimeStr(projected_time)} s)')
+            outputs = [out for _, out in sorted(zip(self.order, outputs))]
         return outputs
 
+    def iterConsumers(self, loglevel, max_inflight=None):
+        ''' Run batch on a fresh set of consumers, yielding outputs as they are received.
+
+            :param loglevel: logging level
+            :param max_inflight: optional maximum number of tasks assigned but not yet
+             yielded at any time
+            :return: generator of (index, output) pairs, in completion order
+        '''
+        self.start()
+        workers = (
+            Worker(i, self.func, *self.resolve(params), loglevel)
+            for i, params in enumerate(self.queue))
+        ninflight = 0
+        try:
+            for worker in islice(workers, max_inflight):
+                self.tasks.put(worker, block=False)
+                ninflight += 1
+            while ninflight > 0:
+                out = self.results.get()
+                ninflight -= 1
+                for worker in islice(workers, 1):
+                    self.tasks.put(worker, block=False)
+                    ninflight += 1
+                yield out
+        finally:
+            # Shut consumers down even if iteration is interrupted (e.g. by an exception or
+            # an early exit of the caller), discarding the outputs of pending tasks (which
+            # consumers must flush before exiting)
+            for _ in range(ninflight):
+                self.results.get()
+            self.join()
+            self.stop()
+
+    def imap(self, mpi=False, loglevel=logging.INFO, executor=None, callback=None,
+             max_inflight=None):
+        ''' Run batch and yield outputs as soon as they are available, i.e. in completion
+            order (rather than queue order) with multiprocessing. This allows processing (e.g.
+            saving) outputs incrementally, without holding all of them in memory.
+
+            :param mpi: boolean stating whether to run the batch on a fresh set of consumer
+             processes
+            :param loglevel: logging level
+            :param executor: optional persistent pool executor on which to run the batch
+            :param callback: optional function called with the (index, output) of each task
+             upon completion
+            :param max_inflight: optional maximum number of dispatched tasks whose output has
+             not yet been yielded, bounding memory usage
+            :return: generator of (index, output) pairs
+        '''
+        if executor is not None:
+            outputs = executor.imap(
+                self.func, self.queue, loglevel=loglevel, max_inflight=max_inflight)
+        elif mpi:
+            outputs = self.iterConsumers(loglevel, max_inflight=max_inflight)
+        else:
+            outputs = (
+                (i, self.func(*args, **kwargs))
+                for i, (args, kwargs) in enumerate(map(self.resolve, self.queue)))
+        try:
+            for i, out in outputs:
+                if self.order is not None:
+                    i = self.order[i]
+                if callback is not None:
+                    callback(i, out)
+                yield i, out
+        finally:
+            outputs.close()
+
     @staticmethod
     def createQueue(*dims):
         ''' Create a serialized 2D array of all parameter combinations for a series of individual
@@ -360,16 +992,20 @@ class LogBatch(metaclass=abc.ABCMeta):
             logger.debug(f'existing entry: "{x}"')
             return None
 
-    def run(self, mpi=False):
-        ''' Run the batch and return the output(s). '''
+    def run(self, mpi=False, executor=None):
+        ''' Run the batch and return the output(s).
+
+            :param mpi: boolean stating whether to use multiprocessing
+            :param executor: optional executor on which to run the batch (e.g. a pool of
+             workers or a task directory shared with other hosts)
+        '''
         self.createLogFile()
         if len(self.getLogData()) < len(self.inputs):
             batch = Batch(self.computeAndLog, [[x] for x in self.inputs])
-            self.mpi = mpi
-            outputs = batch.run(mpi=mpi, loglevel=logger.level)
-            outputs = filter(lambda x: x is not None, outputs)
-            if mpi:
-                for out in outputs:
+            self.mpi = mpi or executor is not None
+            # Log entries computed by worker processes as soon as they are received
+            for _, out in batch.imap(mpi=mpi, loglevel=logger.level, executor=executor):
+                if self.mpi and out is not None:
                     self.writeEntry(out)
             self.mpi = False
         else:
@@ -14,7 +14,7 @@ from scipy.optimize import brentq, curve_fit
 
 from .model import Model
 from .lookups import EffectiveVariablesLookup
-from .solvers import PeriodicSolver
+from .solvers import PeriodicSolver, BatchPeriodicSolver, WarmStartCache
 from .drives import Drive, AcousticDrive
 from ..utils import logger, si_format, isIterable, LOOKUP_DIR
 from ..constants import *
@@ -112,6 +112,11 @@ class BilayerSonophore(Model):
     tscale = 'us'    # relevant temporal scale of the model
     simkey = 'MECH'  # keyword used to characterize simulations made with this model
 
+    # Seed periodic simulations with the converged state of their nearest already-computed
+    # (amplitude, charge) neighbour, drawn from a process-wide cache
+    warm_start = False
+    warm_start_cache = WarmStartCache(WARM_START_CACHE_SIZE)
+
     def __init__(self, a, Cm0, Qm0, embedding_depth=0.0):
         ''' Constructor of the class.
             :param a: in-plane radius of the sonophore structure within the membrane (m)
@@ -308,15 +313,16 @@ class BilayerSonophore(Model):
         '''
         return np.pi * (self.a**2 + Z**2)
 
-    def volume(self, Z):
+    def volume(self, Z, Delta=None):
         ''' Volume of the inter-leaflet space
             (cylinder +/- 2 spherical caps)
 
             :param Z: leaflet apex deflection (m)
+            :param Delta: optional gap between the two leaflets at rest (m)
             :return: bilayer sonophore inner volume (m^3)
         '''
-        return np.pi * self.a**2 * self.Delta\
-            * (1 + (Z / (3 * self.Delta) * (3 + Z**2 / self.a**2)))
+        Delta = self.Delta if Delta is None else Delta
+        return np.pi * self.a**2 * Delta * (1 + (Z / (3 * Delta) * (3 + Z**2 / self.a**2)))
 
     def arealStrain(self, Z):
         ''' Areal strain of the stretched leaflet
@@ -781,6 +787,48 @@ class BilayerSonophore(Model):
         # Return derivatives vector
         return [dUdt, dZdt, dngdt]
 
+    def batchDerivatives(self, t, y, drive, Qm, Delta, LJ_approx):
+        ''' Vectorized evolution of a batch of mechanical systems sharing the same geometry
+            but differing in imposed charge and resting parameters.
+
+            :param t: time instant (s)
+            :param y: (nmembers, 3) matrix of mechanical system variables at time t
+            :param drive: acoustic drive object
+            :param Qm: vector of imposed membrane charge densities (C/m2)
+            :param Delta: vector of resting gaps between the two leaflets (m)
+            :param LJ_approx: dictionary of vectors of Lennard-Jones parameters
+            :return: (nmembers, 3) matrix of mechanical system derivatives at time t
+
+            .. note:: the average intermolecular pressure is computed with the predicted
+                (Lennard-Jones) method.
+        '''
+        # Split input matrix explicitly
+        U, Z, ng = y.T
+
+        # Correct deflection values below critical compression
+        Zmin = self.rel_Zmin * Delta
+        if np.any(Z < Zmin):
+            logger.warning('Deflection out of range: Z = %.2f nm', np.min(Z) * 1e9)
+            Z = np.maximum(Z, Zmin)
+
+        # Compute curvature radii (infinite for null deflections)
+        with np.errstate(divide='ignore'):
+            R = (self.a**2 + Z**2) / (2 * Z)
+
+        # Compute total pressures
+        Pg = self.gasmol2Pa(ng, self.volume(Z, Delta=Delta))
+        Pm = LennardJones(Z, Delta, LJ_approx['x0'], LJ_approx['C'],
+                          LJ_approx['nrep'], LJ_approx['nattr'])
+        Pac = drive.compute(t)
+        Pv = self.PVleaflet(U, R) + self.PVfluid(U, R)
+        Ptot = Pm + Pg - self.P0 - Pac + self.PEtot(Z, R) + Pv + self.Pelec(Z, Qm)
+
+        # Compute and return derivatives matrix
+        dUdt = self.accP(Ptot, R) + self.accNL(U, R)
+        dZdt = U
+        dngdt = self.gasFlux(Z, Pg)
+        return np.stack((dUdt, dZdt, dngdt), axis=-1)
+
     def computeInitialDeflection(self, drive, Qm, dt, Pm_comp_method=PmCompMethod.predict):
         ''' Compute non-zero deflection value for a small perturbation
             (solving quasi-steady equation).
@@ -811,7 +859,41 @@ class BilayerSonophore(Model):
             'ng': [self.ng0] * 2,
         }
 
-    def simCycles(self, drive, Qm, nmax=None, nmin=None, Pm_comp_method=PmCompMethod.predict):
+    def warmStartKey(self, drive, Qm, Pm_comp_method):
+        ''' Get the warm start cache context and coordinates of a periodic simulation.
+
+            :param drive: acoustic drive object
+            :param Qm: imposed membrane charge density (C/m2), either a scalar or a
+             T-periodic vector
+            :param Pm_comp_method: type of method used to compute average intermolecular pressure
+            :return: (context, coordinates) tuple, or None if warm start is not applicable
+        '''
+        if not isinstance(drive, AcousticDrive):
+            return None
+        context = (self.a, self.d, self.Cm0, self.Qm0, drive.f, drive.phi, Pm_comp_method,
+                   isIterable(Qm))
+        return context, (drive.A, np.mean(Qm))
+
+    def warmInitialConditions(self, key):
+        ''' Compute simulation initial conditions from the converged state of the nearest
+            cached neighbour, if any.
+
+            :param key: warm start cache (context, coordinates) tuple
+            :return: initial conditions dictionary, or None if no neighbour is cached
+        '''
+        if key is None:
+            return None
+        y = self.warm_start_cache.get(*key)
+        if y is None:
+            return None
+        return {
+            'U': [0., y[0]],
+            'Z': [0., y[1]],
+            'ng': [self.ng0, y[2]],
+        }
+
+    def simCycles(self, drive, Qm, nmax=None, nmin=None, Pm_comp_method=PmCompMethod.predict,
+                  warm_start=None):
         ''' Simulate for a specific number of cycles or until periodic stabilization,
             for a specific set of ultrasound parameters, and return output data in a dataframe.
 
@@ -819,8 +901,13 @@ class BilayerSonophore(Model):
             :param Qm: imposed membrane charge density (C/m2)
             :param n: number of cycles (optional)
             :param Pm_comp_method: type of method used to compute average intermolecular pressure
+            :param warm_start: boolean stating whether to seed the simulation with the
+             converged state of the nearest cached neighbour (defaults to "warm_start"
+             attribute)
             :return: output dataframe
         '''
+        if warm_start is None:
+            warm_start = self.warm_start
         # Set the tissue elastic modulus
         self.setTissueModulus(drive)
 
@@ -830,12 +917,15 @@ class BilayerSonophore(Model):
             Qm0, Qm_t = Qm, lambda t: Qm
         elif isIterable(Qm):
             # If iterable, recast as 1d array, check size, and use a time-varying charge
-            Qm0, Qm_t = Qm[0], lambda t: Qm[int((t % drive.periodicity) / drive.dt)]
+            Qm0, Qm_t = Qm[0], lambda t: Qm[int((t % drive.periodicity) / drive.dt) % len(Qm)]
         else:
             raise ValueError('unknown charge input type')
 
-        # Compute initial conditions
-        y0 = self.initialConditions(drive, Qm0, drive.dt, Pm_comp_method=Pm_comp_method)
+        # Compute initial conditions (from nearest cached neighbour if warm start is enabled)
+        key = self.warmStartKey(drive, Qm, Pm_comp_method) if warm_start else None
+        y0 = self.warmInitialConditions(key)
+        if y0 is None:
+            y0 = self.initialConditions(drive, Qm0, drive.dt, Pm_comp_method=Pm_comp_method)
 
         # Initialize solver and compute solution
         solver = PeriodicSolver(
@@ -843,16 +933,107 @@ class BilayerSonophore(Model):
             y0.keys(),                                                            # variables list
             lambda t, y: self.derivatives(t, y, drive, Qm_t(t), Pm_comp_method),  # dfunc
             primary_vars=['Z', 'ng'],                                             # primary variables
-            dt=drive.dt                                                           # time step
+            dt=drive.dt,                                                          # time step
+            stats=self.solver_stats                                               # statistics
         )
         data = solver(y0, nmax=nmax, nmin=nmin)
 
+        # Store converged state in warm start cache
+        if key is not None:
+            self.warm_start_cache.put(*key, [data[k].values[-1] for k in ['U', 'Z', 'ng']])
+
         # Remove velocity timeries from solution
         del data['U']
 
         # Return solution dataframe
         return data
 
+    def simCyclesBatch(self, drive, Qms, sonophores=None, nmax=None, nmin=None,
+                       Pm_comp_method=PmCompMethod.predict, warm_start=None):
+        ''' Simulate a batch of independent mechanical systems driven by the same acoustic
+            stimulus, as a single vectorized ODE system, until each of them reaches periodic
+            stabilization, and return output data in a list of dataframes.
+
+            :param drive: acoustic drive object
+            :param Qms: list of imposed membrane charge densities (C/m2), each one being
+             either a scalar or a T-periodic vector
+            :param sonophores: optional list of sonophore objects (with the same geometry)
+             defining the resting parameters of each batch member (defaults to current object)
+            :param nmax: maximum number of cycles (optional)
+            :param nmin: minimum number of cycles (optional)
+            :param Pm_comp_method: type of method used to compute average intermolecular pressure
+            :param warm_start: boolean stating whether to seed each batch member with the
+             converged state of its nearest cached neighbour (defaults to "warm_start"
+             attribute)
+            :return: list of output dataframes
+        '''
+        if warm_start is None:
+            warm_start = self.warm_start
+        if Pm_comp_method is not PmCompMethod.predict:
+            raise ValueError('batch simulations require the predicted intermolecular pressure')
+        if sonophores is None:
+            sonophores = [self] * len(Qms)
+        if len(sonophores) != len(Qms):
+            raise ValueError('number of sonophores does not match number of charges')
+        for bls in sonophores:
+            if bls.a != self.a or bls.d != self.d:
+                raise ValueError('all batch sonophores must share the same geometry')
+
+        # Set the tissue elastic modulus
+        self.setTissueModulus(drive)
+
+        # Adapt Qm(t) function to charge inputs type
+        if all(isinstance(Qm, float) for Qm in Qms):
+            # If floats, simply use constant applied charges
+            Qm0, Qms = np.array(Qms), np.array(Qms)
+            Qm_t = lambda t: Qms
+        else:
+            # Otherwise, recast all inputs as T-periodic vectors, and use time-varying charges
+            Qms = np.array([np.full(drive.nPerCycle, Qm) if isinstance(Qm, float) else Qm
+                            for Qm in Qms])
+            if Qms.ndim != 2:
+                raise ValueError('unknown charge input type')
+            Qm0 = Qms[:, 0]
+            Qm_t = lambda t: Qms[:, int((t % drive.periodicity) / drive.dt) % Qms.shape[1]]
+
+        # Gather resting parameters of batch members
+        Delta = np.array([bls.Delta for bls in sonophores])
+        LJ_approx = {k: np.array([bls.LJ_approx[k] for bls in sonophores])
+                     for k in self.LJ_approx.keys()}
+
+        # Compute initial conditions of all batch members (from nearest cached neighbours
+        # if warm start is enabled)
+        keys = [bls.warmStartKey(drive, Q, Pm_comp_method) if warm_start else None
+                for bls, Q in zip(sonophores, Qms)]
+        y0 = [bls.warmInitialConditions(key) for bls, key in zip(sonophores, keys)]
+        y0 = [bls.initialConditions(drive, Q, drive.dt, Pm_comp_method=Pm_comp_method)
+              if y is None else y for bls, Q, y in zip(sonophores, Qm0, y0)]
+
+        # Initialize solver and compute solution
+        solver = BatchPeriodicSolver(
+            drive.periodicity,                            # periodicity
+            y0[0].keys(),                                 # variables list
+            lambda t, y, im: self.batchDerivatives(       # dfunc
+                t, y, drive, Qm_t(t)[im], Delta[im], {k: v[im] for k, v in LJ_approx.items()}),
+            len(y0),                                      # batch size
+            primary_vars=['Z', 'ng'],                     # primary variables
+            dt=drive.dt,                                  # time step
+            stats=self.solver_stats                       # statistics
+        )
+        data = solver(y0, nmax=nmax, nmin=nmin)
+
+        # Store converged states in warm start cache
+        for bls, key, x in zip(sonophores, keys, data):
+            if key is not None:
+                bls.warm_start_cache.put(*key, [x[k].values[-1] for k in ['U', 'Z', 'ng']])
+
+        # Remove velocity timeries from solutions
+        for x in data:
+            del x['U']
+
+        # Return list of solution dataframes
+        return data
+
     @Model.addMeta
     @Model.logDesc
     @Model.checkSimParams
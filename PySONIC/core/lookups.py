@@ -10,10 +10,14 @@ from sys import getsizeof
 import json
 import pickle
 import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from bisect import bisect_right
 import numpy as np
 from scipy.interpolate import interp1d
 
-from ..utils import isWithin, isIterable, moveItem
+from ..utils import logger, isWithin, isIterable, moveItem
 
 
 class Lookup:
@@ -210,8 +214,10 @@ class Lookup:
         return self.inputs.index(key)
 
     def copy(self):
-        ''' Return a copy of the current lookup object. '''
-        return self.__class__(self.refs, self.tables, **self.kwattrs)
+        ''' Return a copy of the current lookup object (with new references and tables
+            dictionaries, but sharing the same arrays).
+        '''
+        return self.__class__(self.refs.copy(), dict(self.items()), **self.kwattrs)
 
     def checkInterpMethod(self, interp_method):
         if interp_method not in self.interp_choices:
@@ -224,16 +230,39 @@ class Lookup:
     def getInterpolationDegree(self):
         return int(self.interp_method[-1])
 
-    def getInterpolator(self, ref_key, table_key, axis=-1):
-        ''' Return 1D interpolator function along a given reference vector for a specific table .'''
+    def getInterpolator(self, ref_key, table_key, axis=-1, islice=None):
+        ''' Return 1D interpolator function along a given reference vector for a specific table .
+
+            :param islice: optional slice restricting the reference vector (and table axis)
+        '''
         if self.isPolynomialMethod(self.interp_method):
             return np.poly1d(np.polyfit(self.refs[ref_key], self.tables[table_key],
                                         self.getInterpolationDegree()))
         else:
             fill_value = 'extrapolate' if self.kwattrs['extrapolate'] else np.nan
-            return interp1d(self.refs[ref_key], self.tables[table_key], axis=axis,
+            x, y = self.refs[ref_key], self.tables[table_key]
+            if islice is not None:
+                x = x[islice]
+                yslices = [slice(None)] * y.ndim
+                yslices[axis] = islice
+                y = y[tuple(yslices)]
+            return interp1d(x, y, axis=axis,
                             kind=self.interp_method, assume_sorted=True, fill_value=fill_value)
 
+    def getBracketingSlice(self, key, value):
+        ''' Get the slice of a reference vector spanning the interval that brackets
+            one/several specific value(s), with at least 2 reference values.
+        '''
+        ref = self.refs[key]
+        x = np.asarray(value)
+        if x.size == 0 or not np.isfinite(x).all():
+            return slice(None)
+        i0 = max(np.searchsorted(ref, x.min(), side='right') - 1, 0)
+        i1 = min(np.searchsorted(ref, x.max(), side='left'), ref.size - 1)
+        i1 = max(i1, min(i0 + 1, ref.size - 1))
+        i0 = min(i0, i1 - 1)
+        return slice(i0, i1 + 1)
+
     def project(self, key, value):
         ''' Return a new lookup object in which tables are interpolated at one/several
             specific value(s) along a given dimension.
@@ -263,8 +292,13 @@ class Lookup:
             # If reference vector has only 1 value, take the mean along corresponding dimension
             new_tables = {k: v.mean(axis=axis) for k, v in self.items()}
         else:
-            # Otherwise, interpolate lookup tables appropriate value(s) along the reference vector
-            new_tables = {k: self.getInterpolator(key, k, axis=axis)(value) for k in self.keys()}
+            # Otherwise, interpolate lookup tables appropriate value(s) along the reference vector.
+            # For linear interpolation, only the hyperslab bracketing the value(s) is needed,
+            # which avoids reading entire tables (e.g. when memory-mapped).
+            islice = self.getBracketingSlice(key, value) if self.interp_method == 'linear' else None
+            new_tables = {
+                k: self.getInterpolator(key, k, axis=axis, islice=islice)(value)
+                for k in self.keys()}
 
         # Construct new refs dictionary, deleting
         new_refs = self.refs.copy()
@@ -361,6 +395,32 @@ class Lookup:
         tables = {k: rfunc(v, axis=iaxis) for k, v in self.items()}
         return self.__class__(refs, tables, **self.kwattrs)
 
+    def take(self, ref_name, indices):
+        ''' Return a new lookup object restricted to specific indexes along a reference axis. '''
+        iaxis = self.getAxisIndex(ref_name)
+        refs = {**self.refs, ref_name: self.refs[ref_name][indices]}
+        tables = {k: np.take(v, indices, axis=iaxis) for k, v in self.items()}
+        return self.__class__(refs, tables, **self.kwattrs)
+
+    def merge(self, other, ref_name):
+        ''' Return a new lookup object merging the entries of another lookup object along
+            a specific reference axis (all other references being identical), sorted by
+            ascending reference values.
+        '''
+        iaxis = self.getAxisIndex(ref_name)
+        if self.inputs != other.inputs or self.outputs != other.outputs:
+            raise ValueError('Cannot merge lookups with differing inputs or outputs')
+        for k, v in self.refitems():
+            if k != ref_name and (v.size != other.refs[k].size or (other.refs[k] != v).any()):
+                raise ValueError(f'Cannot merge lookups with differing {k} reference')
+        ref = np.concatenate((self.refs[ref_name], other.refs[ref_name]))
+        isort = np.argsort(ref, kind='stable')
+        refs = {**self.refs, ref_name: ref[isort]}
+        tables = {
+            k: np.take(np.concatenate((v, other[k]), axis=iaxis), isort, axis=iaxis)
+            for k, v in self.items()}
+        return self.__class__(refs, tables, **self.kwattrs)
+
     def toDict(self):
         ''' Translate self object into a dictionary. '''
         return {
@@ -403,6 +463,47 @@ class Lookup:
             return cls(d['refs'], d['tables'], Jac = d['Jacobians'])
         return cls(d['refs'], d['tables'])
 
+    @staticmethod
+    def getNpyDirPath(fpath):
+        ''' Get the path of the NPY lookup directory associated to a given lookup file. '''
+        return f'{os.path.splitext(fpath)[0]}_npy'
+
+    def toNpy(self, dirpath):
+        ''' Save self object to a directory of NPY files (one per reference vector and table),
+            which can be memory-mapped upon loading.
+        '''
+        os.makedirs(dirpath, exist_ok=True)
+        groups = {'refs': self.refs, 'tables': self.tables}
+        if self.Jac is not None:
+            groups['Jacobians'] = self.Jac.tables
+        for group, d in groups.items():
+            for k, v in d.items():
+                np.save(os.path.join(dirpath, f'{group}_{k}.npy'), np.ascontiguousarray(v))
+        with open(os.path.join(dirpath, 'index.json'), 'w') as fh:
+            json.dump({group: list(d.keys()) for group, d in groups.items()}, fh)
+
+    @classmethod
+    def fromNpy(cls, dirpath, mmap_mode='r'):
+        ''' Construct lookup instance from a directory of NPY files.
+
+            :param dirpath: path to the lookup directory
+            :param mmap_mode: memory-mapping mode of the tables (None to load them in memory)
+            :return: lookup object, whose tables are only read from disk upon access
+        '''
+        index_fpath = os.path.join(dirpath, 'index.json')
+        cls.checkForExistence(index_fpath)
+        with open(index_fpath) as fh:
+            index = json.load(fh)
+        d = {}
+        for group, keys in index.items():
+            d[group] = {
+                k: np.load(os.path.join(dirpath, f'{group}_{k}.npy'),
+                           mmap_mode=None if group == 'refs' else mmap_mode)
+                for k in keys}
+        if 'Jacobians' in d.keys():
+            return cls(d['refs'], d['tables'], Jac=d['Jacobians'])
+        return cls(d['refs'], d['tables'])
+
     @staticmethod
     def checkForExistence(fpath):
         ''' Raise an error if filepath does not correspond to an existing file. '''
@@ -532,3 +633,353 @@ class EffectiveVariablesDict():
 
     def pop(self, key):
         return self.d.pop(key)
+
+
+class LookupCache:
+    ''' Least-recently-used cache of lookup objects, bounded by a total memory budget.
+
+        Cached lookups are returned as shallow copies (new tables dictionary sharing the
+        same arrays), such that adding or removing tables from a returned lookup does not
+        alter the cached entry.
+    '''
+
+    def __init__(self, max_size):
+        ''' Constructor.
+
+            :param max_size: memory budget (in bytes) of all cached lookups (0 to disable caching)
+        '''
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}({len(self)} entries, {self.size * 1e-6:.1f} / '
+                f'{self.max_size * 1e-6:.1f} MB, {self.hits} hits, {self.misses} misses)')
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        ''' Return a copy of the cached lookup for a given key (None if not cached). '''
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0].copy()
+
+    def put(self, key, lkp):
+        ''' Add a lookup to the cache, evicting least recently used entries if needed. '''
+        size = lkp.__sizeof__()
+        if size > self.max_size:
+            return
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (lkp.copy(), size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def clear(self):
+        ''' Remove all entries and reset counters. '''
+        self.entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        ''' Dictionary of cache usage statistics. '''
+        return {
+            'entries': len(self),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class SharedLookup:
+    ''' Lookup placed once in memory shared between processes, to which worker processes
+        attach as read-only lookup views, without copying its tables.
+
+        Tables are stored as NPY files in a RAM-backed directory (if available) and
+        memory-mapped upon attachment, such that all processes read the same physical pages.
+        Pickling a shared lookup (e.g. to send it to spawned workers) only transfers the
+        location of these files.
+    '''
+
+    root = '/dev/shm' if os.path.isdir('/dev/shm') else None  # storage root (None: temp dir)
+
+    def __init__(self, lkp):
+        ''' Constructor.
+
+            :param lkp: lookup object to share
+        '''
+        self.lkp_class = lkp.__class__
+        self.kwattrs = {
+            'interp_method': lkp.interp_method,
+            'extrapolate': lkp.extrapolate,
+            'Q_ext': lkp.Q_ext
+        }
+        self.dirpath = tempfile.mkdtemp(prefix='pysonic_lookup_', dir=self.root)
+        lkp.toNpy(self.dirpath)
+        self.owner_pid = os.getpid()
+        self.view = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.dirpath})'
+
+    def __getstate__(self):
+        return {**self.__dict__, 'view': None}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def isAvailable(self):
+        ''' Whether the shared lookup can be attached from the current process (i.e. whether
+            it runs on the host that created it, and the lookup has not been released).
+        '''
+        return self.view is not None or os.path.isdir(self.dirpath)
+
+    def attach(self):
+        ''' Get a read-only view of the shared lookup.
+
+            :return: lookup object (with its own references and tables dictionaries, such that
+             tables can be added or removed without affecting the shared lookup)
+        '''
+        if self.view is None:
+            lkp = self.lkp_class.fromNpy(self.dirpath, mmap_mode='r')
+            lkp.interp_method = self.kwattrs['interp_method']
+            lkp.extrapolate = self.kwattrs['extrapolate']
+            lkp.Q_ext = self.kwattrs['Q_ext']
+            self.view = lkp
+        return self.view.copy()
+
+    def release(self):
+        ''' Remove the shared lookup files (only from the process that created them). Views
+            that are already attached remain valid until they are discarded.
+        '''
+        if os.getpid() == self.owner_pid and os.path.isdir(self.dirpath):
+            shutil.rmtree(self.dirpath)
+
+
+class LinearInterpolator1D:
+    ''' Linear interpolation engine evaluating all the output tables of a 1D lookup at once.
+
+        All tables are stacked into a single contiguous (n_outputs x n_ref) array, such that
+        the bracketing index and interpolation weight are computed only once per call, and
+        all outputs are then interpolated in a single vectorized pass.
+    '''
+
+    def __init__(self, lkp, keys=None):
+        ''' Constructor.
+
+            :param lkp: 1-dimensional lookup object
+            :param keys: optional ordered list of output tables to stack (default: all)
+        '''
+        assert lkp.ndims == 1, 'Cannot create 1D interpolator from multi-dimensional lookup'
+        if lkp.ref.size < 2:
+            raise ValueError(f'{lkp.refkey} reference vector must contain at least 2 values')
+        self.refkey = lkp.refkey
+        self.ref = np.ascontiguousarray(lkp.ref, dtype=float)
+        self.reflist = self.ref.tolist()
+        self.refbounds = lkp.refbounds
+        self.outputs = lkp.outputs if keys is None else list(keys)
+        self.stack = np.ascontiguousarray(
+            np.vstack([lkp.tables[k] for k in self.outputs]), dtype=float)
+        if self.stack.shape != (len(self.outputs), self.ref.size):
+            raise ValueError(
+                f'Tables dimensions {self.stack.shape[1:]} do not match reference {lkp.dims}')
+        # Pre-compute slopes between consecutive reference points
+        self.slopes = np.diff(self.stack, axis=1) / np.diff(self.ref)
+        self.dict_class = EffectiveVariablesDict if isinstance(
+            lkp, EffectiveVariablesLookup) else dict
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.refkey}: {self.ref.size})[{len(self.outputs)} tables]'
+
+    def getIndex(self, x):
+        ''' Get the index of the lower bracketing reference value(s). '''
+        return np.clip(np.searchsorted(self.ref, x, side='right') - 1, 0, self.ref.size - 2)
+
+    def __call__(self, value):
+        ''' Interpolate all output tables at one/several specific value(s).
+
+            :param value: specific input value(s)
+            :return: array of interpolated values, with outputs along the first axis
+        '''
+        if isIterable(value):
+            x = np.asarray(value, dtype=float)
+            i = self.getIndex(x)
+            out = self.stack[:, i] + self.slopes[:, i] * (x - self.ref[i])
+            out[:, np.logical_or(x < self.refbounds[0], x > self.refbounds[1])] = np.nan
+            return out
+        # Scalar case: bisection on a plain list is much faster than numpy dispatch
+        x = isWithin(self.refkey, value, self.refbounds)
+        i = min(max(bisect_right(self.reflist, x) - 1, 0), len(self.reflist) - 2)
+        return self.stack[:, i] + self.slopes[:, i] * (x - self.reflist[i])
+
+    def interpVar1D(self, value, key):
+        ''' Interpolate a specific output table at one/several specific value(s). '''
+        return self(value)[self.outputs.index(key)]
+
+    def interpolate1D(self, value):
+        ''' Interpolate all output tables at one/several specific value(s).
+
+            :param value: specific input value(s)
+            :return: dictionary of output keys: interpolated value(s)
+        '''
+        return self.dict_class(dict(zip(self.outputs, self(value))))
+
+
+class BilinearInterpolator2D:
+    ''' Bilinear interpolation engine evaluating output tables of a 2D lookup at arbitrary
+        arrays of (x, y) points in a single vectorized pass.
+
+        Evaluation mirrors a linear projection along the first input (which must be within
+        reference bounds) followed by a linear interpolation along the second input (which
+        returns NaN outside of reference bounds).
+
+        The table rows (one per x reference value) are concatenated along a single
+        monotonic coordinate, such that interpolating along y on the two bracketing rows
+        of every point boils down to two calls to the (fast) 1D np.interp routine.
+    '''
+
+    def __init__(self, lkp, keys=None):
+        ''' Constructor.
+
+            :param lkp: 2-dimensional lookup object
+            :param keys: optional ordered list of output tables to stack (default: all)
+        '''
+        assert lkp.ndims == 2, 'Cannot create 2D interpolator from lookup that is not 2D'
+        self.inputs = lkp.inputs
+        self.xref, self.yref = [np.asarray(lkp.refs[k], dtype=float) for k in self.inputs]
+        if self.yref.size < 2:
+            raise ValueError(f'{self.inputs[1]} reference vector must contain at least 2 values')
+        self.outputs = lkp.outputs if keys is None else list(keys)
+        stack = np.stack([lkp.tables[k] for k in self.outputs]).astype(float)
+        if stack.shape != (len(self.outputs), *lkp.dims):
+            raise ValueError(
+                f'Tables dimensions {stack.shape[1:]} do not match references {lkp.dims}')
+        # Concatenate rows along a monotonic coordinate, with rows spaced by twice the y span
+        self.yspan = 2 * (self.yref[-1] - self.yref[0])
+        self.ycat = (np.arange(self.xref.size)[:, np.newaxis] * self.yspan +
+                     (self.yref - self.yref[0])).ravel()
+        self.tcat = stack.reshape(len(self.outputs), -1)
+
+    def __repr__(self):
+        ref_str = ', '.join([f'{k}: {v.size}' for k, v in zip(self.inputs, (self.xref, self.yref))])
+        return f'{self.__class__.__name__}({ref_str})[{len(self.outputs)} tables]'
+
+    def __call__(self, x, y):
+        ''' Interpolate all output tables at arrays of (x, y) points.
+
+            :param x: values along the first input
+            :param y: values along the second input
+            :return: array of interpolated values, with outputs along the first axis
+        '''
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        nx = self.xref.size
+
+        # Get index and weight of lower bracketing row for each point
+        if x.size > 0:
+            xbounds = (self.xref.min(), self.xref.max())
+            isWithin(self.inputs[0], x.min(), xbounds)
+            isWithin(self.inputs[0], x.max(), xbounds)
+        if nx > 1:
+            fx = np.interp(x, self.xref, np.arange(nx))
+            ix = np.minimum(fx.astype(int), nx - 2)
+            wx = fx - ix
+        else:
+            ix, wx = np.zeros(x.shape, dtype=int), np.zeros(x.shape)
+
+        # Interpolate along y on lower and upper rows, and combine them
+        yc = (y - self.yref[0]) + ix * self.yspan
+        dyc = self.yspan if nx > 1 else 0.
+        out = np.empty((len(self.outputs), *np.broadcast(x, y).shape))
+        for i, t in enumerate(self.tcat):
+            lower = np.interp(yc, self.ycat, t)
+            out[i] = lower + (np.interp(yc + dyc, self.ycat, t) - lower) * wx
+        out[:, np.logical_or(y < self.yref[0], y > self.yref[-1])] = np.nan
+        return out
+
+    def interpVar2D(self, x, y, key):
+        ''' Interpolate a specific output table at arrays of (x, y) points. '''
+        return self(x, y)[self.outputs.index(key)]
+
+
+def adaptiveLookup(func, key, xref, rtol, ninit=5, exclude=None, lkp0=None):
+    ''' Build a lookup object along a non-uniformly sampled reference vector, by adaptively
+        refining the sampling only where linear interpolation between neighbouring samples
+        fails to predict the tables within a given relative tolerance.
+
+        At each iteration, the midpoints of all intervals flagged for refinement are computed
+        in a single call, compared to their prediction by projection of the current lookup,
+        and added to the lookup (since they have been computed anyway). Only the two
+        sub-intervals of midpoints whose maximal relative error (across outputs and all other
+        dimensions, normalized by the range of each table) exceeds the tolerance are flagged
+        for further refinement.
+
+        :param func: function computing a lookup object for a given vector of reference values
+        :param key: name of the refined reference vector
+        :param xref: sorted vector of candidate reference values (finest allowed sampling)
+        :param rtol: relative interpolation tolerance
+        :param ninit: number of (evenly spaced) candidate values used for the initial sampling
+        :param exclude: list of output tables excluded from the error evaluation
+        :param lkp0: optional lookup already computed at a subset of the candidate values,
+            used as initial sampling (instead of computing the "ninit" initial values)
+        :return: lookup object sampled on a subset of the candidate reference values
+    '''
+    xref = np.asarray(xref)
+    exclude = [] if exclude is None else exclude
+    n = xref.size
+    if lkp0 is None:
+        inds = np.unique(np.round(np.linspace(0, n - 1, min(ninit, n))).astype(int))
+        lkp = func(xref[inds])
+    else:
+        inds = np.flatnonzero(np.isin(xref, lkp0.refs[key]))
+        if inds.size != lkp0.refs[key].size:
+            raise ValueError(f'initial {key} reference values must be among candidate values')
+        lkp = lkp0
+    intervals = [(i, j) for i, j in zip(inds[:-1], inds[1:]) if j - i > 1]
+    while len(intervals) > 0:
+        # Compute tables at intervals midpoints, and their prediction by interpolation
+        imids = np.array([(i + j) // 2 for i, j in intervals])
+        new = func(xref[imids])
+        pred = lkp.project(key, xref[imids])
+
+        # Compute maximal relative interpolation error at each midpoint
+        iaxis = lkp.getAxisIndex(key)
+        errs = np.zeros(imids.size)
+        for k in lkp.outputs:
+            if k in exclude:
+                continue
+            scale = np.nanmax(lkp[k]) - np.nanmin(lkp[k])
+            if not scale > 0:
+                scale = 1.
+            dev = np.abs(new[k] - pred[k]) / scale
+            dev = np.moveaxis(dev, iaxis, 0).reshape(imids.size, -1)
+            errs = np.fmax(errs, np.fmax.reduce(dev, axis=1))
+
+        # Add all midpoints to lookup and flag sub-intervals of inaccurate ones for refinement
+        irefine = errs > rtol
+        logger.info(
+            f'{key} refinement: {irefine.sum()}/{imids.size} midpoints above tolerance '
+            f'(max relative error = {errs.max():.2e})')
+        lkp = lkp.merge(new, key)
+        intervals = [
+            x for (i, j), im, refine in zip(intervals, imids, irefine) if refine
+            for x in ((i, im), (im, j)) if x[1] - x[0] > 1]
+    logger.info(f'{key} refinement: {lkp.refs[key].size}/{n} reference values retained')
+    return lkp
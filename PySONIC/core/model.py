@@ -13,6 +13,8 @@ import numpy as np
 from boltons.strutils import cardinalize
 
 from .batches import Batch
+from .solvers import SolverStats
+from .timeseries import asTimeSeries
 from ..threshold import titrate
 from ..utils import *
 
@@ -20,6 +22,10 @@ from ..utils import *
 class Model(metaclass=abc.ABCMeta):
     ''' Generic model interface. '''
 
+    instrumented = False  # whether to record solver statistics in simulations metadata
+    solver_stats = None   # statistics object of the ongoing simulation solvers (if instrumented)
+    dense_output = False  # whether to return dense solution objects instead of sampled timeseries
+
     @property
     @abc.abstractmethod
     def tscale(self):
@@ -135,13 +141,28 @@ class Model(metaclass=abc.ABCMeta):
 
     @staticmethod
     def addMeta(simfunc):
-        ''' Add informative dictionary to simulation output '''
+        ''' Add informative dictionary to simulation output.
+
+            If the model is instrumented, a statistics object is assigned to the model instance
+            for the duration of the simulation, passed to all solvers it creates, and its
+            statistics are added to the dictionary.
+        '''
         @wraps(simfunc)
         def wrapper(self, *args, **kwargs):
-            data, tcomp = timer(simfunc)(self, *args, **kwargs)
+            if self.instrumented:
+                outer_stats, self.solver_stats = self.solver_stats, SolverStats()
+                try:
+                    data, tcomp = timer(simfunc)(self, *args, **kwargs)
+                    solver_stats = self.solver_stats.toDict(tcomp)
+                finally:
+                    self.solver_stats = outer_stats
+            else:
+                data, tcomp = timer(simfunc)(self, *args, **kwargs)
             logger.debug('completed in %ss', si_format(tcomp, 1))
             meta_dict = getMeta(self, simfunc, *args, **kwargs)
             meta_dict['tcomp'] = tcomp
+            if self.instrumented:
+                meta_dict['solver_stats'] = solver_stats
             return data, meta_dict
         return wrapper
 
@@ -154,7 +175,7 @@ class Model(metaclass=abc.ABCMeta):
             if out is None:
                 return None
             data, meta = out
-            nspikes = self.getNSpikes(data)
+            nspikes = self.getNSpikes(asTimeSeries(data))
             logger.debug(f'{nspikes} {cardinalize("spike", nspikes)} detected')
             return data, meta
 
@@ -181,8 +202,10 @@ class Model(metaclass=abc.ABCMeta):
             return simfunc(self, *args, **kwargs)
         return wrapper
 
-    def titrate(self, *args, **kwargs):
-        return titrate(self, *args, **kwargs)
+    def titrate(self, *args, xfunc=None, **kwargs):
+        if xfunc is None:
+            xfunc = self.titrationFunc
+        return titrate(self, *args, xfunc=lambda data: xfunc(asTimeSeries(data)), **kwargs)
 
     @staticmethod
     def checkTitrate(simfunc):
@@ -9,7 +9,8 @@ import logging
 import numpy as np
 import datetime
 
-from .solvers import EventDrivenSolver, HybridSolver
+from .solvers import EventDrivenSolver, HybridSolver, MultirateSolver
+from .sinks import DecimatingSink
 from .bls import BilayerSonophore
 from .pneuron import PointNeuron
 from .model import Model
@@ -18,7 +19,9 @@ from .protocols import *
 from ..utils import *
 from ..constants import *
 from ..postpro import getFixedPoints
-from .lookups import EffectiveVariablesLookup
+from .lookups import (
+    EffectiveVariablesLookup, LinearInterpolator1D, BilinearInterpolator2D, LookupCache,
+    SharedLookup)
 from ..neurons import getPointNeuron
 
 
@@ -28,6 +31,13 @@ class NeuronalBilayerSonophore(BilayerSonophore):
 
     tscale = 'ms'  # relevant temporal scale of the model
     simkey = 'ASTIM'  # keyword used to characterize simulations made with this model
+    lookup_cache = LookupCache(LOOKUP_CACHE_MAX_SIZE)  # process-wide cache of 2D lookups
+    sim_cost_rates = {  # default computation cost rates of simulations, per integration method
+        'full': FULL_COST_RATE,
+        'hybrid': HYBRID_COST_RATE,
+        'multirate': MULTIRATE_COST_RATE,
+        'sonic': SONIC_COST_RATE
+    }
 
     def __init__(self, a, pneuron, embedding_depth=0.0):
         ''' Constructor of the class.
@@ -37,6 +47,7 @@ class NeuronalBilayerSonophore(BilayerSonophore):
             :param embedding_depth: depth of the embedding tissue around the membrane (m)
         '''
         self.pneuron = pneuron
+        self.shared_lookups = {}  # 2D lookups shared with worker processes
         super().__init__(a, pneuron.Cm0, pneuron.Qm0, embedding_depth=embedding_depth)
 
     @property
@@ -140,17 +151,128 @@ class NeuronalBilayerSonophore(BilayerSonophore):
             :param lkp: 2D lookup object
             :return: interpolated effective variable vector
         '''
-        x = np.zeros(stim.size)
-        stim_vals = np.unique(stim)
-        for s in stim_vals:
-            x[stim == s] = lkp.project('A', s).interpVar1D(Qm[stim == s], key)
-        return x
+        return NeuronalBilayerSonophore.interpEffVariables(Qm, stim, lkp, keys=[key])[key]
+
+    @staticmethod
+    def interpEffVariables(Qm, stim, lkp, keys=None):
+        ''' Interpolate several Q-dependent effective variables along various stimulation
+            states of a solution, using a single vectorized bilinear evaluation.
+
+            :param Qm: charge density solution vector
+            :param stim: stimulation state solution vector
+            :param lkp: 2D lookup object
+            :param keys: list of lookup variable keys (default: all)
+            :return: dictionary of interpolated effective variable vectors
+        '''
+        interp = BilinearInterpolator2D(lkp, keys=keys)
+        values = {'A': stim, 'Q': Qm}
+        return dict(zip(interp.outputs, interp(*[values[k] for k in lkp.inputs])))
 
     @staticmethod
     def spatialAverage(fs, x, x0):
         ''' fs-modulated spatial averaging. '''
         return fs * x + (1 - fs) * x0
 
+    def getQmCycle(self, drive, Qm0, Qm_overtones=None):
+        ''' Get the imposed charge density profile over an acoustic cycle.
+
+            :param drive: acoustic drive object
+            :param Qm0: imposed (mean) charge density (C/m2)
+            :param Qm_overtones: optional list of (amplitude, phase) charge Fourier overtones
+            :return: charge profile (scalar or T-periodic vector) and number of overtones
+        '''
+        if Qm_overtones is None:
+            # Constant Qm profile
+            return Qm0, 0
+        # Qm profile as Fourier series
+        A_Qm, phi_Qm = list(zip(*Qm_overtones))
+        Qm_fft = np.hstack(([Qm0 + 0j], A_Qm * (np.cos(phi_Qm) + 1j * np.sin(phi_Qm))))
+        Qm_cycle = np.fft.irfft(Qm_fft, n=drive.nPerCycle) * drive.nPerCycle
+        return Qm_cycle, len(A_Qm)
+
+    def setRestingCapacitance(self, Cm0):
+        ''' Set the membrane capacitance at rest of the model and its point-neuron, and
+            re-initialize the sonophore resting parameters accordingly.
+
+            :param Cm0: membrane capacitance at rest (F/m2)
+        '''
+        self.Cm0 = Cm0 #code was adapted so self.Cm0 is not used but maybe better to just change it -> this gets defined in init of BilayerSonophore
+        self.pneuron.Cm0 = Cm0 #also change the capacitance in the pneuron (Qbounds is already calculated before this adaptation so has no influence in Q-range)
+        self.Qm0 = self.Cm0 * self.pneuron.Vm0 * 1e-3
+        self.__init__(self.a, self.pneuron)
+
+    def cycleEffVars(self, drive, Z_cycle, fs, Qm0, Qm_cycle, novertones):
+        ''' Compute "effective" coefficients of the HH system from the deflection profile over
+            an acoustic cycle, for the current membrane capacitance at rest.
+
+            :param drive: acoustic drive object
+            :param Z_cycle: deflection profile over the last acoustic cycle (m)
+            :param fs: list of sonophore membrane coverage fractions
+            :param Qm0: imposed (mean) charge density (C/m2)
+            :param Qm_cycle: imposed charge profile (scalar or T-periodic vector)
+            :param novertones: number of charge Fourier overtones
+            :return: list of dictionaries of effective variables
+        '''
+        new_bounds = self.pneuron.Qbounds
+        if Qm0 > new_bounds[1] or Qm0 < new_bounds[0]:
+            #print(f'{Qm0} doesnt fall in the range of {new_bounds}')
+            effvars = {'V': 0}
+            effrates = self.pneuron.getZeroRates() #add zeroes in the LUT #POTENTIAL RISK
+
+            if novertones > 0:
+                for i in range(1, novertones + 1):
+                    effvars[f'A_V{i}'] = 0
+                    effvars[f'phi_V{i}'] = 0
+
+            effvars.update(effrates)
+            return [effvars]
+
+        Cm_cycle = self.v_capacitance(Z_cycle, self.Cm0)  # F/m2
+
+        # Compute membrane potential vectors for all coverage fractions
+        Vm_cycles = np.array([
+            Qm_cycle / self.spatialAverage(x, Cm_cycle, self.Cm0) * 1e3 for x in fs])  # mV
+
+        # Compute effective rates for all coverage fractions at once, by evaluating
+        # rate functions on the whole membrane potential matrix
+        effrates = self.pneuron.getEffRates(Vm_cycles)
+
+        # For each coverage fraction
+        effvars_list = []
+        for j, Vm_cycle in enumerate(Vm_cycles):
+            # Compute effective (cycle-average) membrane potential
+            effvars = {'V': np.mean(Vm_cycle)}
+
+            # If Qm overtones were provided, compute Vm overtones
+            if novertones > 0:
+                # classic Fourier coefficients
+                Vm_coeffs = np.fft.rfft(Vm_cycle)[:novertones + 1] / drive.nPerCycle
+                # amplitude-phase formalism
+                A_Vm, phi_Vm = np.abs(Vm_coeffs), np.angle(Vm_coeffs)
+                for i in range(1, novertones + 1):
+                    effvars[f'A_V{i}'] = A_Vm[i]
+                    effvars[f'phi_V{i}'] = phi_Vm[i]
+
+            # Add computed effective rates
+            effvars.update({k: v[j] for k, v in effrates.items()})
+            # Append to list
+            effvars_list.append(effvars)
+
+        return effvars_list
+
+    def logEffVars(self, drive, Qstr, fs, Qm_overtones=None):
+        ''' Log the computation of effective variables. '''
+        log = f'{self}: lookups @ {drive.desc}, {Qstr}'
+        if Qm_overtones is not None:
+            log = log + ', ' + ', '.join([
+                f'Qm{i + 1} = ({x[0] * 1e5:.2f} nC/cm2, {x[1]:.2f} rad)'
+                for i, x in enumerate(Qm_overtones)])
+        if len(fs) > 1:
+            log += f', fs = {fs.min() * 1e2:.0f} - {fs.max() * 1e2:.0f}%'
+        else:
+            log += f', fs = {fs[0] * 1e2:.0f}%'
+        logger.info(log)
+
     @timer
     def computeEffVars(self, drive, Cm0, fs, Qm0, Qm_overtones=None):
         ''' Compute "effective" coefficients of the HH system for a specific
@@ -161,107 +283,87 @@ class NeuronalBilayerSonophore(BilayerSonophore):
             acoustic cycle to yield "effective" coefficients.
 
             :param drive: acoustic drive object
+            :param Cm0: list of membrane capacitances at rest (F/m2)
             :param fs: list of sonophore membrane coverage fractions
             :param Qm: imposed charge density (C/m2)
             :return: list with computation time and a list of dictionaries of effective variables
         '''
         if not isIterable(fs):
             fs = [fs]
-        if Qm_overtones is None:
-            # Constant Qm profile
-            Qm_cycle = Qm0
-            novertones = 0
-        else:
-            # Qm profile as Fourier series
-            A_Qm, phi_Qm = list(zip(*Qm_overtones))
-            Qm_fft = np.hstack(([Qm0 + 0j], A_Qm * (np.cos(phi_Qm) + 1j * np.sin(phi_Qm))))
-            Qm_cycle = np.fft.irfft(Qm_fft, n=drive.nPerCycle) * drive.nPerCycle
-            novertones = len(A_Qm)
-        
+        Qm_cycle, novertones = self.getQmCycle(drive, Qm0, Qm_overtones)
+
         effvars_list = []
 
         # For each membrane capacitance at rest
         for y in Cm0:
-            self.Cm0 = y #code was adapted so self.Cm0 is not used but maybe better to just change it -> this gets defined in init of BilayerSonophore
-            self.pneuron.Cm0 = y #also change the capacitance in the pneuron (Qbounds is already calculated before this adaptation so has no influence in Q-range)
-            self.Qm0 = self.Cm0 * self.pneuron.Vm0 * 1e-3
-            self.__init__(self.a,self.pneuron)
-            #print(f'pre simulation {"-"*260} ###')
+            self.setRestingCapacitance(y)
             # Run simulation and extract capacitance vector from last cycle
-            #print('drive.A:\t',drive.A)
-            #print(f"PtotQS: {super().PtotQS(2.4681524473420407e-10,self.ng0,0,0)}") 
-            #print(f"PMavgpred: {super().PMavgpred(2.4681524473420407e-10)}"); quit()
             if drive.A < 1e-10: #if there is no stimulation -> amplitude = 0, only simulate 2 periods as the deflection is constant
-                Z_cycle = super().simCycles(drive, Qm_cycle,nmax=2).tail(drive.nPerCycle)['Z'].values#;print(len(Z_cycle))  # m
+                Z_cycle = super().simCycles(drive, Qm_cycle,nmax=2).tail(drive.nPerCycle)['Z'].values  # m
             else:
-                Z_cycle = super().simCycles(drive, Qm_cycle).tail(drive.nPerCycle)['Z'].values#;print(len(Z_cycle))  # m
-            #print(Z_cycle)
-            #print(f"simulated for: {drive},{fs},{Qm0} ###")
-            # print(f'post simulation {"-"*260} ###')
-
-            new_bounds = self.pneuron.Qbounds
-            if Qm0 > new_bounds[1] or Qm0 < new_bounds[0]:
-                #print(f'{Qm0} doesnt fall in the range of {new_bounds}')
-                effvars = {'V': 0}
-                effrates = self.pneuron.getZeroRates() #add zeroes in the LUT #POTENTIAL RISK
-
-                if novertones > 0:
-                    for i in range(1, novertones + 1):
-                        effvars[f'A_V{i}'] = 0
-                        effvars[f'phi_V{i}'] = 0
-
-                effvars.update(effrates) 
-                effvars_list.append(effvars)
-                continue
-            #print(Z_cycle)
-            #print(f"Z_cycle = {np.mean(Z_cycle)}")
-            Cm_cycle = self.v_capacitance(Z_cycle,y)#;print(len(Cm_cycle))  # F/m2
-            # print(Cm_cycle)
-            # print(f"Cm_cycle = {np.mean(Cm_cycle)}")
-            # For each coverage fraction
-            for x in fs:
-                # Compute membrane potential vector
-                Vm_cycle = Qm_cycle / self.spatialAverage(x, Cm_cycle, self.Cm0) * 1e3  # mV
-
-                # Compute effective (cycle-average) membrane potential
-                effvars = {'V': np.mean(Vm_cycle)}
-
-                # If Qm overtones were provided, compute Vm overtones
-                if novertones > 0:
-                    # classic Fourier coefficients
-                    Vm_coeffs = np.fft.rfft(Vm_cycle)[:novertones + 1] / drive.nPerCycle
-                    # amplitude-phase formalism
-                    A_Vm, phi_Vm = np.abs(Vm_coeffs), np.angle(Vm_coeffs)
-                    for i in range(1, novertones + 1):
-                        effvars[f'A_V{i}'] = A_Vm[i]
-                        effvars[f'phi_V{i}'] = phi_Vm[i]
-
-                # Add computed effective rates
-                #print(Vm_cycle)
-                #print(y,np.mean(Vm_cycle)) #to check the mean for every possible Cm0 value
-                effrates = self.pneuron.getEffRates(Vm_cycle) #bottleneck part of the code -> takes most time
-
-                effvars.update(effrates) 
-                # Append to list
-                effvars_list.append(effvars)
-
-        #print('effvars:\t',effvars)
+                Z_cycle = super().simCycles(drive, Qm_cycle).tail(drive.nPerCycle)['Z'].values  # m
+            effvars_list += self.cycleEffVars(drive, Z_cycle, fs, Qm0, Qm_cycle, novertones)
 
         # Log process
-        log = f'{self}: lookups @ {drive.desc}, Qm0 = {Qm0 * 1e5:.2f} nC/cm2'
-        if Qm_overtones is not None:
-            log = log + ', ' + ', '.join([
-                f'Qm{i + 1} = ({x[0] * 1e5:.2f} nC/cm2, {x[1]:.2f} rad)'
-                for i, x in enumerate(Qm_overtones)])
-        if len(fs) > 1:
-            log += f', fs = {fs.min() * 1e2:.0f} - {fs.max() * 1e2:.0f}%'
-        else:
-            log += f', fs = {fs[0] * 1e2:.0f}%'
-        logger.info(log)
+        self.logEffVars(drive, f'Qm0 = {Qm0 * 1e5:.2f} nC/cm2', fs, Qm_overtones=Qm_overtones)
 
         # Return effective coefficients
         return effvars_list
 
+    @timer
+    def computeEffVarsBatch(self, drive, Cm0, fs, Qm0s, Qm_overtones=None):
+        ''' Compute "effective" coefficients of the HH system for a specific acoustic
+            stimulus and a whole vector of charge densities.
+
+            Mechanical simulations for all (membrane capacitance, charge density) combinations
+            are run simultaneously as a single vectorized ODE system, each combination being
+            frozen once periodically stable. HH coefficients are then averaged over the last
+            acoustic cycle of each combination to yield "effective" coefficients.
+
+            :param drive: acoustic drive object
+            :param Cm0: list of membrane capacitances at rest (F/m2)
+            :param fs: list of sonophore membrane coverage fractions
+            :param Qm0s: vector of imposed charge densities (C/m2)
+            :return: list with computation time and a list of dictionaries of effective variables,
+             ordered by charge density, then membrane capacitance, then coverage fraction
+             (i.e. as the concatenation of successive computeEffVars outputs along Qm0s)
+        '''
+        if not isIterable(fs):
+            fs = [fs]
+        Qm_cycles, novertones = zip(*[self.getQmCycle(drive, Q, Qm_overtones) for Q in Qm0s])
+        novertones = novertones[0]
+
+        # Gather sonophore objects for each membrane capacitance at rest
+        sonophores = []
+        for y in Cm0:
+            self.setRestingCapacitance(y)
+            sonophores.append(BilayerSonophore(self.a, self.Cm0, self.Qm0, embedding_depth=self.d))
+
+        # Run simulations of all (capacitance, charge) combinations as a single batch, and
+        # extract deflection vectors from last cycles
+        nmax = 2 if drive.A < 1e-10 else None
+        data = super().simCyclesBatch(
+            drive, [Q for bls in sonophores for Q in Qm_cycles],
+            sonophores=[bls for bls in sonophores for Q in Qm_cycles], nmax=nmax)
+        Z_cycles = np.reshape(
+            [x.tail(drive.nPerCycle)['Z'].values for x in data], (len(Cm0), len(Qm0s), -1))
+
+        # Compute effective variables for each charge density and capacitance at rest
+        effvars_lists = [[] for Q in Qm0s]
+        for i, y in enumerate(Cm0):
+            self.setRestingCapacitance(y)
+            for j, (Q, Qm_cycle) in enumerate(zip(Qm0s, Qm_cycles)):
+                effvars_lists[j] += self.cycleEffVars(
+                    drive, Z_cycles[i, j], fs, Q, Qm_cycle, novertones)
+
+        # Log process
+        self.logEffVars(
+            drive, f'Qm0 = {np.min(Qm0s) * 1e5:.2f} - {np.max(Qm0s) * 1e5:.2f} nC/cm2', fs,
+            Qm_overtones=Qm_overtones)
+
+        # Return effective coefficients
+        return [x for effvars_list in effvars_lists for x in effvars_list]
+
     def getLookupFileName(self, a=None, f=None, A=None, Qstart=None, Qend=None, Cm0=None, fs=None, novertones=0.):
         if all(x is None for x in [a, f, A, fs, Cm0]):
             fs = 1.
@@ -297,7 +399,11 @@ class NeuronalBilayerSonophore(BilayerSonophore):
     def getLookup(self, *args, **kwargs):
         keep_tcomp = kwargs.pop('keep_tcomp', False)
         lookup_path = self.getLookupFilePath(*args, **kwargs)
-        lkp = EffectiveVariablesLookup.fromPickle(lookup_path)
+        npy_path = EffectiveVariablesLookup.getNpyDirPath(lookup_path)
+        if os.path.isdir(npy_path):
+            lkp = EffectiveVariablesLookup.fromNpy(npy_path)
+        else:
+            lkp = EffectiveVariablesLookup.fromPickle(lookup_path)
         if 'Q_ext' in lkp.tables.keys(): #Q_ext is used if Cm0 variations are allowed #Cm0_var2 = 1
             lkp.Q_ext = lkp.tables['Q_ext']
             del lkp.tables['Q_ext'] 
@@ -308,6 +414,43 @@ class NeuronalBilayerSonophore(BilayerSonophore):
         return lkp
 
     def getLookup2D(self, f, fs, Cm0=None, novertones=0.):
+        ''' Get the 2D (A, Q) lookup projected at specific coordinates, from the
+            process-wide lookups cache if available.
+        '''
+        key = (self.pneuron.name, self.a, f, fs, Cm0, novertones)
+        shared_lkp = self.shared_lookups.get(key)
+        if shared_lkp is not None and shared_lkp.isAvailable():
+            return shared_lkp.attach()
+        lkp = self.lookup_cache.get(key)
+        if lkp is None:
+            lkp = self.loadLookup2D(f, fs, Cm0=Cm0, novertones=novertones)
+            self.lookup_cache.put(key, lkp)
+        return lkp
+
+    def shareLookup2D(self, f, fs, Cm0=None, novertones=0.):
+        ''' Place the 2D (A, Q) lookup projected at specific coordinates in memory shared with
+            worker processes, from which getLookup2D then retrieves it without copy.
+
+            Shared lookups are carried by the model object, such that they are available to any
+            worker process running its methods on the same host (e.g. batch consumers, pool or
+            task directory workers). They must be released by calling releaseSharedLookups
+            once done.
+
+            :return: shared lookup object
+        '''
+        key = (self.pneuron.name, self.a, f, fs, Cm0, novertones)
+        if key not in self.shared_lookups:
+            lkp = self.loadLookup2D(f, fs, Cm0=Cm0, novertones=novertones)
+            self.shared_lookups[key] = SharedLookup(lkp)
+        return self.shared_lookups[key]
+
+    def releaseSharedLookups(self):
+        ''' Release all shared lookups. '''
+        for shared_lkp in self.shared_lookups.values():
+            shared_lkp.release()
+        self.shared_lookups.clear()
+
+    def loadLookup2D(self, f, fs, Cm0=None, novertones=0.):
         #6D: a,f,A,Q,C,fs -> 2D: A,Q
         #so we only put A and Q in the name before merging them (when calculating the LUT) as they need to be complete to load into the NMODL files
         #when reading them in, A and Q are not included in the name
@@ -360,7 +503,7 @@ class NeuronalBilayerSonophore(BilayerSonophore):
 
             :param t: specific instant in time (s)
             :param y: vector of HH system variables at time t
-            :param lkp: dictionary of 1D data points of "effective" coefficients
+            :param lkp1d: 1D lookup (or stacked 1D interpolator) of "effective" coefficients
              over the charge domain, for specific frequency and amplitude values.
             :param qss_vars: list of QSS variables
             :return: vector of effective system derivatives at time t
@@ -390,6 +533,33 @@ class NeuronalBilayerSonophore(BilayerSonophore):
 
         return [dQmdt, *dstates]
 
+    def getCompiledEffDerivatives(self, lkp, qss_vars):
+        ''' Return the code-generated flat derivatives function of the point-neuron model,
+            or None if the dictionary-based effective derivatives method must be used instead.
+
+            :param lkp: lookup object
+            :param qss_vars: list of QSS variables
+            :return: flat derivatives function (or None)
+        '''
+        if not COMPILED_RHS or len(qss_vars) > 0:
+            return None
+        if not all(k in lkp.outputs for k in self.pneuron.flat_rates_keys):
+            return None
+        return self.pneuron.flatDerivatives(jit=JIT_COMPILED_RHS)
+
+    def compiledEffDerivatives(self, t, y, interp1d, dfunc):
+        ''' Compute the derivatives of the effective system variables using a code-generated
+            flat derivatives function.
+
+            :param t: specific instant in time (s)
+            :param y: vector of HH system variables at time t
+            :param interp1d: stacked 1D interpolator of effective variables, ordered as the
+             point-neuron's flat rates vector
+            :param dfunc: flat derivatives function
+            :return: vector of effective system derivatives at time t
+        '''
+        return dfunc(t, y, interp1d(y[0]))
+
     def deflectionDependentVm(self, Qm, Z, fs):
         ''' Compute deflection (and sonophore coverage fraction) dependent voltage profile. '''
         return Qm / self.spatialAverage(fs, self.v_capacitance(Z), self.Cm0) * 1e3  # mV
@@ -414,9 +584,10 @@ class NeuronalBilayerSonophore(BilayerSonophore):
             y0.keys(),                                                  # variables list
             lambda t, y: self.fullDerivatives(t, y, solver.drive, fs),  # dfunc
             event_params={'drive': drive.copy().updatedX(0.)},          # event parameters
-            dt=drive.dt)                                                # time step
+            dt=drive.dt,                                                # time step
+            stats=self.solver_stats)                                    # statistics
         data = solver(
-            y0, pp.stimEvents(), pp.tstop, target_dt=CLASSIC_TARGET_DT,
+            y0, pp.stimEvents(), pp.tstop, sink=DecimatingSink(CLASSIC_TARGET_DT),
             log_period=pp.tstop / 100 if logger.getEffectiveLevel() <= logging.INFO else None,
             # logfunc=lambda y: f'Qm = {y[3] * 1e5:.2f} nC/cm2'
         )
@@ -433,12 +604,21 @@ class NeuronalBilayerSonophore(BilayerSonophore):
         # Compute initial conditions
         y0 = self.fullInitialConditions(drive, self.Qm0, drive.dt)
 
+        # Select sparse derivatives function (code-generated if available, dictionary-based
+        # otherwise)
+        flat_funcs = self.pneuron.getCompiledDerivatives()
+        if flat_funcs is not None:
+            dfunc_sparse = lambda t, y, Cm: self.pneuron.compiledDerivatives(
+                t, y, flat_funcs, Cm=self.spatialAverage(fs, Cm, self.Cm0))
+        else:
+            dfunc_sparse = lambda t, y, Cm: self.pneuron.derivatives(
+                t, y, Cm=self.spatialAverage(fs, Cm, self.Cm0))
+
         # Initialize solver and compute solution
         solver = HybridSolver(
             y0.keys(),
             lambda t, y: self.fullDerivatives(t, y, solver.drive, fs),  # dfunc
-            lambda t, y, Cm: self.pneuron.derivatives(
-                t, y, Cm=self.spatialAverage(fs, Cm, self.Cm0)),        # dfunc_sparse
+            dfunc_sparse,                                               # dfunc_sparse
             lambda yref: self.capacitance(yref[1]),                     # predfunc
             lambda x: setattr(solver.drive, 'xvar', drive.xvar * x),    # eventfunc
             drive.periodicity,                                          # periodicity
@@ -446,10 +626,12 @@ class NeuronalBilayerSonophore(BilayerSonophore):
             drive.dt,                                                   # dense time step
             drive.dt_sparse,                                            # sparse time step
             event_params={'drive': drive.copy().updatedX(0.)},          # event parameters
-            primary_vars=['Z', 'ng']                                    # primary variables
+            primary_vars=['Z', 'ng'],                                   # primary variables
+            stats=self.solver_stats                                     # statistics
         )
         data = solver(
-            y0, pp.stimEvents(), pp.tstop, HYBRID_UPDATE_INTERVAL, target_dt=CLASSIC_TARGET_DT,
+            y0, pp.stimEvents(), pp.tstop, HYBRID_UPDATE_INTERVAL,
+            sink=DecimatingSink(CLASSIC_TARGET_DT),
             log_period=pp.tstop / 100 if logger.getEffectiveLevel() < logging.INFO else None,
             logfunc=lambda y: f'Qm = {y[3] * 1e5:.2f} nC/cm2'
         )
@@ -462,6 +644,48 @@ class NeuronalBilayerSonophore(BilayerSonophore):
         # Return solution dataframe
         return data
 
+    def __simMultirate(self, drive, pp, fs):
+        # Compute initial conditions
+        y0 = self.fullInitialConditions(drive, self.Qm0, drive.dt)
+
+        # Select slow derivatives function (code-generated if available, dictionary-based
+        # otherwise)
+        flat_funcs = self.pneuron.getCompiledDerivatives()
+        if flat_funcs is not None:
+            dfunc_slow = lambda t, y, Cm: self.pneuron.compiledDerivatives(
+                t, y, flat_funcs, Cm=self.spatialAverage(fs, Cm, self.Cm0))
+        else:
+            dfunc_slow = lambda t, y, Cm: self.pneuron.derivatives(
+                t, y, Cm=self.spatialAverage(fs, Cm, self.Cm0))
+
+        # Initialize solver and compute solution
+        solver = MultirateSolver(
+            lambda x: setattr(solver.drive, 'xvar', drive.xvar * x),    # eventfunc
+            y0.keys(),                                                  # variables list
+            lambda t, y, yc: BilayerSonophore.derivatives(
+                self, t, y, solver.drive, yc[0]),                       # dfunc_fast
+            dfunc_slow,                                                 # dfunc_slow
+            lambda yfast: self.capacitance(yfast[1]),                   # predfunc
+            ['U', 'Z', 'ng'],                                           # fast-evolving variables
+            drive.dt,                                                   # fine time step
+            drive.periodicity,                                          # initial macro step
+            MULTIRATE_NCYCLES_MAX * drive.periodicity,                  # maximal macro step
+            dt_slow=MULTIRATE_NDECIM * drive.dt,                        # slow time step
+            coupling_vars=['Qm'],                                       # coupling variables
+            event_params={'drive': drive.copy().updatedX(0.)},          # event parameters
+            stats=self.solver_stats)                                    # statistics
+        data = solver(
+            y0, pp.stimEvents(), pp.tstop, sink=DecimatingSink(CLASSIC_TARGET_DT),
+            log_period=pp.tstop / 100 if logger.getEffectiveLevel() <= logging.INFO else None)
+
+        # Remove velocity and add voltage timeseries to solution
+        del data['U']
+        data.addColumn(
+            'Vm', self.deflectionDependentVm(data['Qm'], data['Z'], fs), preceding_key='Qm')
+
+        # Return solution dataframe
+        return data
+
     def __simSonic(self, drive, pp, fs, qss_vars=None, pavg=False):
         # Load appropriate 2D lookup
         lkp = self.getLookup2D(drive.f, fs)
@@ -490,42 +714,94 @@ class NeuronalBilayerSonophore(BilayerSonophore):
         # for e,f in zip(vars,post_offset):
         #     if e in y0:
         #         y0[e] = f
-        print(f'y0 = {y0}')
+        logger.debug(f'y0 = {y0}')
 
-        # Initialize solver and compute solution
-        solver = EventDrivenSolver(
-            lambda x: setattr(solver, 'lkp', lkp.project('A', drive.xvar * x)),  # eventfunc
-            y0.keys(),                                                           # variables list
-            lambda t, y: self.effDerivatives(t, y, solver.lkp, qss_vars),        # dfunc
-            event_params={'lkp': lkp.project('A', 0.)},                          # event parameters
-            dt=self.pneuron.chooseTimeStep())                                    # time step
-        data = solver(
-            y0, pp.stimEvents(), pp.tstop,
-            log_period=pp.tstop / 100 if pp.tstop >= 5 else None,
-            max_nsamples=MAX_NSAMPLES_EFFECTIVE)
+        # Select derivatives function (code-generated if available, dictionary-based otherwise)
+        flat_dfunc = self.getCompiledEffDerivatives(lkp, qss_vars)
+        if flat_dfunc is not None:
+            keys = self.pneuron.flat_rates_keys
+            dfunc = lambda t, y: self.compiledEffDerivatives(t, y, solver.lkp, flat_dfunc)
+        else:
+            keys = None
+            dfunc = lambda t, y: self.effDerivatives(t, y, solver.lkp, qss_vars)
 
-        # Interpolate Vm and QSS variables along charge vector and store them in solution dataframe
-        data.addColumn(
-            'Vm', self.interpEffVariable('V', data['Qm'], data.stim * drive.A, lkp),
-            preceding_key='Qm')
-        for k in qss_vars:
-            data[k] = self.interpEffVariable(k, data['Qm'], data.stim * drive.A, lkp_QSS)
+        # Restrict Jacobian sparsity pattern to differential variables
+        idiff = [0, *[i + 1 for i, k in enumerate(self.pneuron.statesNames()) if k in diff_vars]]
+        jac_sparsity = self.pneuron.jacSparsity()[np.ix_(idiff, idiff)]
 
-        # Add dummy deflection and gas content vectors to solution
-        for key in ['Z', 'ng']:
-            data[key] = np.full(data['t'].size, np.nan)
+        # Build stacked 1D interpolators of lookups projected at the current amplitude,
+        # only once per amplitude (events alternate between a few amplitudes)
+        interpolators = {}
 
-        # Return solution dataframe
-        return data
+        def getInterpolator(A):
+            if A not in interpolators:
+                interpolators[A] = LinearInterpolator1D(lkp.project('A', A), keys=keys)
+            return interpolators[A]
+
+        # Initialize solver and compute solution
+        solver = EventDrivenSolver(
+            lambda x: setattr(solver, 'lkp', getInterpolator(drive.xvar * x)),  # eventfunc
+            y0.keys(),                                                           # variables list
+            dfunc,                                                               # dfunc
+            event_params={'lkp': getInterpolator(0.)},                           # event parameters
+            dt=self.pneuron.chooseTimeStep(),                                    # time step
+            jac_sparsity=jac_sparsity,                                           # sparsity
+            stats=self.solver_stats)                                             # statistics
+        log_period = pp.tstop / 100 if pp.tstop >= 5 else None
+        if self.dense_output:
+            data = solver(
+                y0, pp.stimEvents(), pp.tstop, log_period=log_period, dense_output=True)
+        else:
+            data = solver(
+                y0, pp.stimEvents(), pp.tstop, log_period=log_period,
+                max_nsamples=MAX_NSAMPLES_EFFECTIVE)
+
+        def postpro(data):
+            # Interpolate Vm and QSS variables along charge vector (in a single pass) and
+            # store them in solution dataframe
+            tables = {'V': lkp['V'], **{k: lkp_QSS[k] for k in qss_vars}}
+            effvars = self.interpEffVariables(
+                data['Qm'], data.stim * drive.A, EffectiveVariablesLookup(lkp.refs, tables))
+            data.addColumn('Vm', effvars['V'], preceding_key='Qm')
+            for k in qss_vars:
+                data[k] = effvars[k]
+
+            # Add dummy deflection and gas content vectors to solution
+            for key in ['Z', 'ng']:
+                data[key] = np.full(data['t'].size, np.nan)
+            return data
+
+        # Return dense solution (post-processed upon materialization) or solution dataframe
+        if self.dense_output:
+            data.postpro = postpro
+            return data
+        return postpro(data)
 
     def intMethods(self):
         ''' Listing of model integration methods. '''
         return {
             'full': self.__simFull,
             'hybrid': self.__simHybrid,
+            'multirate': self.__simMultirate,
             'sonic': self.__simSonic
         }
 
+    @staticmethod
+    def simWorkload(drive, pp, method='sonic'):
+        ''' Estimate the workload of a simulation, to be scaled by a method-specific cost rate.
+
+            Methods resolving the acoustic cycles scale with the number of simulated cycles,
+            whereas the SONIC method scales with the simulated duration.
+
+            :param drive: acoustic drive object
+            :param pp: pulse protocol object
+            :param method: selected integration method
+            :return: (method, workload) tuple
+        '''
+        if method == 'sonic':
+            return method, pp.tstop
+        return method, pp.tstop * drive.f
+
     @classmethod
     @Model.checkOutputDir
     def simQueue(cls, freqs, amps, durations, offsets, PRFs, DCs, fs, methods, qss_vars, **kwargs):
@@ -543,7 +819,8 @@ class NeuronalBilayerSonophore(BilayerSonophore):
             :param qss_vars: QSS variables
             :return: list of parameters (list) for each simulation
         '''
-        if ('full' in methods or 'hybrid' in methods) and kwargs['outputdir'] is None:
+        is_cumbersome = any(x in methods for x in ['full', 'hybrid', 'multirate'])
+        if is_cumbersome and kwargs['outputdir'] is None:
             logger.warning('Running cumbersome simulation(s) without file saving')
         if amps is None:
             amps = [None]
@@ -561,7 +838,8 @@ class NeuronalBilayerSonophore(BilayerSonophore):
     @Model.checkOutputDir
     def simQueueBurst(cls, freqs, amps, durations, PRFs, DCs, BRFs, nbursts,
                       fs, methods, qss_vars, **kwargs):
-        if ('full' in methods or 'hybrid' in methods) and kwargs['outputdir'] is None:
+        is_cumbersome = any(x in methods for x in ['full', 'hybrid', 'multirate'])
+        if is_cumbersome and kwargs['outputdir'] is None:
             logger.warning('Running cumbersome simulation(s) without file saving')
         if amps is None:
             amps = [None]
@@ -800,4 +1078,9 @@ class DrivenNeuronalBilayerSonophore(NeuronalBilayerSonophore):
     def effDerivatives(self, *args):
         dQmdt, *dstates = super().effDerivatives(*args)
         dQmdt += self.Idrive * 1e-3
-        return [dQmdt, *dstates]
\ No newline at end of file
+        return [dQmdt, *dstates]
+
+    def compiledEffDerivatives(self, *args):
+        dydt = super().compiledEffDerivatives(*args)
+        dydt[0] += self.Idrive * 1e-3
+        return dydt
\ No newline at end of file
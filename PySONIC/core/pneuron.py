@@ -26,6 +26,7 @@ class PointNeuron(Model):
     simkey = 'ESTIM'  # keyword used to characterize simulations made with this model
     celsius = 37.0    # Temperature (Celsius)
     T = celsius + CELSIUS_2_KELVIN
+    states_dependencies = None  # states on which each derivative depends (set by translator)
 
     def __repr__(self):
         return self.__class__.__name__
@@ -265,12 +266,43 @@ class PointNeuron(Model):
         ''' Compute effective states derivatives array given lookups and states dictionaries. '''
         return np.array([cls.derEffStates()[k](lkp, states) for k in cls.statesNames()])
 
+    @classmethod
+    def vectorizedRates(cls):
+        ''' Return a dictionary of rate constants functions that can be evaluated on arrays
+            of membrane potentials of any shape.
+
+            Each rate function is validated once per class against its element-wise evaluation
+            on a test potential vector. Functions that fail this validation (e.g. because of
+            scalar-only conditional branches) fall back to a numpy-vectorized version.
+        '''
+        if '_vectorized_rates' not in cls.__dict__:
+            Vtest = np.linspace(-150., 70., 221)  # mV
+            vrates = {}
+            for k, func in cls.effRates().items():
+                vfunc = np.vectorize(func)
+                try:
+                    with np.errstate(all='ignore'):
+                        out = func(Vtest)
+                        is_valid = np.shape(out) == Vtest.shape and np.allclose(
+                            out, vfunc(Vtest), equal_nan=True)
+                except (ValueError, TypeError):
+                    is_valid = False
+                if not is_valid:
+                    logger.debug(f'{cls.__name__}: {k} cannot be evaluated on arrays')
+                vrates[k] = func if is_valid else vfunc
+            cls._vectorized_rates = vrates
+        return cls._vectorized_rates
+
     @classmethod
     def getEffRates(cls, Vm):
-        ''' Compute array of effective rate constants for a given membrane potential vector. '''
-        #print(f"eff rates eff rates:{cls.effRates().keys()}")
-        return {k: np.mean(np.vectorize(v)(Vm)) for k, v in cls.effRates().items()} #v is an gatex_mech method and Vm is the voltage over a whole period #BREAKPOINT run_lookups_MC.py
-    
+        ''' Compute effective rate constants for a given membrane potential vector (or matrix of
+            membrane potential vectors), by averaging rates along the last axis.
+
+            :param Vm: membrane potential profile(s) over an acoustic cycle (mV)
+            :return: dictionary of effective rate constants (scalars or arrays)
+        '''
+        return {k: np.mean(v(Vm), axis=-1) for k, v in cls.vectorizedRates().items()}
+
     @classmethod
     def getZeroRates(cls):
         ''' Compute 'empty' array of effective rate constants for a given membrane potential vector. '''
@@ -284,7 +316,7 @@ class PointNeuron(Model):
         Qmin, Qmax = expandRange(*self.Qbounds, exp_factor=5.)
         Qref = np.arange(Qmin, Qmax, 1e-5)  # C/m2
         Vref = Qref / self.Cm0 * 1e3  # mV
-        tables = {k: np.vectorize(v)(Vref) for k, v in self.effRates().items()}
+        tables = {k: v(Vref) for k, v in self.vectorizedRates().items()}
         return EffectiveVariablesLookup({'Q': Qref}, {'V': Vref, **tables})
 
     @classmethod
@@ -512,6 +544,68 @@ class PointNeuron(Model):
         # dQmdt = (Iinj - cls.iNet(Vm, states_dict)) * 1e-3  # A/m2
         return [dQmdt, *cls.getDerStates(Vm, states_dict)]
 
+    @classmethod
+    def flatDerivatives(cls, jit=False):
+        ''' Return the code-generated flat derivatives function (t, y, rates) -> dydt
+            of the neuron class, or None if not available. '''
+        return None
+
+    @classmethod
+    def flatRates(cls, jit=False):
+        ''' Return the code-generated flat function computing the rates vector at a given
+            membrane potential, or None if not available. '''
+        return None
+
+    @classmethod
+    def getCompiledDerivatives(cls):
+        ''' Return the flat derivatives and rates functions to be used in simulations, or None
+            if the dictionary-based derivatives method must be used instead. '''
+        if not COMPILED_RHS or cls.derivatives.__func__ is not PointNeuron.derivatives.__func__:
+            return None
+        dfunc, rfunc = cls.flatDerivatives(jit=JIT_COMPILED_RHS), cls.flatRates()
+        if dfunc is None or rfunc is None:
+            return None
+        return dfunc, rfunc
+
+    @classmethod
+    def compiledDerivatives(cls, t, y, flat_funcs, Cm=None, drive=None):
+        ''' Compute system derivatives using code-generated flat functions.
+
+            :param t: specific instant in time (s)
+            :param y: vector of HH system variables at time t
+            :param flat_funcs: flat derivatives and rates functions
+            :param Cm: membrane capacitance (F/m2)
+            :param drive: electric drive object
+            :return: vector of system derivatives at time t
+        '''
+        dfunc, rfunc = flat_funcs
+        if Cm is None:
+            Cm = cls.Cm0
+        dydt = dfunc(t, y, rfunc(y[0] / Cm * 1e3))
+        if drive is not None:
+            dydt[0] += drive.compute(t) * 1e-3  # A/m2
+        return dydt
+
+    @classmethod
+    def jacSparsity(cls):
+        ''' Return the sparsity pattern of the Jacobian matrix of the system derivatives.
+
+            All derivatives depend on the membrane charge (through the membrane potential),
+            and the charge derivative depends on all states involved in membrane currents.
+            Other dependencies are parsed from the derivatives expressions if available,
+            otherwise a dense pattern is returned.
+
+            :return: (nvars x nvars) boolean matrix
+        '''
+        keys = ['Qm', *cls.statesNames()]
+        if cls.states_dependencies is None:
+            return np.ones((len(keys), len(keys)), dtype=bool)
+        sparsity = np.eye(len(keys), dtype=bool)
+        sparsity[:, 0] = True
+        for i, k in enumerate(keys):
+            sparsity[i, [keys.index(x) for x in cls.states_dependencies[k]]] = True
+        return sparsity
+
     @Model.logNSpikes
     @Model.checkTitrate
     @Model.addMeta
@@ -531,20 +625,33 @@ class PointNeuron(Model):
             **{k: self.steadyStates()[k](self.Vm0) for k in self.statesNames()}
         }
 
+        # Select derivatives function (code-generated if available, dictionary-based otherwise)
+        flat_funcs = self.getCompiledDerivatives()
+        if flat_funcs is not None:
+            dfunc = lambda t, y: self.compiledDerivatives(t, y, flat_funcs, drive=solver.drive)
+        else:
+            dfunc = lambda t, y: self.derivatives(t, y, drive=solver.drive)
+
         # Initialize solver and compute solution
         solver = EventDrivenSolver(
             lambda x: setattr(solver.drive, 'xvar', drive.xvar * x),  # eventfunc
             y0.keys(),                                                # variables
-            lambda t, y: self.derivatives(t, y, drive=solver.drive),  # dfunc
+            dfunc,                                                    # dfunc
             event_params={'drive': drive.copy().updatedX(0.)},        # event parameters
-            dt=self.chooseTimeStep())                                 # time step
-        data = solver(y0, pp.stimEvents(), pp.tstop)
-
-        # Add Vm timeries to solution
-        data = addColumn(data, 'Vm', data['Qm'].values / self.Cm0 * 1e3, preceding_key='Qm')
+            dt=self.chooseTimeStep(),                                 # time step
+            jac_sparsity=self.jacSparsity(),                          # Jacobian sparsity
+            stats=self.solver_stats)                                  # statistics
+        data = solver(y0, pp.stimEvents(), pp.tstop, dense_output=self.dense_output)
+
+        # Add Vm timeries to solution (upon materialization for dense solutions)
+        postpro = lambda data: addColumn(
+            data, 'Vm', data['Qm'].values / self.Cm0 * 1e3, preceding_key='Qm')
+        if self.dense_output:
+            data.postpro = postpro
+            return data
 
         # Return solution dataframe
-        return data
+        return postpro(data)
 
     def desc(self, meta):
         return f'{self}: simulation @ {meta["drive"].desc}, {meta["pp"].desc}'
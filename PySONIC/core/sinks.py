@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+''' Streaming sinks consuming ODE solutions segment by segment, allowing long simulations
+    to run in bounded memory. '''
+
+import os
+import abc
+import numpy as np
+
+from .timeseries import TimeSeries
+from .solvers import Resampler
+
+
+class SolutionSink(metaclass=abc.ABCMeta):
+    ''' Generic interface to a consumer of solution segments pushed by an ODE solver. '''
+
+    def open(self, ykeys):
+        ''' Prepare sink before receiving solution segments.
+
+            :param ykeys: list of differential variables names
+        '''
+        self.ykeys = list(ykeys)
+
+    @abc.abstractmethod
+    def push(self, t, x, y):
+        ''' Consume a solution segment.
+
+            :param t: time vector of the segment (s)
+            :param x: stimulus state vector of the segment
+            :param y: (ntimes, nvars) solution matrix of the segment
+        '''
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def close(self):
+        ''' Terminate consumption and return the sink output. '''
+        raise NotImplementedError
+
+    def toTimeSeries(self, t, x, y):
+        ''' Wrap arrays into a timeseries dataframe. '''
+        return TimeSeries(t, x, {k: y[:, i] for i, k in enumerate(self.ykeys)})
+
+
+class DecimatingSink(SolutionSink):
+    ''' Sink resampling solution segments on the fly onto a uniform time grid, using linear
+        interpolation for state variables and zero-order hold for the stimulus state.
+    '''
+
+    def __init__(self, target_dt):
+        ''' Initialization.
+
+            :param target_dt: target time step (s)
+        '''
+        self.target_dt = target_dt
+
+    def open(self, ykeys):
+        super().open(ykeys)
+        self.chunks = []
+        self.last = None  # last received sample, used to bridge consecutive segments
+        self.t0 = None    # time origin of the uniform grid (s)
+        self.k = 0        # index of the next grid sample
+
+    def push(self, t, x, y):
+        if t.size == 0:
+            return
+        if self.last is None:
+            self.t0 = t[0]
+        else:
+            t, x, y = [np.concatenate(([last], v)) for last, v in zip(self.last, (t, x, y))]
+        self.last = (t[-1], x[-1], y[-1])
+        n = int(np.floor((t[-1] - self.t0) / self.target_dt + 1e-9)) + 1 - self.k
+        if n <= 0:
+            return
+        tgrid = self.t0 + self.target_dt * (self.k + np.arange(n))
+        resampler = Resampler(t, tgrid)
+        ygrid, xgrid = resampler.linear(y), resampler.previous(x)
+        self.chunks.append((tgrid, xgrid, ygrid))
+        self.k += n
+
+    def close(self):
+        t, x, y = [np.concatenate(v) for v in zip(*self.chunks)]
+        return self.toTimeSeries(t, x, y)
+
+
+class CycleAveragingSink(SolutionSink):
+    ''' Sink averaging solution segments over consecutive windows of fixed duration
+        (e.g. acoustic periods), reported at the windows mid-points.
+    '''
+
+    def __init__(self, T):
+        ''' Initialization.
+
+            :param T: averaging window duration (s)
+        '''
+        self.T = T
+
+    def open(self, ykeys):
+        super().open(ykeys)
+        self.chunks = []
+        self.pending = None  # samples of the current (incomplete) window
+        self.t0 = None
+
+    def average(self, t, x, y, iwindows):
+        ''' Average samples per window index. '''
+        istarts = np.hstack(([0], np.flatnonzero(np.diff(iwindows)) + 1))
+        counts = np.diff(np.hstack((istarts, [t.size])))
+        tmid = self.t0 + (iwindows[istarts] + 0.5) * self.T
+        xavg = np.add.reduceat(x, istarts) / counts
+        yavg = np.add.reduceat(y, istarts, axis=0) / counts[:, np.newaxis]
+        self.chunks.append((tmid, xavg, yavg))
+
+    def push(self, t, x, y):
+        if t.size == 0:
+            return
+        if self.pending is None:
+            self.t0 = t[0]
+        else:
+            t, x, y = [np.concatenate((p, v)) for p, v in zip(self.pending, (t, x, y))]
+        iwindows = np.floor((t - self.t0) / self.T).astype(int)
+        is_complete = iwindows < iwindows[-1]
+        if is_complete.any():
+            self.average(t[is_complete], x[is_complete], y[is_complete], iwindows[is_complete])
+        self.pending = (t[~is_complete], x[~is_complete], y[~is_complete])
+
+    def close(self):
+        if self.pending is not None and self.pending[0].size > 0:
+            t, x, y = self.pending
+            self.average(t, x, y, np.floor((t - self.t0) / self.T).astype(int))
+        t, x, y = [np.concatenate(v) for v in zip(*self.chunks)]
+        return self.toTimeSeries(t, x, y)
+
+
+class ChunkedFileSink(SolutionSink):
+    ''' Sink writing solution segments to successive NPZ chunk files of bounded size. '''
+
+    def __init__(self, root, chunk_size=1000000):
+        ''' Initialization.
+
+            :param root: output directory
+            :param chunk_size: minimal number of samples per chunk file
+        '''
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def open(self, ykeys):
+        super().open(ykeys)
+        os.makedirs(self.root, exist_ok=True)
+        self.fpaths = []
+        self.pending = []
+        self.npending = 0
+
+    def write(self):
+        ''' Write pending segments to a new chunk file. '''
+        t, x, y = [np.concatenate(v) for v in zip(*self.pending)]
+        fpath = os.path.join(self.root, f'chunk{len(self.fpaths):05d}.npz')
+        np.savez(fpath, t=t, x=x, y=y, ykeys=np.array(self.ykeys))
+        self.fpaths.append(fpath)
+        self.pending = []
+        self.npending = 0
+
+    def push(self, t, x, y):
+        self.pending.append((t, x, y))
+        self.npending += t.size
+        if self.npending >= self.chunk_size:
+            self.write()
+
+    def close(self):
+        ''' Write remaining segments and return the list of chunk files. '''
+        if self.npending > 0:
+            self.write()
+        return self.fpaths
+
+    @staticmethod
+    def load(fpaths):
+        ''' Load a solution from a list of chunk files.
+
+            :param fpaths: list of chunk files
+            :return: timeseries dataframe
+        '''
+        chunks = [np.load(fpath) for fpath in fpaths]
+        t, x, y = [np.concatenate([c[k] for c in chunks]) for k in ['t', 'x', 'y']]
+        ykeys = chunks[0]['ykeys'].tolist()
+        return TimeSeries(t, x, {k: y[:, i] for i, k in enumerate(ykeys)})
@@ -5,29 +5,256 @@
 # @Last Modified by:   Theo Lemaire
 # @Last Modified time: 2023-03-22 12:05:32
 
+import time
+from functools import wraps
+from collections import OrderedDict
 import numpy as np
-from scipy.interpolate import interp1d
 from scipy.integrate import ode, odeint, solve_ivp
 from tqdm import tqdm
 
 from ..utils import *
 from ..constants import *
-from .timeseries import TimeSeries
+from .timeseries import TimeSeries, DenseSolution
 
 
-class ODESolver:
-    ''' Generic interface to ODE solver object. '''
+class ArrayBuffer:
+    ''' Growable array buffer allowing amortized constant-time appending along its first
+        axis, by doubling its underlying storage capacity whenever it is exceeded.
+    '''
+
+    def __init__(self, values):
+        ''' Initialization.
+
+            :param values: initial array content
+        '''
+        self.data = np.asarray(values)
+        self.size = self.data.shape[0]
+
+    @property
+    def capacity(self):
+        return self.data.shape[0]
 
-    def __init__(self, ykeys, dfunc, dt=None):
+    @property
+    def values(self):
+        ''' View on the filled part of the buffer. '''
+        return self.data[:self.size]
+
+    def popleft(self, n):
+        ''' Remove the first elements of the buffer and return them.
+
+            :param n: number of elements to remove
+            :return: array of removed elements
+        '''
+        out = self.data[:n].copy()
+        self.data[:self.size - n] = self.data[n:self.size]
+        self.size -= n
+        return out
+
+    def reserve(self, n):
+        ''' Ensure that storage capacity can accommodate a given number of elements. '''
+        if n > self.capacity:
+            data = np.empty(
+                (max(n, 2 * self.capacity), *self.data.shape[1:]), dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, values):
+        ''' Append new values along the first axis.
+
+            :param values: array of values to append
+        '''
+        n = len(values)
+        dtype = np.result_type(self.data, values)
+        if dtype != self.data.dtype:
+            self.data = self.data.astype(dtype)
+        self.reserve(self.size + n)
+        self.data[self.size:self.size + n] = values
+        self.size += n
+
+
+class SolverStats:
+    ''' Statistics recorded during ODE solvers calls: number of calls and time spent in
+        derivatives evaluations ("rhs"), Jacobian evaluations ("jac"), integration routines
+        ("integration") and event handling ("events"), as well as integration steps sizes.
+    '''
+
+    keys = ('rhs', 'jac', 'integration', 'events')
+
+    def __init__(self):
+        self.ncalls = {k: 0 for k in self.keys}
+        self.times = {k: 0. for k in self.keys}
+        self.nsteps = 0
+        self.tspan = 0.
+        self.dtmin = np.inf
+        self.dtmax = 0.
+
+    def add(self, key, duration):
+        ''' Record a call of a specific type.
+
+            :param key: call type
+            :param duration: call duration (s)
+        '''
+        self.ncalls[key] += 1
+        self.times[key] += duration
+
+    def timed(self, func, key):
+        ''' Wrap a function such that its calls are recorded under a specific type. '''
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            tstart = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(key, time.perf_counter() - tstart)
+        return wrapper
+
+    def addSteps(self, dts, nsteps=None, tspan=None):
+        ''' Record integration steps.
+
+            :param dts: vector of (possibly a subset of) integration steps sizes (s)
+            :param nsteps: total number of steps (defaults to the size of the steps vector)
+            :param tspan: integrated time span (defaults to the sum of the steps sizes)
+        '''
+        dts = dts[dts > 0]
+        self.nsteps += int(dts.size if nsteps is None else nsteps)
+        self.tspan += dts.sum() if tspan is None else tspan
+        if dts.size > 0:
+            self.dtmin = min(self.dtmin, dts.min())
+            self.dtmax = max(self.dtmax, dts.max())
+
+    def toDict(self, tcomp=None):
+        ''' Return statistics as a dictionary.
+
+            :param tcomp: optional total computation time (s), used to derive the time spent
+             outside of integration and event handling (i.e. setup and post-processing)
+            :return: statistics dictionary
+        '''
+        tsolver = self.times['integration'] - self.times['rhs'] - self.times['jac']
+        stats = {
+            'nrhs': self.ncalls['rhs'],
+            'njac': self.ncalls['jac'],
+            'nsteps': self.nsteps,
+            'nsegments': self.ncalls['integration'],
+            'nevents': self.ncalls['events'],
+            'dtmin': self.dtmin if self.nsteps > 0 else np.nan,
+            'dtmean': self.tspan / self.nsteps if self.nsteps > 0 else np.nan,
+            'dtmax': self.dtmax if self.nsteps > 0 else np.nan,
+            'trhs': self.times['rhs'] + self.times['jac'],
+            'tsolver': tsolver,
+            'tevents': self.times['events']
+        }
+        if tcomp is not None:
+            stats['tpostpro'] = tcomp - self.times['integration'] - self.times['events']
+        return stats
+
+
+def recordCalls(key):
+    ''' Decorator recording calls of a solver method in the solver statistics, if any. '''
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            return self.stats.timed(method, key)(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Resampler:
+    ''' Resampler of solution arrays onto a new time vector.
+
+        Bracketing indexes and interpolation weights are computed once, and applied to whole
+        solution matrices at once (linear interpolation of state variables). Stimulus states
+        are resampled with an exact zero-order hold: since solutions contain both pre- and
+        post-event samples at each event time, the last sample preceding (or at) each new
+        time carries the stimulus state applied at that time.
+    '''
+
+    def __init__(self, t, tnew):
+        ''' Initialization.
+
+            :param t: original (sorted) time vector (s)
+            :param tnew: new time vector (s)
+        '''
+        self.iprev = np.clip(np.searchsorted(t, tnew, side='right') - 1, 0, t.size - 1)
+        self.i = np.minimum(self.iprev, max(t.size - 2, 0))
+        if t.size > 1:
+            dt = t[self.i + 1] - t[self.i]
+            self.w = np.clip(np.where(
+                dt > 0, (tnew - t[self.i]) / np.where(dt > 0, dt, 1.), 0.), 0., 1.)
+        else:
+            self.w = np.zeros(tnew.size)
+
+    def linear(self, y):
+        ''' Linearly interpolate a vector or (ntimes, nvars) matrix onto the new time vector. '''
+        if y.shape[0] == 1:
+            return y[self.i]
+        w = self.w if y.ndim == 1 else self.w[:, np.newaxis]
+        y0 = y[self.i]
+        return y0 + w * (y[self.i + 1] - y0)
+
+    def previous(self, x):
+        ''' Resample a step-like vector onto the new time vector (zero-order hold). '''
+        return x[self.iprev]
+
+
+class ODESolver:
+    ''' Generic interface to ODE solver object.
+
+        Global time vector, state matrix and stimulus vector are stored in growable buffers,
+        such that successive appends have an amortized linear (rather than quadratic) cost.
+
+        If a solution sink is provided upon call, all but the last few samples required by
+        the solver are pushed to the sink after each append, such that the in-memory
+        solution remains bounded.
+
+        Integration is performed by odeint (fixed time step) or LSODA (adaptive time step) by
+        default, or by one of the implicit solve_ivp methods suited for stiff systems (BDF or
+        Radau), which can be fed with an analytical Jacobian function and/or its sparsity
+        pattern. The default method can be changed globally via the "default_method" class
+        attribute.
+
+        If a statistics object is provided upon initialization (or assigned to the "stats"
+        class attribute to instrument all solvers), derivatives evaluations, integration steps,
+        event handling and their respective durations are recorded in it.
+
+        If a dense output is requested upon call, the system is integrated by solve_ivp (with
+        the selected method, or LSODA by default) on its own adaptive steps, and the solution
+        is returned as a dense solution object made of the interpolants of all integration
+        segments, instead of being sampled on a fixed time grid.
+    '''
+
+    sink = None
+    stats = None
+    dense = None
+    supports_dense_output = True
+    supports_sink = True
+    resample_chunk_size = int(RESAMPLE_CHUNK_SIZE)
+    default_method = ODE_METHOD
+    ivp_methods = ('BDF', 'Radau', 'LSODA')
+
+    def __init__(self, ykeys, dfunc, dt=None, method=None, jac=None, jac_sparsity=None,
+                 stats=None):
         ''' Initialization.
 
             :param ykeys: list of differential variables names
             :param dfunc: derivative function
             :param dt: integration time step (s)
+            :param method: solve_ivp integration method (defaults to "default_method")
+            :param jac: optional Jacobian function of signature (t, y) -> (nvars x nvars) matrix
+            :param jac_sparsity: optional Jacobian sparsity pattern, used to speed up its
+             finite-difference approximation if no Jacobian function is provided
+            :param stats: optional statistics object recording the solver calls (overrides the
+             "stats" class attribute)
         '''
+        if stats is not None:
+            self.stats = stats
         self.ykeys = ykeys
         self.dfunc = dfunc
         self.dt = dt
+        self.method = method if method is not None else self.default_method
+        self.jac = jac
+        self.jac_sparsity = jac_sparsity
 
     def checkFunc(self, key, value):
         if not callable(value):
@@ -50,8 +277,34 @@ class ODESolver:
     def nvars(self):
         return len(self.ykeys)
 
+    @property
+    def t(self):
+        return self._t.values
+
+    @t.setter
+    def t(self, value):
+        self._t = ArrayBuffer(value)
+
+    @property
+    def y(self):
+        return self._y.values
+
+    @y.setter
+    def y(self, value):
+        self._y = ArrayBuffer(value)
+
+    @property
+    def x(self):
+        return self._x.values
+
+    @x.setter
+    def x(self, value):
+        self._x = ArrayBuffer(value)
+
     @property
     def dfunc(self):
+        if self.stats is not None:
+            return self.stats.timed(self._dfunc, 'rhs')
         return self._dfunc
 
     @dfunc.setter
@@ -59,6 +312,38 @@ class ODESolver:
         self.checkFunc('derivative', value)
         self._dfunc = value
 
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self, value):
+        if value is not None and value not in self.ivp_methods:
+            raise ValueError(f'integration method must be one of {self.ivp_methods}')
+        self._method = value
+
+    @property
+    def jac(self):
+        if self.stats is not None and self._jac is not None:
+            return self.stats.timed(self._jac, 'jac')
+        return self._jac
+
+    @jac.setter
+    def jac(self, value):
+        if value is not None:
+            self.checkFunc('Jacobian', value)
+        self._jac = value
+
+    @property
+    def ivp_options(self):
+        ''' Keyword arguments passed to solve_ivp for the selected integration method. '''
+        options = {'method': self.method, 'rtol': ODE_RTOL, 'atol': ODE_ATOL}
+        if self.jac is not None:
+            options['jac'] = self.jac
+        elif self.jac_sparsity is not None and self.method != 'LSODA':
+            options['jac_sparsity'] = self.jac_sparsity
+        return options
+
     @property
     def dt(self):
         return self._dt
@@ -122,9 +407,25 @@ class ODESolver:
             :param t: new time vector to append (s)
             :param y: new solution matrix to append
         '''
-        self.t = np.concatenate((self.t, t))
-        self.y = np.concatenate((self.y, y), axis=0)
-        self.x = np.concatenate((self.x, np.ones(t.size) * self.xref))
+        self._t.append(t)
+        self._y.append(y)
+        self._x.append(np.full(t.size, self.xref, dtype=float))
+        if self.sink is not None:
+            self.flush(self.nkeep)
+
+    @property
+    def nkeep(self):
+        ''' Number of trailing samples that must be kept in memory to continue integration. '''
+        return 1
+
+    def flush(self, nkeep=0):
+        ''' Push all but a number of trailing samples of the global arrays to the sink.
+
+            :param nkeep: number of trailing samples to keep in memory
+        '''
+        n = self._t.size - nkeep
+        if n > 0:
+            self.sink.push(self._t.popleft(n), self._x.popleft(n), self._y.popleft(n))
 
     def bound(self, tbounds):
         ''' Restrict global time vector, state vector ans solution matrix within
@@ -147,6 +448,7 @@ class ODESolver:
             t = self.t[-1]
         return f't = {self.timeStr(t)}: {s}'
 
+    @recordCalls('integration')
     def integrateUntil(self, target_t, remove_first=False):
         ''' Integrate system until a target time and append new arrays to global arrays.
 
@@ -158,22 +460,83 @@ class ODESolver:
             raise ValueError(f'target time ({target_t} s) precedes current time {self.t[-1]} s')
         elif target_t == self.t[-1]:
             t, y = self.t[-1], self.y[-1]
-        if self.dt is None:
+        if self.dense is not None:
+            if target_t == self.t[-1]:
+                return
+            # Integrate with dense output, and store interpolant as a new solution segment
+            options = {**self.ivp_options, 'method': self.method or 'LSODA'}
+            if options['method'] == 'LSODA':
+                options.pop('jac_sparsity', None)
+            sol = solve_ivp(
+                self.dfunc, [self.t[-1], target_t], self.y[-1], dense_output=True, **options)
+            if not sol.success:
+                raise ValueError(self.timedlog(f'integration error ({sol.message})'))
+            if self.stats is not None:
+                self.stats.addSteps(np.diff(sol.t))
+            self.dense.addSegment(sol.sol, sol.t, self.xref)
+            t, y = sol.t, sol.y.T
+        elif self.method is not None:
+            t_eval = None if self.dt is None else self.getTimeVector(self.t[-1], target_t)
+            # If instrumented, integrate without output grid to access the integration steps,
+            # and evaluate the dense output on the grid instead
+            is_dense = self.stats is not None and t_eval is not None
+            sol = solve_ivp(
+                self.dfunc, [self.t[-1], target_t], self.y[-1],
+                t_eval=None if is_dense else t_eval, dense_output=is_dense, **self.ivp_options)
+            if not sol.success:
+                raise ValueError(self.timedlog(f'integration error ({sol.message})'))
+            if self.stats is not None:
+                self.stats.addSteps(np.diff(sol.t))
+            t, y = (t_eval, sol.sol(t_eval).T) if is_dense else (sol.t, sol.y.T)
+        elif self.dt is None:
             sol = solve_ivp(
                 self.dfunc, [self.t[-1], target_t], self.y[-1], method='LSODA')
+            if self.stats is not None:
+                self.stats.addSteps(np.diff(sol.t))
             t, y = sol.t, sol.y.T
         else:
             t = self.getTimeVector(self.t[-1], target_t)
-            y = odeint(self.dfunc, self.y[-1], t, tfirst=True)
-
-            #BDF (Backward Euler instead of LSODA (Adams/BDF)-(odeint)) (backward differentiation formula)
-            # sol = solve_ivp(fun=self.dfunc,t_span= [self.t[-1], target_t],y0= self.y[-1], method='BDF')
-            # t = sol['t']
-            # y = sol['y'].T
+            y = self.odeint(self.dfunc, self.y[-1], t)
         if remove_first:
             t, y = t[1:], y[1:]
         self.append(t, y)
 
+    def odeint(self, dfunc, y0, t, **kwargs):
+        ''' Integrate a system on a specific time vector with odeint, recording the
+            integration steps if instrumented.
+
+            :param dfunc: derivatives function
+            :param y0: initial state vector
+            :param t: time vector (s)
+            :return: solution matrix
+        '''
+        if self.stats is None:
+            return odeint(dfunc, y0, t, tfirst=True, **kwargs)
+        y, info = odeint(dfunc, y0, t, tfirst=True, full_output=True, **kwargs)
+        self.stats.addSteps(info['hu'], nsteps=info['nst'][-1], tspan=t[-1] - t[0])
+        return y
+
+    def interpArrays(self, t, tnew, y, x=None):
+        ''' Interpolate a solution matrix (linearly) and an optional stimulus vector (with
+            a zero-order hold) onto a new time vector, by chunks of "resample_chunk_size"
+            samples to bound peak memory.
+
+            :param t: original time vector (s)
+            :param tnew: new time vector (s)
+            :param y: solution matrix
+            :param x: optional stimulus vector
+            :return: interpolated solution matrix and stimulus vector (None if not provided)
+        '''
+        ynew = np.empty((tnew.size, *y.shape[1:]))
+        xnew = None if x is None else np.empty(tnew.size)
+        for istart in range(0, tnew.size, self.resample_chunk_size):
+            chunk = slice(istart, istart + self.resample_chunk_size)
+            resampler = Resampler(t, tnew[chunk])
+            ynew[chunk] = resampler.linear(y)
+            if x is not None:
+                xnew[chunk] = resampler.previous(x)
+        return ynew, xnew
+
     def resampleArrays(self, t, y, target_dt):
         ''' Resample a time vector and soluton matrix to target time step.
 
@@ -183,16 +546,15 @@ class ODESolver:
             :return: resampled time vector and solution matrix
         '''
         tnew = self.getTimeVector(t[0], t[-1], dt=target_dt)
-        ynew = np.array([np.interp(tnew, t, x) for x in y.T]).T
-        return tnew, ynew
+        return tnew, self.interpArrays(t, tnew, y)[0]
 
     def resample(self, target_dt):
         ''' Resample global arrays to a new target time step.
 
             :target_dt: target time step (s)
         '''
-        tnew, self.y = self.resampleArrays(self.t, self.y, target_dt)
-        self.x = interp1d(self.t, self.x, kind='nearest', assume_sorted=True)(tnew)
+        tnew = self.getTimeVector(self.t[0], self.t[-1], dt=target_dt)
+        self.y, self.x = self.interpArrays(self.t, tnew, self.y, x=self.x)
         self.t = tnew
 
     def solve(self, y0, tstop, **kwargs):
@@ -215,9 +577,42 @@ class ODESolver:
         '''
         return TimeSeries(self.t, self.x, {k: self.y[:, i] for i, k in enumerate(self.ykeys)})
 
-    def __call__(self, *args, target_dt=None, max_nsamples=None, **kwargs):
+    def __call__(self, *args, target_dt=None, max_nsamples=None, sink=None, dense_output=False,
+                 **kwargs):
         ''' Specific call method: solve the system, resample solution if needed, and return
-            solution dataframe. '''
+            solution dataframe.
+
+            :param sink: optional solution sink consuming solution segments on the fly, in
+             which case the sink output is returned (and no resampling is performed)
+            :param dense_output: boolean stating whether to return a dense solution object
+             backed by the solver's interpolants, evaluated lazily at any requested times
+             (in which case no resampling is performed)
+        '''
+        if dense_output:
+            if not self.supports_dense_output:
+                raise ValueError(f'{self.__class__.__name__} does not support dense output')
+            if sink is not None or target_dt is not None or max_nsamples is not None:
+                raise ValueError(
+                    'resampling options and solution sinks are not compatible with dense output')
+            self.dense = DenseSolution(self.ykeys)
+            try:
+                self.solve(*args, **kwargs)
+                return self.dense
+            finally:
+                self.dense = None
+        if sink is not None:
+            if not self.supports_sink:
+                raise ValueError(f'{self.__class__.__name__} does not support solution sinks')
+            if target_dt is not None or max_nsamples is not None:
+                raise ValueError('resampling options are not compatible with a solution sink')
+            sink.open(self.ykeys)
+            self.sink = sink
+            try:
+                self.solve(*args, **kwargs)
+                self.flush()
+            finally:
+                self.sink = None
+            return sink.close()
         self.solve(*args, **kwargs)
         if target_dt is not None:
             self.resample(target_dt)
@@ -227,17 +622,38 @@ class ODESolver:
 
 
 class PeriodicSolver(ODESolver):
-    ''' ODE solver that integrates periodically until a stable periodic behavior is detected.'''
-
-    def __init__(self, T, *args, primary_vars=None, **kwargs):
+    ''' ODE solver that integrates periodically until a stable periodic behavior is detected.
+
+        Periodic stability is assessed by evaluating a convergence metric between the primary
+        variables profiles over the last two cycles, and comparing it to a threshold. The
+        number of trailing samples lying on the regular cycle time grid is tracked as samples
+        are appended, such that cycles can be extracted without scanning the whole solution.
+    '''
+
+    # Convergence metrics: per-variable deviations between the last and preceding cycles
+    metrics = {
+        'rmse_ptp': lambda y_last, y_prec: rmse(y_last, y_prec, axis=0) / np.ptp(y_last, axis=0),
+        'max_abs': lambda y_last, y_prec: np.max(np.abs(y_last - y_prec), axis=0)
+    }
+    default_metric = 'rmse_ptp'
+    default_threshold = MAX_RMSE_PTP_RATIO
+
+    def __init__(self, T, *args, primary_vars=None, metric=None, threshold=None, **kwargs):
         ''' Initialization.
 
             :param T: periodicity (s)
             :param primary_vars: keys of the primary solution variables to check for stability
+            :param metric: convergence metric (name of a predefined metric, or function
+             computing per-variable deviations between two cycles solution matrices),
+             defaults to "default_metric"
+            :param threshold: convergence threshold (scalar, or one value per primary variable),
+             defaults to "default_threshold"
         '''
         super().__init__(*args, **kwargs)
         self.T = T
         self.primary_vars = primary_vars
+        self.metric = metric if metric is not None else self.default_metric
+        self.threshold = threshold if threshold is not None else self.default_threshold
 
     @property
     def T(self):
@@ -270,10 +686,28 @@ class PeriodicSolver(ODESolver):
     def i_primary_vars(self):
         return [self.ykeys.index(k) for k in self.primary_vars]
 
+    @property
+    def metric(self):
+        return self._metric
+
+    @metric.setter
+    def metric(self, value):
+        if isinstance(value, str):
+            if value not in self.metrics:
+                raise ValueError(f'unknown convergence metric: "{value}"')
+            value = self.metrics[value]
+        self.checkFunc('convergence metric', value)
+        self._metric = value
+
     @property
     def xref(self):
         return 1.
 
+    @property
+    def nkeep(self):
+        # Last 2 cycles are needed to assess periodic stability
+        return 2 * self.getNPerCycle(self.dt) + 2
+
     def getNPerCycle(self, dt=None):
         ''' Compute number of samples per cycle.
 
@@ -285,6 +719,31 @@ class PeriodicSolver(ODESolver):
             dt = self.t[-1] - self.t[-2]
         return int(np.round(self.T / dt))
 
+    def countRegularSamples(self, t):
+        ''' Count the number of trailing time steps matching the solver's time step.
+
+            :param t: time vector (s)
+            :return: number of trailing regular time steps, or None if all steps are regular
+        '''
+        i_diff_dt = np.where(np.invert(np.isclose(np.diff(t)[::-1], self.dt)))[0]
+        return i_diff_dt[0] if i_diff_dt.size > 0 else None
+
+    def initialize(self, *args, **kwargs):
+        super().initialize(*args, **kwargs)
+        self.nregular = self.t.size
+
+    def append(self, t, y):
+        # Update the number of trailing samples on the regular time grid, by only checking
+        # the time steps of the new samples
+        n = self.countRegularSamples(np.hstack(([self.t[-1]], t)))
+        self.nregular = self.nregular + t.size if n is None else n
+        super().append(t, y)
+
+    def bound(self, tbounds):
+        super().bound(tbounds)
+        n = self.countRegularSamples(self.t)
+        self.nregular = self.t.size if n is None else n
+
     def getCycle(self, i, ivars=None):
         ''' Get time vector and solution matrix for the ith cycle.
 
@@ -296,11 +755,9 @@ class PeriodicSolver(ODESolver):
         if ivars is None:
             ivars = range(self.nvars)
 
-        # Get first time index where time difference differs from solver's time step, if any
-        i_diff_dt = np.where(np.invert(np.isclose(np.diff(self.t)[::-1], self.dt)))[0]
-
-        # Determine the number of samples to consider in the backwards direction
-        nsamples = i_diff_dt[0] if i_diff_dt.size > 0 else self.t.size
+        # Determine the number of samples to consider in the backwards direction (bounded
+        # by the number of samples kept in memory)
+        nsamples = min(self.nregular, self.t.size)
 
         npc = self.getNPerCycle()                # number of samples per cycle
         ncycles = int(np.round(nsamples / npc))  # rounded number of cycles
@@ -327,15 +784,10 @@ class PeriodicSolver(ODESolver):
         '''
         # Extract the last 2 cycles of the primary variables from the solution
         y_last, y_prec = [self.getCycle(-i, ivars=self.i_primary_vars)[1] for i in [1, 2]]
-        #print(f"ylast: {y_last[-5:]}\nyprec: {y_prec[-5:]} ###")
-
-        # Evaluate ratios of RMSE between the two cycles / variation range over the last cycle
-        #print(f"rmse: {rmse(y_last, y_prec, axis=0)} ###")
-        #print(f"ptp: {np.ptp(y_last, axis=0)}, max = {np.max(y_last,axis=0)}, min = {np.min(y_last,axis=0)} ###")
-        ratios = rmse(y_last, y_prec, axis=0) / np.ptp(y_last, axis=0)#; print(f"ratios: {ratios} ###")
 
-        # Classify solution as periodically stable only if all ratios are below critical threshold
-        return np.all(ratios < MAX_RMSE_PTP_RATIO)
+        # Classify solution as periodically stable only if all deviations between the two
+        # cycles are below critical threshold
+        return np.all(self.metric(y_last, y_prec) < self.threshold)
 
     def integrateCycle(self):
         ''' Integrate system for a cycle. '''
@@ -361,13 +813,13 @@ class PeriodicSolver(ODESolver):
 
         # Integrate system for minimal number of cycles
         for i in range(nmin):
-            print(f"iteration {i}: ###")
+            logger.debug(self.timedlog(f'cycle {i}'))
             self.integrateCycle()
             #print(f"self.t: {self.t[-5:]}, len(t): {len(self.t)}\nself.y: {self.y[-5:]}, len(y): {len(self.y)}\n")
 
         # Keep integrating system periodically until stopping criterion is met
         while not self.isPeriodicallyStable() and i < nmax:
-            print(f"iteration {i} ###")
+            logger.debug(self.timedlog(f'cycle {i}'))
             self.integrateCycle()
             #print(f"self.t: {self.t[-5:]}, len(t): {len(self.t)}\nself.y: {self.y[-5:]}, len(y): {len(self.y)}\n")
             i += 1
@@ -379,6 +831,249 @@ class PeriodicSolver(ODESolver):
             logger.debug(self.timedlog(f'stopping criterion met after {i} cycles'))
 
 
+class WarmStartCache:
+    ''' Least-recently-used cache of converged periodic states, used to seed periodic
+        simulations with the state of their nearest already-computed neighbour.
+
+        States are grouped by context (i.e. the parameters that must match exactly for a
+        state to be reused), and neighbours are searched among the states of a same context,
+        by Euclidean distance over coordinates normalized by their range across these states.
+    '''
+
+    def __init__(self, max_entries):
+        ''' Constructor.
+
+            :param max_entries: maximal number of cached states (0 to disable caching)
+        '''
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}({len(self)} / {self.max_entries} entries, '
+                f'{self.hits} hits, {self.misses} misses)')
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, context, coords):
+        ''' Return the state of the nearest cached neighbour for a given context and
+            coordinates (None if no state is cached for that context).
+
+            :param context: hashable tuple of parameters that must match exactly
+            :param coords: tuple of continuous coordinates
+            :return: state vector (or None)
+        '''
+        keys = [key for key in self.entries if key[0] == context]
+        if len(keys) == 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        candidates = np.array([key[1] for key in keys])
+        scale = np.ptp(np.vstack((candidates, coords)), axis=0)
+        scale[scale == 0] = 1.
+        inearest = np.argmin(np.linalg.norm((candidates - coords) / scale, axis=1))
+        self.entries.move_to_end(keys[inearest])
+        return self.entries[keys[inearest]].copy()
+
+    def put(self, context, coords, state):
+        ''' Add a state to the cache, evicting the least recently used entry if needed.
+
+            :param context: hashable tuple of parameters that must match exactly
+            :param coords: tuple of continuous coordinates
+            :param state: state vector
+        '''
+        if self.max_entries == 0:
+            return
+        key = (context, tuple(coords))
+        self.entries.pop(key, None)
+        self.entries[key] = np.array(state, dtype=float)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        ''' Remove all entries and reset counters. '''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        ''' Dictionary of cache usage statistics. '''
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class BatchPeriodicSolver(PeriodicSolver):
+    ''' Periodic solver that integrates a batch of independent systems (sharing the same
+        differential variables and periodicity) as one vectorized ODE system, until each member
+        reaches a stable periodic behavior. Members are checked for periodic stability
+        individually, and frozen (i.e. removed from the integrated system) once stable.
+
+        Global arrays are stored as (ntimes, nbatch, nvars) matrices, in which the samples of
+        frozen members are set to NaN.
+    '''
+
+    supports_dense_output = False
+    supports_sink = False
+
+    def __init__(self, T, ykeys, dfunc, nbatch, **kwargs):
+        ''' Initialization.
+
+            :param T: periodicity (s)
+            :param ykeys: list of differential variables names
+            :param dfunc: vectorized derivative function of signature (t, y, imembers) -> dydt,
+             where y is a (nmembers, nvars) matrix of the states of the batch members of
+             indexes imembers, and dydt is a matrix of the same shape
+            :param nbatch: number of batch members
+        '''
+        super().__init__(T, ykeys, dfunc, **kwargs)
+        self.nbatch = nbatch
+
+    @property
+    def nbatch(self):
+        return self._nbatch
+
+    @nbatch.setter
+    def nbatch(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError('number of batch members must be a strictly positive integer')
+        self._nbatch = value
+
+    @property
+    def ncycles(self):
+        return len(self.icycles)
+
+    def initialize(self, y0, t0=0.):
+        ''' Initialize global time vector, state vector and solution array.
+
+            :param y0: list of dictionaries of initial conditions (one per batch member)
+            :param t0: optional initial time (s)
+        '''
+        if len(y0) != self.nbatch:
+            raise ValueError(f'number of initial conditions ({len(y0)}) does not match batch size')
+        members = []
+        for y0_member in y0:
+            super().initialize(y0_member, t0=t0)
+            members.append(self.y)
+        if not all(y.shape == members[0].shape for y in members):
+            raise ValueError('dimensions of initial conditions are inconsistent across members')
+        self.y = np.stack(members, axis=1)
+        self.icycles = []  # start indexes of integrated cycles
+        self.iactive = np.arange(self.nbatch)  # indexes of members still being integrated
+        self.iend = np.full(self.nbatch, -1)  # end indexes of frozen members solutions
+
+    @recordCalls('integration')
+    def integrateCycle(self):
+        ''' Integrate all active members of the batch for a cycle, as a single ODE system. '''
+        ia, nvars = self.iactive, self.nvars
+        t = self.getTimeVector(self.t[-1], self.t[-1] + self.T)
+        # Variables are ordered member-wise, hence the system's Jacobian is block-diagonal
+        # and can be treated as banded by the solver
+        dfunc = self.dfunc
+        y = self.odeint(
+            lambda t, y: dfunc(t, y.reshape(ia.size, nvars), ia).ravel(),
+            self.y[-1, ia, :].ravel(), t, ml=nvars - 1, mu=nvars - 1)
+        ynew = np.full((t.size - 1, self.nbatch, nvars), np.nan)
+        ynew[:, ia, :] = y[1:].reshape(t.size - 1, ia.size, nvars)
+        self.icycles.append(self.t.size)
+        self.append(t[1:], ynew)
+
+    def getCycle(self, i, ivars=None):
+        ''' Get time vector and solution matrix for the ith cycle.
+
+            :param i: cycle index
+            :param ivars: optional indexes of subset of variables of interest
+            :return: time vector and (nsamples, nbatch, nvars) solution matrix for ith cycle
+        '''
+        if ivars is None:
+            ivars = range(self.nvars)
+        istart = self.icycles[i]
+        iend = self.icycles[i + 1] if i not in (-1, self.ncycles - 1) else self.t.size
+        return self.t[istart:iend], self.y[istart:iend][:, :, ivars]
+
+    def getPeriodicallyStableMembers(self):
+        ''' Assess the periodic stabilization of each active member, by evaluating the
+            deviation of its primary variables between the last two periods.
+
+            :return: boolean vector stating whether each active member is periodically stable
+        '''
+        y_last, y_prec = [self.getCycle(-i, ivars=self.i_primary_vars)[1][:, self.iactive]
+                          for i in [1, 2]]
+        return np.all(self.metric(y_last, y_prec) < self.threshold, axis=-1)
+
+    def isPeriodicallyStable(self):
+        return self.iactive.size == 0
+
+    def freezeStableMembers(self):
+        ''' Freeze active members that have reached periodic stability. '''
+        is_stable = self.getPeriodicallyStableMembers()
+        self.iend[self.iactive[is_stable]] = self.t.size
+        self.iactive = self.iactive[~is_stable]
+
+    def solve(self, y0, nmax=None, nmin=None, **kwargs):
+        ''' Simulate batch with a specific periodicity until all members are periodically
+            stable, or until a maximum number of cycles is reached.
+
+            :param y0: list of dictionaries of initial conditions (one per batch member)
+            :param nmax: maximum number of integration cycles (optional)
+            :param nmin: minimum number of integration cycles (optional)
+        '''
+        if nmax is None:
+            nmax = NCYCLES_MAX
+        if nmin is None:
+            nmin = 2
+        assert nmin <= nmax, 'incorrect bounds for number of cycles (min > max)'
+
+        # Initialize system
+        self.initialize(y0, **kwargs)
+
+        # Integrate system for minimal number of cycles
+        for i in range(nmin):
+            self.integrateCycle()
+
+        # Keep integrating active members periodically until they are all stable
+        while True:
+            if self.ncycles >= 2:
+                self.freezeStableMembers()
+            if self.isPeriodicallyStable() or self.ncycles >= nmax:
+                break
+            self.integrateCycle()
+
+        # Log stopping criterion
+        if self.iactive.size > 0:
+            logger.warning(self.timedlog(
+                f'criterion not met for {self.iactive.size}/{self.nbatch} members -> '
+                f'stopping after {self.ncycles} cycles'))
+            self.iend[self.iactive] = self.t.size
+        else:
+            logger.debug(self.timedlog(
+                f'stopping criterion met for all members after {self.ncycles} cycles'))
+
+    def __call__(self, *args, target_dt=None, max_nsamples=None, **kwargs):
+        ''' Specific call method: reject resampling options (not supported for batch
+            solutions) before solving.
+        '''
+        if target_dt is not None or max_nsamples is not None:
+            raise ValueError('resampling is not supported for batch solutions')
+        return super().__call__(*args, **kwargs)
+
+    @property
+    def solution(self):
+        ''' Return solution as a list of pandas dataframes (one per batch member).
+
+            :return: list of timeseries dataframes with labeled time, state and variables vectors.
+        '''
+        return [TimeSeries(self.t[:iend], self.x[:iend], {
+            k: self.y[:iend, j, i] for i, k in enumerate(self.ykeys)})
+            for j, iend in enumerate(self.iend)]
+
+
 class EventDrivenSolver(ODESolver):
     ''' Event-driven ODE solver. '''
 
@@ -419,6 +1114,7 @@ class EventDrivenSolver(ODESolver):
         self.xref = 0
         super().initialize(*args, **kwargs)
 
+    @recordCalls('events')
     def fireEvent(self, xevent):
         ''' Call event function and set new xref value. '''
         if xevent is not None:
@@ -495,6 +1191,19 @@ class EventDrivenSolver(ODESolver):
 
 
 class HybridSolver(EventDrivenSolver, PeriodicSolver):
+    ''' Event-driven solver alternating between dense integration of the full system until
+        periodic stabilization, and sparse integration of its slow-evolving variables, in
+        which fast-evolving variables are periodically expanded from their last cycle.
+
+        During sparse integration, the extra arguments of the sparse derivatives function
+        (e.g. membrane capacitance) are tabulated over a cycle and interpolated periodically
+        inside the derivatives function, such that each sparse interval is integrated in a
+        single solver call. The former step-wise integration (one integrator call per sparse
+        sample) can be selected via the "tabulated_sparse" class attribute.
+    '''
+
+    tabulated_sparse = True
+    supports_dense_output = False
 
     def __init__(self, ykeys, dfunc, dfunc_sparse, predfunc, eventfunc, T,
                  dense_vars, dt_dense, dt_sparse, **kwargs):
@@ -511,14 +1220,18 @@ class HybridSolver(EventDrivenSolver, PeriodicSolver):
             :param dt_sparse: sparse integration time step (s)
         '''
         PeriodicSolver.__init__(
-            self, T, ykeys, dfunc, primary_vars=kwargs.get('primary_vars', None), dt=dt_dense)
+            self, T, ykeys, dfunc, primary_vars=kwargs.get('primary_vars', None),
+            metric=kwargs.get('metric', None), threshold=kwargs.get('threshold', None),
+            dt=dt_dense, stats=kwargs.get('stats', None))
         self.eventfunc = eventfunc
         self.assignEventParams(kwargs.get('event_params', None))
         self.predfunc = predfunc
         self.dense_vars = dense_vars
         self.dt_sparse = dt_sparse
+        self.dfunc_sparse = dfunc_sparse
         self.sparse_solver = ode(dfunc_sparse)
-        self.sparse_solver.set_integrator('dop853', nsteps=SOLVER_NSTEPS, atol=1e-12)
+        self.sparse_solver.set_integrator(
+            'dop853', nsteps=SOLVER_NSTEPS, rtol=SPARSE_RTOL, atol=SPARSE_ATOL)
 
     @property
     def predfunc(self):
@@ -552,9 +1265,69 @@ class HybridSolver(EventDrivenSolver, PeriodicSolver):
     def is_sparse_var(self):
         return np.invert(self.is_dense_var)
 
-    def integrateSparse(self, ysparse, target_t):
+    @recordCalls('integration')
+    def integrateSparse(self, tsparse, ysparse, target_t):
         ''' Integrate sparse system until a specific time.
 
+            :param tsparse: time vector of the sparse 1-cycle solution (s)
+            :param ysparse: sparse 1-cycle solution matrix of fast-evolving variables
+            :paramt target_t: target time (s)
+        '''
+        if self.tabulated_sparse:
+            self.integrateSparseTabulated(tsparse, ysparse, target_t)
+        else:
+            self.integrateSparseStepwise(ysparse, target_t)
+
+    def integrateSparseTabulated(self, tsparse, ysparse, target_t):
+        ''' Integrate sparse system until a specific time in a single solver call, using a
+            periodic piecewise linear interpolant of the extra arguments of the sparse
+            derivatives function, tabulated over the sparse cycle.
+
+            :param tsparse: time vector of the sparse 1-cycle solution (s)
+            :param ysparse: sparse 1-cycle solution matrix of fast-evolving variables
+            :param target_t: target time (s)
+        '''
+        # Compute number of samples in the sparse cycle solution
+        npc = ysparse.shape[0]
+
+        # Initialize time vector for the current interval
+        n = int(np.ceil((target_t - self.t[-1]) / self.dt_sparse))
+        t = np.linspace(self.t[-1], target_t, n + 1)
+
+        # Tabulate extra arguments over the cycle, along with the widths of the intervals
+        # separating consecutive cycle samples (the last one wrapping around the period)
+        ptable = [self.predfunc(yref) for yref in ysparse]
+        tref, h = tsparse[0], (tsparse[-1] - tsparse[0]) / (npc - 1)
+        widths = [h] * (npc - 1) + [self.T - (npc - 1) * h]
+        dfunc_sparse = self.dfunc_sparse if self.stats is None else self.stats.timed(
+            self.dfunc_sparse, 'rhs')
+
+        def dfunc(tt, y):
+            phase = (tt - tref) % self.T
+            k = min(int(phase / h), npc - 1)
+            w = (phase - k * h) / widths[k]
+            return dfunc_sparse(tt, y, (1 - w) * ptable[k] + w * ptable[(k + 1) % npc])
+
+        # Integrate sparse variables over the interval, with the same tolerances as the
+        # step-wise integrator (propagating them as is over intervals below the minimal
+        # sparse time step)
+        if target_t - self.t[-1] > MIN_SPARSE_DT:
+            ysp = self.odeint(
+                dfunc, self.y[-1, self.is_sparse_var], t, rtol=SPARSE_RTOL, atol=SPARSE_ATOL)
+        else:
+            ysp = np.tile(self.y[-1, self.is_sparse_var], (n + 1, 1))
+
+        # Assign computed sparse and periodically expanded dense values to solution array
+        y = np.empty((n, self.y.shape[1]))
+        y[:, self.is_dense_var] = ysparse[np.arange(n) % npc][:, self.is_dense_var]
+        y[:, self.is_sparse_var] = ysp[1:]
+
+        # Append to global solution
+        self.append(t[1:], y)
+
+    def integrateSparseStepwise(self, ysparse, target_t):
+        ''' Integrate sparse system until a specific time, sample by sample.
+
             :param ysparse: sparse 1-cycle solution matrix of fast-evolving variables
             :paramt target_t: target time (s)
         '''
@@ -567,6 +1340,8 @@ class HybridSolver(EventDrivenSolver, PeriodicSolver):
         y = np.empty((n, self.y.shape[1]))
 
         # Initialize sparse integrator
+        self.sparse_solver.f = self.dfunc_sparse if self.stats is None else self.stats.timed(
+            self.dfunc_sparse, 'rhs')
         self.sparse_solver.set_initial_value(self.y[-1, self.is_sparse_var], self.t[-1])
         for i, tt in enumerate(t):
             # Integrate to next time only if dt is above given threshold
@@ -631,11 +1406,11 @@ class HybridSolver(EventDrivenSolver, PeriodicSolver):
             if self.t[-1] < tend:
                 # Get solution over last cycle and resample it to sparse time step
                 tlast, ylast = self.getCycle(-1)
-                _, ysparse = self.resampleArrays(tlast, ylast, self.dt_sparse)
+                tsparse, ysparse = self.resampleArrays(tlast, ylast, self.dt_sparse)
 
                 # Integrate sparse system for the rest of the current interval
                 logger.debug(self.timedlog(f'integrating sparse system until {self.timeStr(tend)}'))
-                self.integrateSparse(ysparse, tend)
+                self.integrateSparse(tsparse, ysparse, tend)
 
             # If end-time corresponds to event, fire it and move to next event
             if self.t[-1] == tevent:
@@ -645,3 +1420,275 @@ class HybridSolver(EventDrivenSolver, PeriodicSolver):
                     tevent, xevent = next(ievent)
                 except StopIteration:
                     stop = True
+
+
+class MultirateSolver(EventDrivenSolver):
+    ''' Event-driven solver splitting a system into a fast and a slow subsystem, which are
+        advanced alternately over macro steps spanning many fine time steps:
+
+        - the fast subsystem is integrated on the fine time grid, with the slow variables
+          interpolated from their trajectory over the macro step (linearly extrapolated from
+          the previous macro step in a first pass)
+        - the slow subsystem is integrated over the macro step in a single solver call (with
+          adaptive step sizes) on a coarser time grid, with the extra arguments of its
+          derivatives function (e.g. membrane capacitance) evaluated from the fast solution
+          on that coarse grid only, and linearly interpolated in between. The slow solution
+          is then linearly interpolated back onto the fine grid.
+
+        The coupling error of a macro step is estimated from the deviation between the
+        trajectories of the coupling variables (i.e. the slow variables driving the fast
+        subsystem) used to integrate the fast subsystem and resulting from the slow
+        integration. Macro steps are iterated (waveform relaxation) until that error is within
+        tolerance, and halved if it is not after a few iterations. The size of the next macro
+        step is adapted from the error of the accepted one.
+    '''
+
+    supports_dense_output = False
+
+    def __init__(self, eventfunc, ykeys, dfunc_fast, dfunc_slow, predfunc, fast_vars,
+                 dt, dt_macro, dt_macro_max, dt_slow=None, coupling_vars=None,
+                 rtol=MULTIRATE_RTOL, atol=MULTIRATE_ATOL, niter_max=MULTIRATE_NITER_MAX,
+                 **kwargs):
+        ''' Initialization.
+
+            :param eventfunc: function called on each event
+            :param ykeys: list of differential variables names
+            :param dfunc_fast: derivatives function of the fast subsystem, of signature
+             (t, yfast, ycoupling) -> dyfast/dt, where ycoupling is the list of coupling variables
+            :param dfunc_slow: derivatives function of the slow subsystem, of signature
+             (t, yslow, p) -> dyslow/dt, where p are extra arguments computed from the fast
+             variables
+            :param predfunc: function computing the extra arguments of the slow derivatives
+             function from a vector of fast variables
+            :param fast_vars: list of fast-evolving differential variables
+            :param dt: fine integration time step (s)
+            :param dt_macro: initial macro time step (s)
+            :param dt_macro_max: maximal macro time step (s)
+            :param dt_slow: coarse time step of the slow subsystem (s), defaults to the fine
+             time step
+            :param coupling_vars: list of slow variables driving the fast subsystem (defaults
+             to all slow variables)
+            :param rtol: relative tolerance on the coupling variables
+            :param atol: absolute tolerance on the coupling variables
+            :param niter_max: maximal number of coupling iterations per macro step
+        '''
+        self.ykeys = ykeys
+        self.fast_vars = fast_vars
+        self.dfunc_fast = dfunc_fast
+        self.dfunc_slow = dfunc_slow
+        self.predfunc = predfunc
+        super().__init__(eventfunc, ykeys, self.fullDerivatives, dt=dt, **kwargs)
+        self.coupling_vars = coupling_vars
+        self.dt_macro = dt_macro
+        self.dt_macro_max = dt_macro_max
+        self.dt_slow = dt if dt_slow is None else dt_slow
+        self.rtol = rtol
+        self.atol = atol
+        self.niter_max = niter_max
+
+    @property
+    def predfunc(self):
+        return self._predfunc
+
+    @predfunc.setter
+    def predfunc(self, value):
+        self.checkFunc('prediction', value)
+        self._predfunc = value
+
+    @property
+    def fast_vars(self):
+        return self._fast_vars
+
+    @fast_vars.setter
+    def fast_vars(self, value):
+        if not isIterable(value):
+            value = [value]
+        for item in value:
+            if item not in self.ykeys:
+                raise ValueError(f'{item} is not a differential variable')
+        self._fast_vars = value
+
+    @property
+    def coupling_vars(self):
+        return self._coupling_vars
+
+    @coupling_vars.setter
+    def coupling_vars(self, value):
+        slow_vars = [k for k in self.ykeys if k not in self.fast_vars]
+        if value is None:  # If none specified, consider all slow variables as coupling variables
+            value = slow_vars
+        if not isIterable(value):
+            value = [value]
+        for item in value:
+            if item not in slow_vars:
+                raise ValueError(f'{item} is not a slow differential variable')
+        self._coupling_vars = value
+
+    @property
+    def is_fast_var(self):
+        return np.array([x in self.fast_vars for x in self.ykeys])
+
+    @property
+    def is_slow_var(self):
+        return np.invert(self.is_fast_var)
+
+    @property
+    def i_coupling_vars(self):
+        slow_vars = [k for k in self.ykeys if k not in self.fast_vars]
+        return [slow_vars.index(k) for k in self.coupling_vars]
+
+    def fullDerivatives(self, t, y):
+        ''' Compute the derivatives of the full (coupled) system. '''
+        dydt = np.empty(y.size)
+        yfast, yslow = y[self.is_fast_var], y[self.is_slow_var]
+        dydt[self.is_fast_var] = self.dfunc_fast(t, yfast, list(yslow[self.i_coupling_vars]))
+        dydt[self.is_slow_var] = self.dfunc_slow(t, yslow, self.predfunc(yfast))
+        return dydt
+
+    @staticmethod
+    def gridInterpolator(t0, dt, values):
+        ''' Create a function linearly interpolating values sampled on a uniform time grid.
+
+            :param t0: initial time of the grid (s)
+            :param dt: time step of the grid (s)
+            :param values: vector of scalar values, or (ntimes, nvals) matrix of vector values
+             on the grid
+            :return: interpolating function of time, returning a scalar or a list of values
+        '''
+        # Work on lists of floats, to avoid array overheads in scalar-wise evaluations
+        values = np.asarray(values)
+        n = values.shape[0] - 1
+        columns = values.T.tolist() if values.ndim > 1 else [values.tolist()]
+
+        def interpolator(t):
+            x = (t - t0) / dt
+            k = min(max(int(x), 0), n - 1)
+            w = x - k
+            out = [(1 - w) * v[k] + w * v[k + 1] for v in columns]
+            return out if values.ndim > 1 else out[0]
+
+        return interpolator
+
+    def timedFunc(self, func):
+        ''' Return a function recording its calls as derivatives evaluations, if instrumented. '''
+        return func if self.stats is None else self.stats.timed(func, 'rhs')
+
+    @staticmethod
+    def interpColumns(tnew, t, y):
+        ''' Linearly interpolate the columns of a (ntimes, nvars) matrix onto new times. '''
+        return np.array([np.interp(tnew, t, x) for x in y.T]).T
+
+    def integrateMacroStep(self, t, tc, yslow_pred):
+        ''' Integrate both subsystems over a macro step, for a given trajectory of the slow
+            variables driving the fast subsystem.
+
+            :param t: fine time vector of the macro step (s)
+            :param tc: coarse time vector of the macro step (s)
+            :param yslow_pred: (ncoarse, nslow) predicted trajectory of slow variables on the
+             coarse grid
+            :return: fast solution matrix on the fine grid, and slow solution matrix on the
+             coarse grid
+        '''
+        dtc = tc[1] - tc[0]
+
+        # Integrate fast subsystem on the fine grid
+        ypred = self.gridInterpolator(tc[0], dtc, yslow_pred[:, self.i_coupling_vars])
+        dfunc_fast = self.timedFunc(self.dfunc_fast)
+        yfast = self.odeint(
+            lambda tt, yy: dfunc_fast(tt, yy, ypred(tt)), self.y[-1, self.is_fast_var], t)
+
+        # Integrate slow subsystem in one call on the coarse grid, with extra arguments
+        # evaluated on the coarse grid and interpolated in between
+        p = self.gridInterpolator(
+            tc[0], dtc, [self.predfunc(x) for x in self.interpColumns(tc, t, yfast)])
+        dfunc_slow = self.timedFunc(self.dfunc_slow)
+        yslow = self.odeint(
+            lambda tt, yy: dfunc_slow(tt, yy, p(tt)), self.y[-1, self.is_slow_var], tc)
+
+        return yfast, yslow
+
+    def couplingError(self, yslow_pred, yslow):
+        ''' Compute the normalized coupling error between predicted and computed slow
+            trajectories (errors below 1 are within tolerance).
+
+            :param yslow_pred: predicted trajectory of slow variables
+            :param yslow: computed trajectory of slow variables
+            :return: coupling error
+        '''
+        ypred, y = yslow_pred[:, self.i_coupling_vars], yslow[:, self.i_coupling_vars]
+        scale = self.atol + self.rtol * np.abs(y).max(axis=0)
+        return np.max(np.abs(y - ypred).max(axis=0) / scale)
+
+    @recordCalls('integration')
+    def integrateUntil(self, target_t, remove_first=False):
+        ''' Integrate system until a target time with adaptive macro steps, and append new
+            arrays to global arrays.
+
+            :param target_t: target time (s)
+            :param remove_first: optional boolean specifying whether to remove the first index
+            of the new arrays before appending
+        '''
+        if target_t < self.t[-1]:
+            raise ValueError(f'target time ({target_t} s) precedes current time {self.t[-1]} s')
+        while self.t[-1] < target_t:
+            # Propagate solution as is over intervals below the minimal time step
+            if target_t - self.t[-1] <= MIN_SPARSE_DT:
+                t, y = np.array([self.t[-1], target_t]), np.tile(self.y[-1], (2, 1))
+                if remove_first:
+                    t, y = t[1:], y[1:]
+                self.append(t, y)
+                break
+
+            # Compute fine time vector of the macro step, truncated at target time (and
+            # extended to it if less than a fine time step would remain)
+            tend = self.t[-1] + self.dt_macro
+            if target_t - tend < self.dt:
+                tend = target_t
+            nfine = max(int(np.round((tend - self.t[-1]) / self.dt)), 1)
+            t = np.linspace(self.t[-1], tend, nfine + 1)
+
+            # Compute coarse time vector of the macro step, spanning the same interval
+            ncoarse = max(int(np.round((tend - self.t[-1]) / self.dt_slow)), 1)
+            tc = np.linspace(self.t[-1], tend, ncoarse + 1)
+
+            # Predict slow trajectory by linear extrapolation from the previous macro step
+            yslow0 = self.y[-1, self.is_slow_var]
+            yslow_pred = yslow0 + np.outer(tc - tc[0], self.slow_slope)
+
+            # Iterate macro step until coupling error is within tolerance
+            for i in range(self.niter_max):
+                yfast, yslow = self.integrateMacroStep(t, tc, yslow_pred)
+                err = self.couplingError(yslow_pred, yslow)
+                if i == 0:
+                    err0 = err
+                if err <= 1.:
+                    break
+                yslow_pred = yslow
+
+            # If coupling error remains above tolerance, halve macro step and retry
+            # (unless it spans a single fine time step)
+            if err > 1. and t.size > 2:
+                self.dt_macro = max(self.dt_macro / 2, self.dt)
+                logger.debug(self.timedlog(
+                    f'coupling error = {err:.2e} -> reducing macro step to '
+                    f'{self.timeStr(self.dt_macro)}'))
+                continue
+
+            # Accept macro step, update extrapolation slope, and adapt macro step size from
+            # first-pass (prediction) error
+            self.slow_slope = (yslow[-1] - yslow0) / (tc[-1] - tc[0])
+            factor = 2. if err0 == 0. else min(max(0.9 / np.sqrt(err0), 0.5), 2.)
+            self.dt_macro = min(max(self.dt_macro * factor, self.dt), self.dt_macro_max)
+
+            # Assemble solution on the fine grid, interpolating the slow solution onto it
+            y = np.empty((t.size, self.nvars))
+            y[:, self.is_fast_var] = yfast
+            y[:, self.is_slow_var] = self.interpColumns(t, tc, yslow)
+            if remove_first:
+                t, y = t[1:], y[1:]
+            self.append(t, y)
+            remove_first = True
+
+    def initialize(self, *args, **kwargs):
+        super().initialize(*args, **kwargs)
+        self.slow_slope = np.zeros(np.sum(self.is_slow_var))
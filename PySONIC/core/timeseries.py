@@ -146,6 +146,120 @@ class TimeSeries(pd.DataFrame):
         return self.__class__(t, stim, outputs)
 
 
+class DenseSolution:
+    ''' Continuous simulation solution, made of successive segments (e.g. between stimulus
+        events) backed by the dense-output interpolants of the ODE solver.
+
+        The solution is evaluated lazily at any requested times, and a timeseries dataframe is
+        only materialized on demand (by default at the integration steps), after application
+        of an optional post-processing function (e.g. computing derived variables).
+    '''
+
+    def __init__(self, ykeys, postpro=None):
+        ''' Initialization.
+
+            :param ykeys: list of differential variables names
+            :param postpro: optional function of signature (timeseries) -> timeseries applied
+             to materialized timeseries
+        '''
+        self.ykeys = list(ykeys)
+        self.postpro = postpro
+        self.interpolants = []  # dense-output interpolant of each segment
+        self.tsteps = []        # integration steps of each segment (s)
+        self.xsegments = []     # stimulus state of each segment
+
+    def __repr__(self):
+        tmin, tmax = self.tbounds
+        return (f'{self.__class__.__name__}({len(self)} segments, {self.nsteps} steps, '
+                f'{tmin:.2e} - {tmax:.2e} s)')
+
+    def __len__(self):
+        return len(self.interpolants)
+
+    def addSegment(self, interpolant, tsteps, x):
+        ''' Add a solution segment.
+
+            :param interpolant: dense-output interpolant, i.e. function of signature
+             (t) -> (nvars, ntimes) matrix
+            :param tsteps: integration steps of the segment (s)
+            :param x: stimulus state over the segment
+        '''
+        self.interpolants.append(interpolant)
+        self.tsteps.append(np.asarray(tsteps))
+        self.xsegments.append(x)
+
+    @property
+    def tstarts(self):
+        return np.array([t[0] for t in self.tsteps])
+
+    @property
+    def tbounds(self):
+        return self.tsteps[0][0], self.tsteps[-1][-1]
+
+    @property
+    def nsteps(self):
+        return sum(t.size for t in self.tsteps)
+
+    def segmentIndexes(self, t):
+        ''' Get the index of the segment covering each time point (the latest one at
+            segment boundaries, such that the solution is right-continuous at events). '''
+        return np.clip(np.searchsorted(self.tstarts, t, side='right') - 1, 0, len(self) - 1)
+
+    def __call__(self, t):
+        ''' Evaluate differential variables at specific times.
+
+            :param t: time vector (s)
+            :return: (ntimes, nvars) solution matrix
+        '''
+        t = np.atleast_1d(t)
+        y = np.empty((t.size, len(self.ykeys)))
+        iseg = self.segmentIndexes(t)
+        for i in np.unique(iseg):
+            mask = iseg == i
+            y[mask] = self.interpolants[i](t[mask]).T
+        return y
+
+    def stim(self, t):
+        ''' Evaluate the stimulus state at specific times.
+
+            :param t: time vector (s)
+            :return: stimulus state vector
+        '''
+        return np.array(self.xsegments)[self.segmentIndexes(np.atleast_1d(t))]
+
+    def toTimeSeries(self, t=None):
+        ''' Materialize the solution as a timeseries dataframe.
+
+            :param t: optional time vector (s). If none is provided, the solution is
+             materialized at the integration steps of all segments (including pre- and
+             post-event samples at segment boundaries).
+            :return: timeseries dataframe
+        '''
+        if t is None:
+            t = np.hstack(self.tsteps)
+            x = np.hstack([np.full(ts.size, x) for ts, x in zip(self.tsteps, self.xsegments)])
+            y = np.vstack([f(ts).T for f, ts in zip(self.interpolants, self.tsteps)])
+        else:
+            t = np.atleast_1d(t)
+            x, y = self.stim(t), self(t)
+        data = TimeSeries(t, x, {k: y[:, i] for i, k in enumerate(self.ykeys)})
+        if self.postpro is not None:
+            data = self.postpro(data)
+        return data
+
+    def resample(self, dt):
+        ''' Materialize the solution as a timeseries dataframe at regular time step. '''
+        tmin, tmax = self.tbounds
+        n = int((tmax - tmin) / dt) + 1
+        return self.toTimeSeries(np.linspace(tmin, tmax, n))
+
+
+def asTimeSeries(data):
+    ''' Return simulation output as a timeseries dataframe, materializing dense solutions at
+        their integration steps. '''
+    return data.toTimeSeries() if isinstance(data, DenseSolution) else data
+
+
 class SpatiallyExtendedTimeSeries:
 
     def __init__(self, data):
@@ -8,8 +8,10 @@
 import re
 import inspect
 from types import MethodType
+import numpy as np
 
 from .pneuron import PointNeuron
+from ..utils import logger
 
 
 class Translator:
@@ -264,9 +266,13 @@ class SonicTranslator(PointNeuronTranslator):
     lambda_dict_call_pattern = r'{}\(({})\)'.format(
         lambda_dict_accessor_pattern, Translator.variable_pattern)
 
+    # Prefixes of local variable names in generated flat functions
+    state_prefix = 'x_'
+    rate_prefix = 'lkp_'
+
     def __init__(self, pclass, verbose=False):
         super().__init__(pclass, verbose=verbose)
-        self.eff_rates, self.eff_rates_str = {}, {}
+        self.eff_rates, self.eff_rates_str, self.eff_rates_expr = {}, {}, {}
         self.alphax_list, self.betax_list, self.taux_list, self.xinf_list = [], [], [], []
 
     def parseLambdaDict(self, lambda_dict, translate_func):
@@ -296,6 +302,7 @@ class SonicTranslator(PointNeuronTranslator):
                 try:
                     self.eff_rates[expr] = getattr(self.pclass, expr)
                     self.eff_rates_str[expr] = f'self.{expr}'
+                    self.eff_rates_expr[expr] = f'cls.{expr}(Vm)'
                     l.append(expr)
                 except AttributeError:
                     raise ValueError(err_str)
@@ -312,8 +319,10 @@ class SonicTranslator(PointNeuronTranslator):
                     try:
                         xinf, taux = [getattr(self.pclass, s) for s in [xinf_str, taux_str]]
                         # If taux is a constant, define a lambda function that returns it
+                        taux_expr = f'cls.{taux_str}(Vm)'
                         if not callable(taux):
                             taux = self.defineConstLambda(taux)
+                            taux_expr = f'cls.{taux_str}'
                         self.eff_rates.update({
                             alphax_str: lambda Vm: xinf(Vm) / taux(Vm),
                             betax_str: lambda Vm: (1 - xinf(Vm)) / taux(Vm)
@@ -322,6 +331,10 @@ class SonicTranslator(PointNeuronTranslator):
                             alphax_str: f'lambda Vm: cls.{xinf_str}(Vm) / cls.{taux_str}(Vm)',
                             betax_str: f'lambda Vm: (1 - cls.{xinf_str}(Vm)) / cls.{taux_str}(Vm)'
                         })
+                        self.eff_rates_expr.update({
+                            alphax_str: f'cls.{xinf_str}(Vm) / {taux_expr}',
+                            betax_str: f'(1 - cls.{xinf_str}(Vm)) / {taux_expr}'
+                        })
                         l.append(expr)
                     except AttributeError:
                         raise ValueError(err_str)
@@ -358,6 +371,7 @@ class SonicTranslator(PointNeuronTranslator):
 
         # Get dictionary of translated lambda functions expressions for derivative states
         eff_dstates_str = self.parseLambdaDict(self.pclass.derStates(), self.translateExpr)
+        self.eff_dstates_str = eff_dstates_str
         if self.verbose:
             print('---------- derEffStates ----------')
             for k, v in eff_dstates_str.items():
@@ -388,11 +402,199 @@ class SonicTranslator(PointNeuronTranslator):
                 for k, v in qsstates_str.items()}
 
 
+    @property
+    def flat_rates_keys(self):
+        ''' Ordered keys of the rates vector used by generated flat functions. '''
+        return ['V', *self.eff_rates.keys()]
+
+    def flatRateVariable(self, key):
+        ''' Return the flat expression of a (possibly derived) effective variable. '''
+        if key in self.flat_rates_keys:
+            return f'{self.rate_prefix}{key}'
+        for p, fmt in zip([self.taux_pattern, self.xinf_pattern],
+                          ['(1 / ({a} + {b}))', '({a} / ({a} + {b}))']):
+            m = p.match(key)
+            if m is not None:
+                alphax, betax = [f'{x}{m.group(1)}' for x in ['alpha', 'beta']]
+                if alphax in self.eff_rates and betax in self.eff_rates:
+                    return fmt.format(a=self.flatRateVariable(alphax),
+                                      b=self.flatRateVariable(betax))
+        raise ValueError(f'cannot flatten unknown effective variable: "{key}"')
+
+    def flattenExpr(self, expr):
+        ''' Replace dictionary accessors of an expression by flat local variables. '''
+        states = self.pclass.statesNames()
+
+        def replace(m):
+            dict_name, key = m.group(1), m.group(3)
+            if dict_name == 'lkp':
+                return self.flatRateVariable(key)
+            if key in states:
+                return f'{self.state_prefix}{key}'
+            raise ValueError(f'cannot flatten "{m.group(0)}" dictionary accessor')
+
+        expr = re.sub(self.dict_accessor_pattern, replace, expr)
+        if 'lambda_dict' in expr:
+            raise ValueError('cannot flatten lambda dictionary inter-dependencies')
+        return expr
+
+    def parseFlatCurrents(self):
+        ''' Parse neuron's currents method into a list of flat expressions. '''
+        currents = []
+        for func in self.pclass.currents().values():
+            func_args, func_exp = self.getLambdaSource(func)
+            func_args = [x.strip() for x in func_args.split(',')]
+            # First argument is the membrane potential, extra arguments are set to default
+            func_exp = re.sub(rf'\b{func_args[0]}\b', f'{self.rate_prefix}V', func_exp)
+            for arg in func_args[2:]:
+                func_exp = re.sub(rf'\b{arg}\b', 'None', func_exp)
+            currents.append(f'({self.flattenExpr(func_exp)})')
+        return currents
+
+    def generateFlatDerivatives(self, fname='flat_derivatives'):
+        ''' Generate the source code of a flat derivatives function of signature
+            (t, y, rates_vector) -> dydt, computing the charge and states derivatives without
+            any dictionary construction.
+
+            The rates vector is ordered according to the "flat_rates_keys" list, i.e. the
+            membrane potential (mV) followed by all effective rates (s-1), such that the same
+            function can be used for SONIC (interpolated rates) and ESTIM (rates evaluated at
+            the current membrane potential) simulations.
+        '''
+        states = self.pclass.statesNames()
+        ind = '    '
+        lines = [f'def {fname}(t, y, r):']
+        lines += [f'{ind}{self.state_prefix}{k} = y[{i + 1}]' for i, k in enumerate(states)]
+        lines += [f'{ind}{self.rate_prefix}{k} = r[{i}]'
+                  for i, k in enumerate(self.flat_rates_keys)]
+        lines.append(f'{ind}dydt = np.empty({len(states) + 1})')
+        currents = ' + '.join(self.parseFlatCurrents())
+        lines.append(f'{ind}dydt[0] = - ({currents}) * 1e-3')
+        for i, k in enumerate(states):
+            lines.append(f'{ind}dydt[{i + 1}] = {self.flattenExpr(self.eff_dstates_str[k])}')
+        lines.append(f'{ind}return dydt')
+        return '\n'.join(lines)
+
+    def parseStatesDependencies(self):
+        ''' Determine, for each differential variable, the list of states its derivative
+            depends on (in addition to the membrane charge, on which all derivatives depend),
+            by parsing the flat expressions of the charge and states derivatives.
+        '''
+        states = self.pclass.statesNames()
+        exprs = {
+            'Qm': ' + '.join(self.parseFlatCurrents()),
+            **{k: self.flattenExpr(self.eff_dstates_str[k]) for k in states}
+        }
+        return {
+            k: [x for x in states if re.search(rf'\b{self.state_prefix}{x}\b', expr)]
+            for k, expr in exprs.items()}
+
+    def generateFlatRates(self, fname='flat_rates'):
+        ''' Generate the source code of a flat function computing the rates vector
+            (ordered as in "flat_rates_keys") at a given membrane potential. '''
+        ind = '    '
+        lines = [f'def {fname}(Vm):']
+        lines.append(f'{ind}r = np.empty({len(self.flat_rates_keys)})')
+        lines.append(f'{ind}r[0] = Vm')
+        for i, k in enumerate(self.eff_rates.keys()):
+            lines.append(f'{ind}r[{i + 1}] = {self.eff_rates_expr[k]}')
+        lines.append(f'{ind}return r')
+        return '\n'.join(lines)
+
+    def getFuncReturnExpr(self, fname):
+        ''' Get the return expression of a single-statement class function, if any. '''
+        func = getattr(self.pclass, fname)
+        code_lines = [self.removeLineComments(x) for x in self.getFuncSource(func)]
+        code_lines = list(filter(None, code_lines))
+        if len(code_lines) != 1 or not code_lines[0].startswith('return '):
+            raise ValueError(f'cannot inline multi-statement function "{fname}"')
+        return self.getFuncSignatureArgs(func), code_lines[0][len('return '):]
+
+    def splitArgs(self, s):
+        ''' Split a comma-separated arguments string, respecting nested brackets. '''
+        args, balance, current = [], 0, ''
+        for c in s:
+            if c == ',' and balance == 0:
+                args.append(current.strip())
+                current = ''
+                continue
+            if c in '([':
+                balance += 1
+            elif c in ')]':
+                balance -= 1
+            current += c
+        if current.strip():
+            args.append(current.strip())
+        return args
+
+    def inlineClassReferences(self, src, max_calls=1000):
+        ''' Inline class attributes (as literals) and single-statement class methods
+            in a source code string, such that it no longer references the neuron class.
+
+            .. note:: class attributes are frozen at their current values.
+        '''
+        for _ in range(max_calls):
+            m = re.search(self.class_method_pattern, src)
+            if m is None:
+                break
+            fname = m.group(1)
+            closure = self.getClosure(src[m.end():])
+            args = self.splitArgs(closure)
+            func_args, func_exp = self.getFuncReturnExpr(fname)
+            if len(args) != len(func_args):
+                raise ValueError(f'cannot inline "{fname}" call with default arguments')
+            for farg, arg in zip(func_args, args):
+                func_exp = re.sub(rf'(?<![\.\w]){farg}\b', f'({arg})', func_exp)
+            src = f'{src[:m.start()]}({func_exp}){src[m.end() + len(closure) + 1:]}'
+
+        def replaceAttr(m):
+            value = getattr(self.pclass, m.group(1))
+            if not isinstance(value, (int, float)):
+                raise ValueError(f'cannot inline non-numeric class attribute "{m.group(1)}"')
+            return f'({float(value)!r})'
+
+        src = re.sub(self.class_attribute_pattern, replaceAttr, src)
+        if 'cls.' in src:
+            raise ValueError('could not inline all class references')
+        return src
+
+    def compileFlatFunction(self, src, fname, jit=False):
+        ''' Compile the source code of a flat function, optionally with Numba.
+
+            If jit compilation is requested but fails (e.g. Numba is not installed, or class
+            references cannot be inlined), the pure Python function is returned.
+        '''
+        if jit:
+            try:
+                import numba
+                func = self.compileFlatFunction(self.inlineClassReferences(src), fname)
+                return numba.njit(cache=False)(func)
+            except (ImportError, ValueError) as err:
+                logger.warning(f'{self.pclass.__name__}: cannot jit-compile {fname} ({err})')
+        namespace = {'np': np, 'cls': self.pclass}
+        exec(src, namespace)
+        return namespace[fname]
+
+
 def createClassMethod(func):
     ''' Create a class method from a function. '''
     return lambda self: func
 
 
+def createFlatFunctionGetter(translator, srcs, fname):
+    ''' Create a class method lazily compiling (and caching) a generated flat function. '''
+    cache = {}
+
+    def getter(cls, jit=False):
+        if srcs is None:
+            return None
+        if jit not in cache:
+            cache[jit] = translator.compileFlatFunction(srcs[fname], fname, jit=jit)
+        return cache[jit]
+
+    return getter
+
+
 def addSonicFeatures(pclass):
     ''' Add the necessary features to a point-neuron class to enable acoustic simulation
         with the SONIC method.
@@ -401,6 +603,8 @@ def addSonicFeatures(pclass):
         - derEffStates and effRates methods
         - alphax, betax, taux and xinf list attributes
         - quasiSteadyStates method
+        - flatDerivatives and flatRates methods returning code-generated flat functions
+        - states_dependencies attribute used to derive the Jacobian sparsity pattern
     '''
     # Check that the base class inherits from PointNeuron class
     assert issubclass(pclass, PointNeuron), 'Base class must inherit from "PointNeuron" class'
@@ -416,4 +620,22 @@ def addSonicFeatures(pclass):
     pclass.xinf_list = set(translator.xinf_list)
     qsstates = translator.parseSteadyStates()
     pclass.quasiSteadyStates = MethodType(createClassMethod(qsstates), pclass)
+
+    # Generate flat derivatives and rates functions, if possible
+    try:
+        flat_srcs = {
+            'flat_derivatives': translator.generateFlatDerivatives('flat_derivatives'),
+            'flat_rates': translator.generateFlatRates('flat_rates')
+        }
+        states_dependencies = translator.parseStatesDependencies()
+    except ValueError as err:
+        logger.debug(f'{pclass.__name__}: flat functions not generated ({err})')
+        flat_srcs, states_dependencies = None, None
+    pclass.flat_srcs = flat_srcs
+    pclass.flat_rates_keys = translator.flat_rates_keys
+    pclass.states_dependencies = states_dependencies
+    pclass.flatDerivatives = MethodType(
+        createFlatFunctionGetter(translator, flat_srcs, 'flat_derivatives'), pclass)
+    pclass.flatRates = MethodType(
+        createFlatFunctionGetter(translator, flat_srcs, 'flat_rates'), pclass)
     return pclass
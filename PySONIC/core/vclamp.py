@@ -127,7 +127,8 @@ class VoltageClamp(Model):
             lambda x: setattr(solver, 'V', Vfunc(x)),          # eventfunc
             y0.keys(),                                         # variables list
             lambda t, y: self.derivatives(t, y, Vm=solver.V),  # dfunc
-            dt=DT_EFFECTIVE)                                   # time step
+            dt=DT_EFFECTIVE,                                   # time step
+            stats=self.solver_stats)                           # statistics
         data = solver(y0, pp.stimEvents(), pp.tstop)
 
         # Compute clamped membrane potential vector
@@ -11,7 +11,7 @@ import logging
 import numpy as np
 
 from ..utils import logger, isWithin, os_name
-from ..core import Model, NeuronalBilayerSonophore, EventDrivenSolver
+from ..core import Model, NeuronalBilayerSonophore, EventDrivenSolver, LinearInterpolator1D
 from ..core.timeseries import TimeSeries, SpatiallyExtendedTimeSeries
 from ..constants import CLASSIC_TARGET_DT, MAX_NSAMPLES_EFFECTIVE
 
@@ -21,6 +21,8 @@ class CoupledSonophores:
 
     simkey = 'COUPLED_ASTIM'  # keyword used to characterize simulations made with this model
     ga_bounds = [1e-10, 1e10]  # S/m2
+    instrumented = False  # whether to record solver statistics in simulations metadata
+    solver_stats = None   # statistics object of the ongoing simulation solvers (if instrumented)
 
     def __init__(self, nodes, ga):
         ''' Initialization.
@@ -132,6 +134,22 @@ class CoupledSonophores:
         # Return serialized derivatives vector
         return self.serialize(dydt)
 
+    def jacSparsity(self, node_sparsity, iQ, icoupled):
+        ''' Compute the sparsity pattern of the Jacobian of the serialized system, composed
+            of node-specific diagonal blocks, and of axial coupling terms between the charge
+            derivative of each node and the variables defining the membrane potential of
+            its neighbors.
+
+            :param node_sparsity: (npernode x npernode) sparsity pattern of a single node
+            :param iQ: index of the charge density in the node variables
+            :param icoupled: indexes of the node variables defining its membrane potential
+            :return: (nnodes * npernode) square boolean sparsity matrix
+        '''
+        sparsity = np.kron(np.eye(self.nnodes, dtype=bool), node_sparsity).astype(bool)
+        for i, j in zip(*np.nonzero(self.ga_matrix)):
+            sparsity[i * self.npernode + iQ, [j * self.npernode + k for k in icoupled]] = True
+        return sparsity
+
     def deserializeSolution(self, data):
         ''' Re-arrange solution per node. '''
         inputs = [data.time, data.stim]
@@ -164,7 +182,10 @@ class CoupledSonophores:
             y0.keys(),
             lambda t, y: self.fullDerivatives(t, y, solver.drives, fs),
             event_params={'drives': drives.nullCopy()},
-            dt=dt)
+            dt=dt,
+            jac_sparsity=self.jacSparsity(
+                np.ones((self.npernode, self.npernode), dtype=bool), 3, [1, 3]),
+            stats=self.solver_stats)
 
         # Compute serialized solution
         data = solver(
@@ -202,15 +223,17 @@ class CoupledSonophores:
         # Define event function
         def updateLookups(obj, x):
             for i, (lkp, drive) in enumerate(zip(lkps, drives)):
-                obj.lkps[i] = lkp.project('A', drive.xvar * x)
+                obj.lkps[i] = LinearInterpolator1D(lkp.project('A', drive.xvar * x))
 
         # Initialize solver
         solver = EventDrivenSolver(
             lambda x: updateLookups(solver, x),
             y0.keys(),
             lambda t, y: self.effDerivatives(t, y, solver.lkps),
-            event_params={'lkps': [lkp.project('A', 0.) for lkp in lkps]},
-            dt=dt)
+            event_params={'lkps': [LinearInterpolator1D(lkp.project('A', 0.)) for lkp in lkps]},
+            dt=dt,
+            jac_sparsity=self.jacSparsity(self.refpneuron.jacSparsity(), 0, [0]),
+            stats=self.solver_stats)
 
         # Compute serialized solution
         data = solver(
@@ -194,10 +194,7 @@ class SonicBenchmark:
         ''' Get a lookup object of effective variables for a given capacitance cycle vector. '''
         refs = {'Q': self.Qref}  # C/m2
         Vmarray = np.array([Q / Cm for Q in self.Qref]) * 1e3  # mV
-        tables = {
-            k: np.array([np.mean(np.vectorize(v)(Vmvec)) for Vmvec in Vmarray])
-            for k, v in self.pneuron.effRates().items()
-        }
+        tables = self.pneuron.getEffRates(Vmarray)
         return EffectiveVariablesLookup(refs, tables)
 
     @property
@@ -58,8 +58,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gcabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -76,8 +75,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gcabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -94,8 +92,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gcabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -112,8 +109,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gcabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -133,8 +129,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -151,8 +146,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -169,8 +163,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -187,8 +180,7 @@ class RealisticNeuron(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -288,8 +280,7 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gihbar = 0.00001
         ehcn =  -45.0
-        if(v == -154.9):
-            v = v + 0.0001
+        v = np.where(v == -154.9, v + 0.0001, v)
         malpha =  0.001*6.43*(v+154.9)/(np.exp((v+154.9)/11.9)-1)
         mbeta  =  0.001*193*np.exp(v/33.1)
         minf = malpha/(malpha + mbeta)
@@ -303,8 +294,7 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gihbar = 0.00001
         ehcn =  -45.0
-        if(v == -154.9):
-            v = v + 0.0001
+        v = np.where(v == -154.9, v + 0.0001, v)
         malpha =  0.001*6.43*(v+154.9)/(np.exp((v+154.9)/11.9)-1)
         mbeta  =  0.001*193*np.exp(v/33.1)
         minf = malpha/(malpha + mbeta)
@@ -447,10 +437,7 @@ class RealisticNeuron(PointNeuron):
         qt = 2.3**((celsius-21)/10)
         v = v + 10
         minf =  (1/(1 + np.exp(-(v+1)/12)))
-        if(v<-50):
-            mtau =  (1.25+175.03*np.exp(-v * -0.026))/qt
-        else:
-            mtau = ((1.25+13*np.exp(-v*0.026)))/qt
+        mtau = np.where(v < -50, (1.25+175.03*np.exp(-v * -0.026))/qt, ((1.25+13*np.exp(-v*0.026)))/qt)
         hinf =  1/(1 + np.exp(-(v+54)/-11))
         htau =  (360+(1010+24*(v+55))*np.exp(-((v+75)/48)**2))/qt
         v = v - 10
@@ -469,10 +456,7 @@ class RealisticNeuron(PointNeuron):
         qt = 2.3**((celsius-21)/10)
         v = v + 10
         minf =  (1/(1 + np.exp(-(v+1)/12)))
-        if(v<-50):
-            mtau =  (1.25+175.03*np.exp(-v * -0.026))/qt
-        else:
-            mtau = ((1.25+13*np.exp(-v*0.026)))/qt
+        mtau = np.where(v < -50, (1.25+175.03*np.exp(-v * -0.026))/qt, ((1.25+13*np.exp(-v*0.026)))/qt)
         hinf =  1/(1 + np.exp(-(v+54)/-11))
         htau =  (360+(1010+24*(v+55))*np.exp(-((v+75)/48)**2))/qt
         v = v - 10
@@ -491,10 +475,7 @@ class RealisticNeuron(PointNeuron):
         qt = 2.3**((celsius-21)/10)
         v = v + 10
         minf =  (1/(1 + np.exp(-(v+1)/12)))
-        if(v<-50):
-            mtau =  (1.25+175.03*np.exp(-v * -0.026))/qt
-        else:
-            mtau = ((1.25+13*np.exp(-v*0.026)))/qt
+        mtau = np.where(v < -50, (1.25+175.03*np.exp(-v * -0.026))/qt, ((1.25+13*np.exp(-v*0.026)))/qt)
         hinf =  1/(1 + np.exp(-(v+54)/-11))
         htau =  (360+(1010+24*(v+55))*np.exp(-((v+75)/48)**2))/qt
         v = v - 10
@@ -513,10 +494,7 @@ class RealisticNeuron(PointNeuron):
         qt = 2.3**((celsius-21)/10)
         v = v + 10
         minf =  (1/(1 + np.exp(-(v+1)/12)))
-        if(v<-50):
-            mtau =  (1.25+175.03*np.exp(-v * -0.026))/qt
-        else:
-            mtau = ((1.25+13*np.exp(-v*0.026)))/qt
+        mtau = np.where(v < -50, (1.25+175.03*np.exp(-v * -0.026))/qt, ((1.25+13*np.exp(-v*0.026)))/qt)
         hinf =  1/(1 + np.exp(-(v+54)/-11))
         htau =  (360+(1010+24*(v+55))*np.exp(-((v+75)/48)**2))/qt
         v = v - 10
@@ -616,15 +594,12 @@ class RealisticNeuron(PointNeuron):
         gnap_et2bar = 0.00001
         qt = 2.3**((celsius-21)/10)
         minf = 1.0/(1+np.exp((v- -52.6)/-4.6))
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = 6*(1/(malpha + mbeta))/qt
-        if(v == -17):
-            v = v + 0.0001
-        if(v == -64.4):
-            v = v+0.0001
+        v = np.where(v == -17, v + 0.0001, v)
+        v = np.where(v == -64.4, v + 0.0001, v)
         hinf = 1.0/(1+np.exp((v- -48.8)/10))
         halpha = -2.88e-6 * (v + 17) / (1 - np.exp((v + 17)/4.63))
         hbeta = 6.94e-6 * (v + 64.4) / (1 - np.exp(-(v + 64.4)/2.63))
@@ -639,15 +614,12 @@ class RealisticNeuron(PointNeuron):
         gnap_et2bar = 0.00001
         qt = 2.3**((celsius-21)/10)
         minf = 1.0/(1+np.exp((v- -52.6)/-4.6))
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = 6*(1/(malpha + mbeta))/qt
-        if(v == -17):
-            v = v + 0.0001
-        if(v == -64.4):
-            v = v+0.0001
+        v = np.where(v == -17, v + 0.0001, v)
+        v = np.where(v == -64.4, v + 0.0001, v)
         hinf = 1.0/(1+np.exp((v- -48.8)/10))
         halpha = -2.88e-6 * (v + 17) / (1 - np.exp((v + 17)/4.63))
         hbeta = 6.94e-6 * (v + 64.4) / (1 - np.exp(-(v + 64.4)/2.63))
@@ -662,15 +634,12 @@ class RealisticNeuron(PointNeuron):
         gnap_et2bar = 0.00001
         qt = 2.3**((celsius-21)/10)
         minf = 1.0/(1+np.exp((v- -52.6)/-4.6))
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = 6*(1/(malpha + mbeta))/qt
-        if(v == -17):
-            v = v + 0.0001
-        if(v == -64.4):
-            v = v+0.0001
+        v = np.where(v == -17, v + 0.0001, v)
+        v = np.where(v == -64.4, v + 0.0001, v)
         hinf = 1.0/(1+np.exp((v- -48.8)/10))
         halpha = -2.88e-6 * (v + 17) / (1 - np.exp((v + 17)/4.63))
         hbeta = 6.94e-6 * (v + 64.4) / (1 - np.exp(-(v + 64.4)/2.63))
@@ -685,15 +654,12 @@ class RealisticNeuron(PointNeuron):
         gnap_et2bar = 0.00001
         qt = 2.3**((celsius-21)/10)
         minf = 1.0/(1+np.exp((v- -52.6)/-4.6))
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = 6*(1/(malpha + mbeta))/qt
-        if(v == -17):
-            v = v + 0.0001
-        if(v == -64.4):
-            v = v+0.0001
+        v = np.where(v == -17, v + 0.0001, v)
+        v = np.where(v == -64.4, v + 0.0001, v)
         hinf = 1.0/(1+np.exp((v- -48.8)/10))
         halpha = -2.88e-6 * (v + 17) / (1 - np.exp((v + 17)/4.63))
         hbeta = 6.94e-6 * (v + 64.4) / (1 - np.exp(-(v + 64.4)/2.63))
@@ -710,14 +676,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnata_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = (1/(malpha + mbeta))/qt
         minf = malpha/(malpha + mbeta)
-        if(v == -66):
-            v = v + 0.0001
+        v = np.where(v == -66, v + 0.0001, v)
         halpha = (-0.015 * (v- -66))/(1-(np.exp((v- -66)/6)))
         hbeta  = (-0.015 * (-v -66))/(1-(np.exp((-v -66)/6)))
         htau = (1/(halpha + hbeta))/qt
@@ -731,14 +695,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnata_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = (1/(malpha + mbeta))/qt
         minf = malpha/(malpha + mbeta)
-        if(v == -66):
-            v = v + 0.0001
+        v = np.where(v == -66, v + 0.0001, v)
         halpha = (-0.015 * (v- -66))/(1-(np.exp((v- -66)/6)))
         hbeta  = (-0.015 * (-v -66))/(1-(np.exp((-v -66)/6)))
         htau = (1/(halpha + hbeta))/qt
@@ -752,14 +714,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnata_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = (1/(malpha + mbeta))/qt
         minf = malpha/(malpha + mbeta)
-        if(v == -66):
-            v = v + 0.0001
+        v = np.where(v == -66, v + 0.0001, v)
         halpha = (-0.015 * (v- -66))/(1-(np.exp((v- -66)/6)))
         hbeta  = (-0.015 * (-v -66))/(1-(np.exp((-v -66)/6)))
         htau = (1/(halpha + hbeta))/qt
@@ -773,14 +733,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnata_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -38):
-            v = v+0.0001
+        v = np.where(v == -38, v + 0.0001, v)
         malpha = (0.182 * (v- -38))/(1-(np.exp(-(v- -38)/6)))
         mbeta  = (0.124 * (-v -38))/(1-(np.exp(-(-v -38)/6)))
         mtau = (1/(malpha + mbeta))/qt
         minf = malpha/(malpha + mbeta)
-        if(v == -66):
-            v = v + 0.0001
+        v = np.where(v == -66, v + 0.0001, v)
         halpha = (-0.015 * (v- -66))/(1-(np.exp((v- -66)/6)))
         hbeta  = (-0.015 * (-v -66))/(1-(np.exp((-v -66)/6)))
         htau = (1/(halpha + hbeta))/qt
@@ -797,14 +755,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -818,14 +774,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -839,14 +793,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -860,14 +812,12 @@ class RealisticNeuron(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
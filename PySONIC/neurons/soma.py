@@ -45,8 +45,7 @@ class Soma(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -63,8 +62,7 @@ class Soma(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -81,8 +79,7 @@ class Soma(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -99,8 +96,7 @@ class Soma(PointNeuron):
         v = Vm
         celsius = 37
         gca_hvabar = 0.00001
-        if((v == -27) ):
-            v = v+0.0001
+        v = np.where(v == -27, v + 0.0001, v)
         malpha =  (0.055*(-27-v))/(np.exp((-27-v)/3.8) - 1)
         mbeta  =  (0.94*np.exp((-75-v)/17))
         minf = malpha/(malpha + mbeta)
@@ -200,8 +196,7 @@ class Soma(PointNeuron):
         celsius = 37
         gihbar = 0.00001
         ehcn =  -45.0
-        if(v == -154.9):
-            v = v + 0.0001
+        v = np.where(v == -154.9, v + 0.0001, v)
         malpha =  0.001*6.43*(v+154.9)/(np.exp((v+154.9)/11.9)-1)
         mbeta  =  0.001*193*np.exp(v/33.1)
         minf = malpha/(malpha + mbeta)
@@ -215,8 +210,7 @@ class Soma(PointNeuron):
         celsius = 37
         gihbar = 0.00001
         ehcn =  -45.0
-        if(v == -154.9):
-            v = v + 0.0001
+        v = np.where(v == -154.9, v + 0.0001, v)
         malpha =  0.001*6.43*(v+154.9)/(np.exp((v+154.9)/11.9)-1)
         mbeta  =  0.001*193*np.exp(v/33.1)
         minf = malpha/(malpha + mbeta)
@@ -233,14 +227,12 @@ class Soma(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -254,14 +246,12 @@ class Soma(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -275,14 +265,12 @@ class Soma(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -296,14 +284,12 @@ class Soma(PointNeuron):
         celsius = 37
         gnats2_tbar = 0.00001
         qt = 2.3**((celsius-21)/10)
-        if(v == -32):
-            v = v+0.0001
+        v = np.where(v == -32, v + 0.0001, v)
         malpha = (0.182 * (v- -32))/(1-(np.exp(-(v- -32)/6)))
         mbeta  = (0.124 * (-v -32))/(1-(np.exp(-(-v -32)/6)))
         minf = malpha/(malpha + mbeta)
         mtau = (1/(malpha + mbeta))/qt
-        if(v == -60):
-            v = v + 0.0001
+        v = np.where(v == -60, v + 0.0001, v)
         halpha = (-0.015 * (v- -60))/(1-(np.exp((v- -60)/6)))
         hbeta  = (-0.015 * (-v -60))/(1-(np.exp((-v -60)/6)))
         hinf = halpha/(halpha + hbeta)
@@ -299,10 +299,10 @@ class ThalamoCortical(Thalamic):
 
     @classmethod
     def tauu(cls, Vm):
-        if Vm + cls.Vx < -80.0:
-            return 1.0 / 3.7 * np.exp((Vm + cls.Vx + 467.0) / 66.6) * 1e-3  # s
-        else:
-            return 1 / 3.7 * (np.exp(-(Vm + cls.Vx + 22) / 10.5) + 28.0) * 1e-3  # s
+        return np.where(
+            Vm + cls.Vx < -80.0,
+            1.0 / 3.7 * np.exp((Vm + cls.Vx + 467.0) / 66.6),
+            1 / 3.7 * (np.exp(-(Vm + cls.Vx + 22) / 10.5) + 28.0)) * 1e-3  # s
 
     @staticmethod
     def oinf(Vm):
@@ -97,6 +97,12 @@ class Parser(ArgumentParser):
         self.add_argument(
             '--mpi', default=False, action='store_true', help='Use multiprocessing')
 
+    def addTaskDir(self):
+        self.add_argument(
+            '--taskdir', type=str, default=None,
+            help='Shared directory of a file-based task queue, to distribute batches over '
+                 'worker processes on several hosts (see run_worker.py)')
+
     def addTest(self):
         self.add_argument(
             '--test', default=False, action='store_true', help='Run test configuration')
@@ -750,7 +756,7 @@ class AStimParser(PWSimParser, MechSimParser):
         MechSimParser.__init__(self)
         PWSimParser.__init__(self)
         self.defaults.update({'method': 'sonic'})
-        self.allowed.update({'method': ['full', 'hybrid', 'sonic']})
+        self.allowed.update({'method': ['full', 'hybrid', 'multirate', 'sonic']})
         self.addMethod()
         self.addQSSVars()
 
@@ -811,6 +811,10 @@ def simAndSave(model, *args, **kwargs):
     if data is None:
         data, meta = model.simulate(*args, **kwargs)
 
+    # Materialize dense solution objects at their integration steps
+    if hasattr(data, 'toTimeSeries'):
+        data = data.toTimeSeries()
+
     # Remove internal variables if specified
     if not full_output:
         data.dumpOutputsOtherThan(['Qm', 'Vm'])
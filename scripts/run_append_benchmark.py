@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+''' Benchmark the cost of appending integration segments to the global arrays of an
+    event-driven solver, as a function of the number of events. '''
+
+import time
+import logging
+import numpy as np
+import matplotlib.pyplot as plt
+from argparse import ArgumentParser
+
+from PySONIC.core import EventDrivenSolver
+from PySONIC.utils import logger
+
+
+def benchmarkAppend(nevents, nvars=5, nperevent=100):
+    ''' Measure the average cost of appending a solution segment to an event-driven
+        solver's global arrays, after a given number of events.
+
+        :param nevents: number of events
+        :param nvars: number of differential variables
+        :param nperevent: number of samples per integration segment
+        :return: average cost per append over the last 10% of events (s)
+    '''
+    solver = EventDrivenSolver(
+        lambda x: None, [f'y{i}' for i in range(nvars)], lambda t, y: -y, dt=1e-5)
+    solver.initialize({f'y{i}': 1. for i in range(nvars)})
+    t = np.linspace(0, 1e-3, nperevent)
+    y = np.ones((nperevent, nvars))
+    nlast = max(nevents // 10, 1)
+    for i in range(nevents - nlast):
+        solver.append(t, y)
+    start_time = time.perf_counter()
+    for i in range(nlast):
+        solver.append(t, y)
+    return (time.perf_counter() - start_time) / nlast
+
+
+def main():
+    ap = ArgumentParser()
+    ap.add_argument('--nmax', type=int, default=20000, help='Maximum number of events')
+    ap.add_argument('-p', '--plot', default=False, action='store_true', help='Plot results')
+    args = ap.parse_args()
+    logger.setLevel(logging.INFO)
+
+    nevents = np.logspace(2, np.log10(args.nmax), 6).astype(int)
+    costs = np.array([benchmarkAppend(n) for n in nevents])
+    for n, c in zip(nevents, costs):
+        logger.info(f'{n:6d} events: {c * 1e6:.2f} us per append')
+
+    if args.plot:
+        fig, ax = plt.subplots()
+        ax.set_xscale('log')
+        ax.set_xlabel('# events')
+        ax.set_ylabel('append cost (us)')
+        ax.plot(nevents, costs * 1e6, '.-')
+        plt.show()
+
+
+if __name__ == '__main__':
+    main()
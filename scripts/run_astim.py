@@ -7,14 +7,17 @@
 
 ''' Run A-STIM simulations of a specific point-neuron. '''
 
-from PySONIC.core import NeuronalBilayerSonophore, Batch
-from PySONIC.utils import logger
+import itertools
+
+from PySONIC.core import NeuronalBilayerSonophore, Batch, CostModel, TaskDirectory
+from PySONIC.utils import logger, loadData
 from PySONIC.parsers import AStimParser
 
 
 def main():
     # Parse command line arguments
     parser = AStimParser()
+    parser.addTaskDir()
     args = parser.parse()
     logger.setLevel(args['loglevel'])
     sim_inputs = parser.parseSimInputs(args)
@@ -25,11 +28,34 @@ def main():
     queue = getattr(NeuronalBilayerSonophore, simQueue_func)(
         *sim_inputs, outputdir=args['outputdir'], overwrite=args['overwrite'])
     output = []
+    cost_model = CostModel(
+        NeuronalBilayerSonophore.simWorkload, rates=NeuronalBilayerSonophore.sim_cost_rates,
+        argnames=['drive', 'pp', 'fs', 'method', 'qss_vars'])
     for a in args['radius']:
         for pneuron in args['neuron']:
             nbls = NeuronalBilayerSonophore(a, pneuron)
             batch = Batch(nbls.simAndSave if args['save'] else nbls.simulate, queue)
-            output += batch(mpi=args['mpi'], loglevel=args['loglevel'])
+            if args['taskdir'] is None and not args['mpi']:
+                output += batch(mpi=False, loglevel=args['loglevel'])
+                continue
+            # Share SONIC lookups with all workers (through the model sent to them), instead
+            # of loading them in each worker
+            if 'sonic' in sim_inputs[-2]:
+                for f, fs in itertools.product(sim_inputs[0], sim_inputs[-3]):
+                    nbls.shareLookup2D(f, fs)
+            try:
+                if args['taskdir'] is not None:
+                    with TaskDirectory(args['taskdir']) as executor:
+                        batch_output = batch(loglevel=args['loglevel'], executor=executor)
+                else:
+                    # Run longest simulations first, with costs calibrated on previous batches
+                    batch.schedule(cost_model)
+                    batch_output = batch(mpi=True, loglevel=args['loglevel'])
+            finally:
+                nbls.releaseSharedLookups()
+            for out in filter(lambda x: x is not None, batch_output):
+                cost_model.update(loadData(out)[1] if args['save'] else out[1])
+            output += batch_output
 
     # Plot resulting profiles
     if args['plot'] is not None:
@@ -8,19 +8,80 @@
 ''' Create lookup table for specific neuron. '''
 
 import os
+import shutil
+import pickle
+import hashlib
 import itertools
 import logging
+from functools import partial
 import numpy as np
 
 from PySONIC.utils import logger, isIterable
-from PySONIC.core import NeuronalBilayerSonophore, Batch, Lookup, AcousticDrive
+from PySONIC.core import (
+    NeuronalBilayerSonophore, Batch, PoolExecutor, StateMethod, TaskDirectory, Lookup,
+    AcousticDrive, adaptiveLookup)
 from PySONIC.parsers import MechSimParser
 from PySONIC.neurons import getDefaultPassiveNeuron
 from PySONIC.constants import DQ_LOOKUP
 
 
+def getCheckpointDir(root, pneuron, refs, novertones):
+    ''' Get the checkpoint sub-directory specific to a given lookup computation, identified
+        by a hash of its neuron model, overtones and reference vectors.
+
+        :param root: root checkpoint directory
+        :param pneuron: point-neuron model
+        :param refs: dictionary of reference vectors
+        :param novertones: number of charge Fourier overtones
+        :return: path to the (created) checkpoint sub-directory
+    '''
+    h = hashlib.sha1(f'{pneuron.name}_{novertones}'.encode())
+    for k, v in refs.items():
+        h.update(k.encode())
+        h.update(np.ascontiguousarray(v, dtype=float).tobytes())
+    dirpath = os.path.join(root, h.hexdigest()[:16])
+    os.makedirs(dirpath, exist_ok=True)
+    return dirpath
+
+
+def runSlab(func, fpath, *args, **kwargs):
+    ''' Run a lookup computation slab and save its output in a checkpoint file.
+
+        The file is first written to a temporary path and then renamed, so that an
+        interrupted write never leaves a corrupted checkpoint behind.
+    '''
+    out = func(*args, **kwargs)
+    tmp_fpath = f'{fpath}.tmp'
+    with open(tmp_fpath, 'wb') as fh:
+        pickle.dump(out, fh)
+    os.replace(tmp_fpath, fpath)
+    return out
+
+
+def loadSlab(fpath):
+    ''' Load a lookup computation slab output from a checkpoint file. '''
+    with open(fpath, 'rb') as fh:
+        return pickle.load(fh)
+
+
+def loadSonophores(pneuron, radii, warm_start=False):
+    ''' Pre-load sonophore models for a list of radii (used as pool workers initializer).
+
+        :param pneuron: point-neuron model
+        :param radii: array of sonophore radii (m)
+        :param warm_start: boolean stating whether to seed the models mechanical simulations
+            with the converged state of their nearest already-computed neighbour
+        :return: dictionary of sonophore models per radius
+    '''
+    nbls_dict = {a: NeuronalBilayerSonophore(a, pneuron) for a in radii}
+    for nbls in nbls_dict.values():
+        nbls.warm_start = warm_start
+    return nbls_dict
+
+
 def computeAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, novertones=0,
-                       test=False, mpi=False, loglevel=logging.INFO):
+                       test=False, mpi=False, loglevel=logging.INFO, checkpoint_dir=None,
+                       taskdir=None, warm_start=False):
     ''' Run simulations of the mechanical system for a multiple combinations of
         imposed sonophore radius, US frequencies, acoustic amplitudes charge densities and
         (spatially-averaged) sonophore membrane coverage fractions, compute effective
@@ -34,6 +95,13 @@ def computeAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, novertones=0,
         :param fsref: acoustic drive phase (rad)
         :param mpi: boolean statting wether or not to use multiprocessing
         :param loglevel: logging level
+        :param checkpoint_dir: optional directory in which the output of each completed
+            (a, f, A) slab is saved, and from which already computed slabs are reloaded
+            (instead of recomputed) upon restart
+        :param taskdir: optional shared directory of a file-based task queue, on which to
+            distribute simulations over worker processes on several hosts
+        :param warm_start: boolean stating whether to seed mechanical simulations with the
+            converged state of their nearest already-computed (A, Q) neighbour
         :return: lookups dictionary
     '''
     descs = {
@@ -95,12 +163,18 @@ def computeAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, novertones=0,
         if key in ('A', 'fs') and min(values) < 0:
             raise ValueError(f'Invalid {descs[key]} (must all be positive or null)')
 
-    # Create simulation queue per sonophore radius
+    # Create simulation queue per sonophore radius: without charge overtones, a whole
+    # charge vector is computed per queue entry (as a batch of mechanical simulations)
+    Cm0 = [pneuron.Cm0]
     drives = AcousticDrive.createQueue(refs['f'], refs['A'])
     queue = []
+    batchQ = novertones == 0
     for drive in drives:
-        for Qm in refs['Q']:
-            queue.append([drive, refs['fs'], Qm])
+        if batchQ:
+            queue.append([drive, Cm0, refs['fs'], refs['Q']])
+        else:
+            for Qm in refs['Q']:
+                queue.append([drive, Cm0, refs['fs'], Qm])
 
     # Add charge overtones to queue if required
     if novertones > 0:
@@ -134,18 +208,55 @@ def computeAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, novertones=0,
     logger.info('batch queue:')
     Batch.printQueue(queue)
 
+    # Determine checkpoint directory, if any
+    if checkpoint_dir is not None:
+        checkpoint_dir = getCheckpointDir(checkpoint_dir, pneuron, refs, novertones)
+        logger.info(f'Using checkpoint directory "{checkpoint_dir}"')
+
     # Run simulations and populate outputs
     logger.info('Starting simulation batch for %s neuron', pneuron.name)
     outputs = []
-    for a in refs['a']:
-        if pneuron.is_passive:
-            xfunc = lambda *args, **kwargs: NeuronalBilayerSonophore(
-                a, getDefaultPassiveNeuron()).computeEffVars(*args, **kwargs)
-            batch = Batch(xfunc, queue)
-        else:
-            nbls = NeuronalBilayerSonophore(a, pneuron)
-            batch = Batch(nbls.computeEffVars, queue)
-        outputs += batch(mpi=mpi, loglevel=loglevel)
+    method = 'computeEffVarsBatch' if batchQ else 'computeEffVars'
+    if pneuron.is_passive:
+        pneuron = getDefaultPassiveNeuron()
+    # With multiprocessing, use a single pool of workers for all radii, each worker
+    # pre-loading its sonophore models once (instead of receiving them with every task).
+    # With a task directory, sonophore models are stored once per batch with its function.
+    # In both cases, the warm start setting is carried by the models themselves.
+    executor = None
+    if taskdir is not None:
+        executor = TaskDirectory(taskdir)
+    elif mpi:
+        executor = PoolExecutor(
+            initializer=loadSonophores, initargs=(pneuron, refs['a'], warm_start),
+            loglevel=loglevel)
+    if not isinstance(executor, PoolExecutor):
+        nbls_dict = loadSonophores(pneuron, refs['a'], warm_start=warm_start)
+    try:
+        for ia, a in enumerate(refs['a']):
+            if isinstance(executor, PoolExecutor):
+                xfunc = StateMethod(a, method)
+            else:
+                xfunc = getattr(nbls_dict[a], method)
+            if checkpoint_dir is None:
+                outputs += Batch(xfunc, queue)(loglevel=loglevel, executor=executor)
+            else:
+                # Only run slabs without checkpoint file, then reload all slabs in queue order
+                fpaths = [
+                    os.path.join(checkpoint_dir, f'slab_a{ia}_{i}.pkl') for i in range(len(queue))]
+                todo = []
+                for fpath, params in zip(fpaths, queue):
+                    if not os.path.isfile(fpath):
+                        args, kwargs = Batch.resolve(params)
+                        todo.append(([fpath, *args], kwargs))
+                logger.info(f'a = {a * 1e9:.1f} nm: {len(queue) - len(todo)}/{len(queue)} slabs '
+                            'already computed')
+                if len(todo) > 0:
+                    Batch(partial(runSlab, xfunc), todo)(loglevel=loglevel, executor=executor)
+                outputs += [loadSlab(fpath) for fpath in fpaths]
+    finally:
+        if executor is not None:
+            executor.close()
 
     # Split comp times and effvars from outputs
     effvars, tcomps = [list(x) for x in zip(*outputs)]
@@ -166,7 +277,11 @@ def computeAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, novertones=0,
         effvar = [effvars[i][key] for i in range(nout)]
         tables[key] = np.array(effvar).reshape(dims)
 
-    # Reshape computation times, tile over extra fs dimension, and add it as a lookup table
+    # Reshape computation times (evenly distributing batch times over charges), tile over
+    # extra fs dimension, and add it as a lookup table
+    if batchQ:
+        nQ = refs['Q'].size
+        tcomps = np.repeat(np.array(tcomps)[:, np.newaxis] / nQ, nQ, axis=1)
     tcomps = np.array(tcomps).reshape(dims[:-1])
     tcomps = np.moveaxis(np.array([tcomps for i in range(dims[-1])]), 0, -1)
     tables['tcomp'] = tcomps
@@ -175,11 +290,48 @@ def computeAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, novertones=0,
     return Lookup(refs, tables)
 
 
+def computeAdaptiveAStimLookup(pneuron, aref, fref, Aref, fsref, Qref, qtol, refineA=False,
+                               **kwargs):
+    ''' Compute a lookup with a non-uniform charge vector (and optionally amplitude vector),
+        adaptively sampled from the provided reference vectors such that linear interpolation
+        between consecutive samples is accurate within a given relative tolerance.
+
+        :param pneuron: point-neuron model
+        :param aref: array of sonophore radii (m)
+        :param fref: array of acoustic drive frequencies (Hz)
+        :param Aref: array of candidate acoustic drive amplitudes (Pa)
+        :param fsref: acoustic drive phase (rad)
+        :param Qref: array of candidate membrane charge densities (C/m2)
+        :param qtol: relative interpolation tolerance
+        :param refineA: boolean stating whether to also adaptively sample amplitudes. If so,
+            charges are refined over a coarse amplitude subset, and amplitudes are then
+            refined over the resulting charge vector (starting from that amplitude subset,
+            which is not recomputed).
+        :return: lookup object
+    '''
+    exclude = ['tcomp']
+    Aref_Q = Aref
+    if refineA:
+        Aref_Q = Aref[np.unique(np.round(np.linspace(0, Aref.size - 1, 5)).astype(int))]
+    logger.info(f'Adaptive charge sampling (rtol = {qtol:.1e})')
+    lkp = adaptiveLookup(
+        lambda Qs: computeAStimLookup(pneuron, aref, fref, Aref_Q, fsref, Qs, **kwargs),
+        'Q', Qref, qtol, exclude=exclude)
+    if refineA:
+        Qs = lkp.refs['Q']
+        logger.info(f'Adaptive amplitude sampling (rtol = {qtol:.1e})')
+        lkp = adaptiveLookup(
+            lambda As: computeAStimLookup(pneuron, aref, fref, As, fsref, Qs, **kwargs),
+            'A', Aref, qtol, exclude=exclude, lkp0=lkp)
+    return lkp
+
+
 def main():
 
     parser = MechSimParser(outputdir='.')
     parser.addNeuron()
     parser.addTest()
+    parser.addTaskDir()
     parser.defaults['neuron'] = 'RS'
     parser.defaults['radius'] = np.array([16.0, 32.0, 64.0])  # nm
     parser.defaults['freq'] = np.array([20., 100., 500., 1e3, 2e3, 3e3, 4e3])  # kHz
@@ -187,6 +339,22 @@ def main():
         np.logspace(np.log10(0.1), np.log10(600), num=50), 0, 0.0)  # kPa
     parser.defaults['charge'] = np.nan
     parser.add_argument('--novertones', type=int, default=0, help='Number of Fourier overtones')
+    parser.add_argument(
+        '--qtol', type=float, default=None,
+        help='Relative interpolation tolerance for adaptive sampling of the charge vector')
+    parser.add_argument(
+        '--refineA', default=False, action='store_true',
+        help='Also adaptively sample the amplitude vector (requires --qtol)')
+    parser.add_argument(
+        '--npy', default=False, action='store_true',
+        help='Also save lookup as a directory of memory-mappable NPY files')
+    parser.add_argument(
+        '--checkpoint', default=False, action='store_true',
+        help='Save completed slabs in checkpoint files, and resume from them upon restart')
+    parser.add_argument(
+        '--warmstart', default=False, action='store_true',
+        help='Seed mechanical simulations with the converged state of their nearest '
+             'already-computed (A, Q) neighbour')
     args = parser.parse()
     logger.setLevel(args['loglevel'])
 
@@ -224,14 +392,46 @@ def main():
                 logger.error('%s Lookup creation canceled', pneuron.name)
                 return
 
-        # Compute lookup
-        lkp = computeAStimLookup(pneuron, *inputs, novertones=novertones,
-                                 test=args['test'], mpi=args['mpi'], loglevel=args['loglevel'])
+        # Determine checkpoint directory, if any
+        checkpoint_dir = None
+        if args['checkpoint']:
+            checkpoint_dir = f'{os.path.splitext(lookup_fpath)[0]}_checkpoints'
+
+        # Compute lookup (adaptively sampled if a tolerance is provided)
+        qtol = args['qtol']
+        if qtol is not None and novertones > 0:
+            logger.error('Adaptive sampling is not available with charge overtones')
+            return
+        if qtol is not None and args['test']:
+            logger.error('Adaptive sampling is not available in test mode')
+            return
+        if args['refineA'] and qtol is None:
+            logger.error('Adaptive amplitude sampling requires a charge tolerance (--qtol)')
+            return
+        if qtol is not None:
+            lkp = computeAdaptiveAStimLookup(
+                pneuron, *inputs, qtol, refineA=args['refineA'],
+                mpi=args['mpi'], loglevel=args['loglevel'], checkpoint_dir=checkpoint_dir,
+                taskdir=args['taskdir'], warm_start=args['warmstart'])
+        else:
+            lkp = computeAStimLookup(pneuron, *inputs, novertones=novertones,
+                                     test=args['test'], mpi=args['mpi'], loglevel=args['loglevel'],
+                                     checkpoint_dir=checkpoint_dir, taskdir=args['taskdir'],
+                                     warm_start=args['warmstart'])
         logger.info(f'Generated lookup: {lkp}')
 
         # Save lookup in PKL file
         logger.info('Saving %s neuron lookup in file: "%s"', pneuron.name, lookup_fpath)
         lkp.toPickle(lookup_fpath)
+        if args['npy']:
+            npy_dirpath = Lookup.getNpyDirPath(lookup_fpath)
+            logger.info('Saving %s neuron lookup in directory: "%s"', pneuron.name, npy_dirpath)
+            lkp.toNpy(npy_dirpath)
+
+        # Remove checkpoint files once the lookup is safely saved
+        if checkpoint_dir is not None and os.path.isdir(checkpoint_dir):
+            logger.info('Removing checkpoint directory "%s"', checkpoint_dir)
+            shutil.rmtree(checkpoint_dir)
 
 
 if __name__ == '__main__':
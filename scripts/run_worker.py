@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+''' Run a worker process completing the tasks of batches submitted to a shared task
+    directory (e.g. with the --taskdir option of run_lookups.py or run_astim.py). Any number
+    of workers can be launched, on any host that has access to the directory. '''
+
+import logging
+import multiprocess as mp
+from argparse import ArgumentParser
+
+from PySONIC.core import TaskDirectory
+from PySONIC.utils import logger
+
+
+def work(root, max_idle, loglevel):
+    ''' Work on the tasks of a task directory until it remains idle for a given time. '''
+    logger.setLevel(loglevel)
+    with TaskDirectory(root) as taskdir:
+        ncompleted = taskdir.work(max_idle=max_idle, loglevel=loglevel)
+    logger.info(f'{ncompleted} tasks completed')
+
+
+def main():
+    ap = ArgumentParser()
+    ap.add_argument('taskdir', type=str, help='Shared task directory')
+    ap.add_argument(
+        '-n', '--nworkers', type=int, default=1, help='Number of worker processes to launch')
+    ap.add_argument(
+        '--maxidle', type=float, default=None,
+        help='Idle time (s) after which workers stop if no task is available (default: never)')
+    ap.add_argument(
+        '-v', '--verbose', default=False, action='store_true', help='Increase verbosity')
+    args = ap.parse_args()
+    loglevel = logging.DEBUG if args.verbose else logging.INFO
+    logger.setLevel(loglevel)
+
+    workers = [
+        mp.Process(target=work, args=(args.taskdir, args.maxidle, loglevel))
+        for i in range(args.nworkers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,12 @@
 # @Last Modified by:   Theo Lemaire
 # @Last Modified time: 2020-01-26 12:36:20
 
+import os
+import pickle
+import tempfile
 import numpy as np
-from PySONIC.core import EffectiveVariablesLookup
+from PySONIC.core import (EffectiveVariablesLookup, LinearInterpolator1D, BilinearInterpolator2D,
+                          LookupCache, SharedLookup, adaptiveLookup)
 
 ''' Test the lookup functionalities. '''
 
@@ -68,3 +72,121 @@ for k in ['taum', 'minf']:
     print(f'   {k}:', lkp1d[k])
 print()
 
+
+########### Stacked 1D interpolation engine  ###########
+
+lkp1d = EffectiveVariablesLookup(refs, tables).projectN({'a': 32., 'f': 500., 'A': 100.})
+interp = LinearInterpolator1D(lkp1d)
+print('interpolation engine:', interp)
+for Q in [-80., -12.5, 37.2, np.linspace(-80, 50, 10)]:
+    ref_values = lkp1d.interpolate1D(Q)
+    values = interp.interpolate1D(Q)
+    for k in lkp1d.outputs:
+        assert np.allclose(values[k], ref_values[k]), f'{k} mismatch at Q = {Q}'
+print('   identical to dictionary-based interpolation')
+print()
+
+
+########### Adaptive sampling of a reference vector  ###########
+
+def steepLookup(Qref):
+    AA, QQ = np.meshgrid(refs['A'], Qref, indexing='ij')
+    return EffectiveVariablesLookup(
+        {'A': refs['A'], 'Q': Qref}, {'alpham': np.tanh(QQ / 5.) * (1 + AA / 600)})
+
+Qref = np.linspace(-80, 50, 261)
+lkp2d = adaptiveLookup(steepLookup, 'Q', Qref, 1e-3)
+print('after adaptive sampling:', lkp2d)
+assert np.isin(lkp2d.refs['Q'], Qref).all(), 'adaptive references not among candidates'
+ref_values = steepLookup(Qref)['alpham']
+values = lkp2d.project('Q', Qref)['alpham']
+assert np.abs(values - ref_values).max() <= 1e-3 * np.ptp(ref_values), 'tolerance not met'
+
+# Restart from an already computed lookup, whose reference values are not recomputed
+computed = []
+def countedLookup(Qs):
+    computed.extend(Qs)
+    return steepLookup(Qs)
+
+lkp2d_restart = adaptiveLookup(countedLookup, 'Q', Qref, 1e-3, lkp0=lkp2d)
+assert not np.isin(computed, lkp2d.refs['Q']).any(), 'initial reference values recomputed'
+assert np.isin(lkp2d.refs['Q'], lkp2d_restart.refs['Q']).all(), 'initial reference values lost'
+print()
+
+
+########### Memory-mapped NPY storage  ###########
+
+lkp4d = EffectiveVariablesLookup(refs, tables)
+with tempfile.TemporaryDirectory() as tmpdir:
+    dirpath = os.path.join(tmpdir, 'lkp_npy')
+    lkp4d.toNpy(dirpath)
+    lkp4d_mmap = EffectiveVariablesLookup.fromNpy(dirpath)
+    print('after NPY round-trip:', lkp4d_mmap)
+    projections = {'a': 32., 'f': 500., 'A': 100.}
+    lkp1d, lkp1d_mmap = lkp4d.projectN(projections), lkp4d_mmap.projectN(projections)
+    for k in lkp4d.outputs:
+        assert np.allclose(lkp1d[k], lkp1d_mmap[k]), f'{k} mismatch after memory-mapped projection'
+    del lkp4d_mmap, lkp1d_mmap
+print()
+
+
+########### Lookups shared between processes  ###########
+
+lkp4d = EffectiveVariablesLookup(refs, tables)
+with SharedLookup(lkp4d) as shared_lkp:
+    attached_lkp = pickle.loads(pickle.dumps(shared_lkp)).attach()
+    print('shared lookup:', shared_lkp, attached_lkp)
+    for k in lkp4d.outputs:
+        assert np.array_equal(lkp4d[k], attached_lkp[k]), f'{k} mismatch in shared lookup'
+        assert not attached_lkp[k].flags.writeable, f'{k} shared table is writable'
+    del attached_lkp['alpham']
+    assert 'alpham' in shared_lkp.attach().outputs, 'shared lookup altered by attached view'
+assert not os.path.isdir(shared_lkp.dirpath), 'shared lookup not released'
+print()
+
+
+########### LRU cache of lookups  ###########
+
+lkp1d = EffectiveVariablesLookup(refs, tables).projectN({'a': 32., 'f': 500., 'A': 100.})
+cache = LookupCache(2.5 * lkp1d.__sizeof__())
+assert cache.get('x') is None
+for key in ['x', 'y']:
+    cache.put(key, lkp1d)
+cached_lkp = cache.get('x')
+del cached_lkp['alpham']
+assert 'alpham' in cache.get('x').outputs, 'cached lookup altered by returned copy'
+cache.put('z', lkp1d)  # evicts least recently used entry ('y')
+assert 'y' not in cache and 'x' in cache and 'z' in cache, 'wrong LRU eviction'
+assert (cache.hits, cache.misses) == (2, 1), 'wrong hit/miss counters'
+print('lookup cache:', cache)
+print()
+
+
+########### Lookup copies  ###########
+
+lkp4d = EffectiveVariablesLookup(refs, {k: v.copy() for k, v in tables.items()})
+lkp4d_copy = lkp4d.copy()
+del lkp4d_copy['alpham']
+assert 'alpham' in lkp4d.outputs, 'lookup altered by deletion in its copy'
+ref_values = lkp4d.project('A', 100.)['alpham']
+lkp4d['alpham'][:] *= 2
+assert np.allclose(lkp4d.project('A', 100.)['alpham'], 2 * ref_values), \
+    'projection does not reflect in-place table modification'
+print('lookup copy:', lkp4d_copy)
+print()
+
+
+########### Vectorized bilinear interpolation engine  ###########
+
+lkp2d = EffectiveVariablesLookup(refs, tables).projectN({'a': 32., 'f': 500.})
+interp = BilinearInterpolator2D(lkp2d, keys=['betam', 'alpham'])
+print('bilinear interpolation engine:', interp)
+A = np.random.choice(np.hstack((refs['A'], np.random.uniform(0, 600, 3))), 100)
+Q = np.random.uniform(-90, 60, 100)
+values = interp(A, Q)
+for k, x in zip(interp.outputs, values):
+    ref_values = np.array(
+        [lkp2d.project('A', a).interpVar1D(np.array([q]), k)[0] for a, q in zip(A, Q)])
+    assert np.allclose(x, ref_values, equal_nan=True), f'{k} mismatch'
+print('   identical to successive 1D interpolations')
+print()
@@ -7,7 +7,16 @@
 
 ''' Test the basic functionalities of the package. '''
 
-from PySONIC.core import BilayerSonophore, NeuronalBilayerSonophore
+import logging
+import tempfile
+import warnings
+import numpy as np
+import multiprocess as mp
+from scipy.integrate import ODEintWarning
+
+from PySONIC.core import (
+    BilayerSonophore, NeuronalBilayerSonophore, ODESolver, Model, DenseSolution, Batch,
+    PoolExecutor, StateMethod, TaskDirectory, BatchPeriodicSolver, DecimatingSink, HybridSolver)
 from PySONIC.core.drives import AcousticDrive, ElectricDrive
 from PySONIC.core.protocols import PulsedProtocol
 from PySONIC.utils import logger
@@ -28,6 +37,118 @@ class TestSims(TestBase):
         bls = BilayerSonophore(self.a, Cm0, Qm0)
         self.execute(lambda: bls.simulate(self.USdrive, Qm), is_profiled)
 
+    def test_MECH_batch(self, is_profiled=False):
+        logger.info('Test: running batch of MECH simulations')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        Qms = [-50e-5, 0., 50e-5]  # C/m2
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        self.execute(lambda: bls.simCyclesBatch(self.USdrive, Qms), is_profiled)
+
+    def test_MECH_batch_options(self, is_profiled=False):
+        logger.info('Test: rejecting unsupported options of batch solvers before solving')
+        solver = BatchPeriodicSolver(1e-6, ['y'], lambda t, y, im: -y, 2, dt=1e-8)
+        for kwargs in [{'sink': DecimatingSink(1e-7)}, {'target_dt': 1e-7}, {'max_nsamples': 10}]:
+            try:
+                solver([{'y': 1.}, {'y': 2.}], **kwargs)
+            except ValueError:
+                continue
+            raise AssertionError(f'unsupported batch solver option not rejected: {kwargs}')
+
+    def test_MECH_warm_start(self, is_profiled=False):
+        logger.info('Test: running MECH simulations seeded from nearest neighbours')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        Qms = [-50e-5, -45e-5, -40e-5]  # C/m2
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        bls.warm_start_cache.clear()
+        for Qm in Qms:
+            self.execute(lambda: bls.simCycles(self.USdrive, Qm, warm_start=True), is_profiled)
+        assert bls.warm_start_cache.hits == len(Qms) - 1, 'warm start cache not used'
+
+    def test_MECH_pool(self, is_profiled=False):
+        logger.info('Test: running MECH simulations on a persistent pool of workers')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        Qms = [-50e-5, 50e-5]  # C/m2
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        queue = [[self.USdrive, Qm] for Qm in Qms]
+        with PoolExecutor(nworkers=2, initializer=lambda: {'bls': bls}) as executor:
+            for i in range(2):  # re-use the same workers across batches
+                self.execute(
+                    lambda: Batch(StateMethod('bls', 'simCycles'), queue)(executor=executor),
+                    is_profiled)
+
+    def test_MECH_stream(self, is_profiled=False):
+        logger.info('Test: streaming outputs of MECH simulations as they complete')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        Qms = [-50e-5, 0., 50e-5]  # C/m2
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        batch = Batch(bls.simCycles, [[self.USdrive, Qm] for Qm in Qms])
+        completed = []
+        with PoolExecutor(nworkers=2, chunksize=1) as executor:
+            self.execute(lambda: list(batch.imap(
+                executor=executor, max_inflight=2, callback=lambda i, _: completed.append(i))),
+                is_profiled)
+        assert sorted(completed) == list(range(len(Qms))), 'missing batch outputs'
+
+    def test_MECH_stream_interrupted(self, is_profiled=False):
+        logger.info('Test: interrupting a stream of MECH simulations outputs')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        Qms = [-50e-5, 0., 50e-5]  # C/m2
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        batch = Batch(bls.simCycles, [[self.USdrive, Qm] for Qm in Qms])
+        outputs = batch.imap(mpi=True, max_inflight=1)
+        self.execute(lambda: next(outputs), is_profiled)
+        outputs.close()
+        for consumer in batch.consumers:
+            consumer.join(timeout=60.)
+            assert not consumer.is_alive(), f'{consumer.name} still alive after interruption'
+
+    def test_MECH_taskdir(self, is_profiled=False):
+        logger.info('Test: running MECH simulations over a file-based task queue')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        Qms = [-50e-5, 0., 50e-5]  # C/m2
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        queue = [[self.USdrive, Qm] for Qm in Qms]
+        poll_interval = TaskDirectory.poll_interval
+        TaskDirectory.poll_interval = 0.1
+        try:
+            with tempfile.TemporaryDirectory() as root:
+                # Submit batch, and start 2 independent workers besides the submitting process
+                taskdir = TaskDirectory(root)
+                batchdir = taskdir.submit(bls.simCycles, queue)
+                same_queue = [[AcousticDrive(500e3, 100e3), Qm] for Qm in Qms]
+                assert taskdir.submit(
+                    BilayerSonophore(self.a, Cm0, Qm0).simCycles, same_queue) == batchdir, \
+                    'identical batch submitted to a different directory'
+                workers = [mp.Process(target=TaskDirectory(root).work, kwargs={'max_idle': 1.})
+                           for i in range(2)]
+                for worker in workers:
+                    worker.start()
+                self.execute(lambda: Batch(bls.simCycles, queue)(executor=taskdir), is_profiled)
+                for worker in workers:
+                    worker.join()
+        finally:
+            TaskDirectory.poll_interval = poll_interval
+
+    def test_MECH_taskdir_release(self, is_profiled=False):
+        logger.info('Test: releasing claimed tasks of a file-based task queue upon closing')
+        Qm0 = -80e-5    # membrane resting charge density (C/m2)
+        Cm0 = 1e-2      # membrane resting capacitance (F/m2)
+        bls = BilayerSonophore(self.a, Cm0, Qm0)
+        queue = [[self.USdrive, Qm] for Qm in [-50e-5, 50e-5]]
+        with tempfile.TemporaryDirectory() as root:
+            with TaskDirectory(root) as taskdir:
+                batchdir = taskdir.submit(bls.simCycles, queue)
+                taskdir.claim(batchdir)
+                assert len(taskdir.listTasks(batchdir, 'todo')) == 1
+            assert len(taskdir.listTasks(batchdir, 'todo')) == 2, 'claimed task not released'
+            assert len(taskdir.listTasks(batchdir, 'claimed')) == 0, 'claimed task not released'
+
     def test_ESTIM(self, is_profiled=False):
         logger.info('Test: running ESTIM simulation')
         ELdrive = ElectricDrive(10.0)  # mA/m2
@@ -35,6 +156,67 @@ class TestSims(TestBase):
         pneuron = getPointNeuron('RS')
         self.execute(lambda: pneuron.simulate(ELdrive, pp), is_profiled)
 
+    def test_rates_vectorized(self, is_profiled=False):
+        logger.info('Test: evaluating rate constants on scalars and arrays')
+        Vm = np.linspace(-150., 70., 221)  # mV
+        for name, neuron_class in getNeuronsDict().items():
+            pneuron = neuron_class()
+            if not hasattr(pneuron, 'effRates'):
+                continue
+            vrates = pneuron.vectorizedRates()
+            with np.errstate(all='ignore'):
+                for k, func in pneuron.effRates().items():
+                    values = [func(float(x)) for x in Vm]
+                    assert all(isinstance(x, float) for x in values), \
+                        f'{name}: {k} does not return a scalar for a scalar input'
+                    assert np.allclose(vrates[k](Vm), values, equal_nan=True), \
+                        f'{name}: {k} array evaluation differs from scalar evaluation'
+
+    def test_ESTIM_stiff(self, is_profiled=False):
+        logger.info('Test: running ESTIM simulation with stiff implicit solvers')
+        ELdrive = ElectricDrive(10.0)  # mA/m2
+        pp = PulsedProtocol(100e-3, 50e-3)
+        pneuron = getPointNeuron('RS')
+        default_method = ODESolver.default_method
+        try:
+            for method in ['BDF', 'Radau']:
+                ODESolver.default_method = method
+                self.execute(lambda: pneuron.simulate(ELdrive, pp), is_profiled)
+        finally:
+            ODESolver.default_method = default_method
+
+    def test_ESTIM_dense(self, is_profiled=False):
+        logger.info('Test: running ESTIM simulation with dense output')
+        ELdrive = ElectricDrive(10.0)  # mA/m2
+        pp = PulsedProtocol(100e-3, 50e-3)
+        pneuron = getPointNeuron('RS')
+
+        def simulate():
+            data, _ = pneuron.simulate(ELdrive, pp)
+            assert isinstance(data, DenseSolution), 'simulation did not return a dense solution'
+            data.resample(1e-4)
+
+        Model.dense_output = True
+        try:
+            self.execute(simulate, is_profiled)
+        finally:
+            Model.dense_output = False
+
+    def test_ESTIM_schedule(self, is_profiled=False):
+        logger.info('Test: running ESTIM simulations by decreasing expected cost')
+        ELdrive = ElectricDrive(10.0)  # mA/m2
+        protocols = [PulsedProtocol(x, 10e-3) for x in [20e-3, 100e-3, 50e-3]]
+        pneuron = getPointNeuron('RS')
+        batch = Batch(pneuron.simulate, [[ELdrive, pp] for pp in protocols])
+        batch.schedule(lambda drive, pp: pp.tstop)
+        assert batch.order == [1, 2, 0], 'tasks not sorted by decreasing cost'
+
+        def run():
+            outputs = batch.run()
+            assert [meta['pp'] for _, meta in outputs] == protocols, 'outputs order not restored'
+
+        self.execute(run, is_profiled)
+
     def test_ASTIM_sonic(self, is_profiled=False):
         logger.info('Test: ASTIM sonic simulation')
         pp = PulsedProtocol(50e-3, 10e-3)
@@ -83,6 +265,46 @@ class TestSims(TestBase):
         nbls = NeuronalBilayerSonophore(self.a, pneuron)
         self.execute(lambda: nbls.simulate(self.USdrive, pp, method='hybrid'), is_profiled)
 
+    def test_ASTIM_hybrid_tabulated(self, is_profiled=False):
+        logger.info('Test: comparing tabulated and step-wise sparse integration in ASTIM hybrid')
+        pp = PulsedProtocol(0.6e-3, 0.1e-3)
+        pneuron = getPointNeuron('RS')
+        nbls = NeuronalBilayerSonophore(self.a, pneuron)
+        tabulated_sparse = HybridSolver.tabulated_sparse
+        Qm = {}
+        try:
+            for tabulated in [True, False]:
+                HybridSolver.tabulated_sparse = tabulated
+                data, _ = nbls.simulate(self.USdrive, pp, method='hybrid')
+                Qm[tabulated] = data['Qm'].values
+        finally:
+            HybridSolver.tabulated_sparse = tabulated_sparse
+        dev = np.abs(Qm[True] - Qm[False]).max() / np.ptp(Qm[False])
+        assert dev < 3e-2, f'tabulated and step-wise charge profiles deviate ({dev:.2e})'
+
+    def test_ASTIM_multirate(self, is_profiled=False):
+        logger.info('Test: running ASTIM multirate simulation')
+        pp = PulsedProtocol(0.6e-3, 0.1e-3)
+        pneuron = getPointNeuron('RS')
+        nbls = NeuronalBilayerSonophore(self.a, pneuron)
+        self.execute(lambda: nbls.simulate(self.USdrive, pp, method='multirate'), is_profiled)
+
+    def test_ASTIM_multirate_logs(self, is_profiled=False):
+        logger.info('Test: running ASTIM multirate simulation with log events')
+        pp = PulsedProtocol(0.6e-3, 0.1e-3)
+        pneuron = getPointNeuron('RS')
+        nbls = NeuronalBilayerSonophore(self.a, pneuron)
+        loglevel = logger.getEffectiveLevel()
+        logger.setLevel(logging.INFO)
+        try:
+            # Log events must not trigger integrations over vanishing intervals
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', ODEintWarning)
+                self.execute(
+                    lambda: nbls.simulate(self.USdrive, pp, method='multirate'), is_profiled)
+        finally:
+            logger.setLevel(loglevel)
+
 
 if __name__ == '__main__':
     tester = TestSims()